@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+التحكم في القبول وإسقاط الحمل - Admission Control & Load Shedding
+حدود للطلبات المتزامنة لكل عامل + ميزانية انتظار + مهلة لكل طلب
+
+الفئات:
+    cheap    /api/health, /api/car-names, ...  بدون حدود (أولوية دائماً)
+    predict  /api/predict-*                    حد متزامن + ميزانية انتظار قصيرة
+    scan     /api/database/*                   حد أصغر لأنها تمسح الجدول كاملاً
+    render   /api/charts/*                     الرسم في Process Pool؛ مهلة أطول للرسم البارد
+
+عندما يتجاوز الانتظار (في طابور الموجّه عبر X-Request-Start أو داخل العامل)
+الميزانية المحددة يُرد فوراً بـ 503 مع Retry-After بدلاً من ترك العميل معلقاً
+حتى مهلة Gunicorn، فيبقى معدل الطلبات الناجحة ثابتاً تحت الحمل الزائد.
+"""
+
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from flask import g, jsonify, request
+
+import metrics
+
+CHEAP = 'cheap'
+PREDICT = 'predict'
+SCAN = 'scan'
+RENDER = 'render'
+
+# تصنيف الـ endpoints (أسماء دوال Flask)
+ENDPOINT_CLASSES = {
+    'predict_row': PREDICT,
+    'predict_manual': PREDICT,
+    'predict_sweep': PREDICT,
+    'predict_bulk': PREDICT,
+    'explain_prediction': PREDICT,
+    'get_database_stats': SCAN,
+    'get_all_cars': SCAN,
+    'get_car_by_index': SCAN,
+    'search_cars': SCAN,
+    'get_data_range': SCAN,
+    'get_top_cars': SCAN,
+    'render_chart': RENDER,
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_threads = max(1, int(_env_float('GUNICORN_THREADS', 1)))
+
+# الحدود الافتراضية تترك خيطاً واحداً على الأقل للطلبات الرخيصة
+LIMITS = {
+    PREDICT: max(1, int(_env_float('ADMISSION_PREDICT_LIMIT', max(1, _threads - 1)))),
+    SCAN: max(1, int(_env_float('ADMISSION_SCAN_LIMIT', max(1, _threads // 4)))),
+    RENDER: max(1, int(_env_float('ADMISSION_RENDER_LIMIT', max(1, _threads // 2)))),
+}
+# أقصى انتظار مقبول قبل بدء المعالجة (ثوانٍ)
+QUEUE_BUDGET = {
+    PREDICT: _env_float('ADMISSION_PREDICT_QUEUE_BUDGET', 0.25),
+    SCAN: _env_float('ADMISSION_SCAN_QUEUE_BUDGET', 0.5),
+    RENDER: _env_float('ADMISSION_RENDER_QUEUE_BUDGET', 1.0),
+}
+# المهلة الكلية للطلب منذ وصوله (ثوانٍ)
+DEADLINE = {
+    PREDICT: _env_float('ADMISSION_PREDICT_DEADLINE', 2.0),
+    SCAN: _env_float('ADMISSION_SCAN_DEADLINE', 5.0),
+    RENDER: _env_float('ADMISSION_RENDER_DEADLINE', 30.0),
+}
+RETRY_AFTER_SECONDS = int(_env_float('ADMISSION_RETRY_AFTER', 1))
+ENABLED = os.environ.get('ADMISSION_CONTROL', '1') != '0'
+
+_semaphores = {cls: threading.BoundedSemaphore(limit) for cls, limit in LIMITS.items()}
+
+REJECTED = metrics.counter('car_price_admission_rejected_total', 'Requests shed by admission control', ['class', 'reason'])
+QUEUE_WAIT = metrics.histogram('car_price_admission_queue_seconds', 'Time waited before admission', ['class'])
+
+
+def classify(endpoint: Optional[str]) -> str:
+    return ENDPOINT_CLASSES.get(endpoint or '', CHEAP)
+
+
+def _upstream_queue_seconds() -> float:
+    """
+    زمن الانتظار في طابور الموجّه/الوكيل قبل وصول الطلب إلى العامل
+    يدعم X-Request-Start بصيغة t=<ms|µs> أو رقم ميلي ثانية (Heroku/nginx)
+    """
+    header = request.headers.get('X-Request-Start')
+    if not header:
+        return 0.0
+    try:
+        value = float(header.split('=', 1)[-1])
+    except ValueError:
+        return 0.0
+    # تقدير الوحدة: ثوانٍ / ميلي ثوان / ميكرو ثوان منذ epoch
+    if value > 1e14:
+        value /= 1e6
+    elif value > 1e11:
+        value /= 1e3
+    return max(0.0, time.time() - value)
+
+
+def overloaded_response(reason: str, cls: Optional[str] = None):
+    """رد 503 سريع مع Retry-After"""
+    cls = cls or g.get('admission_class', PREDICT)
+    REJECTED.labels(**{'class': cls, 'reason': reason}).inc()
+    response = jsonify({'success': False, 'error': 'الخادم مشغول، يرجى المحاولة لاحقاً', 'reason': reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+def admit():
+    """
+    يُستدعى في before_request
+    يرجع None عند القبول أو رد 503 عند الرفض
+    """
+    if not ENABLED:
+        return None
+    cls = classify(request.endpoint)
+    g.admission_class = cls
+    if cls == CHEAP:
+        return None
+
+    arrival = time.perf_counter() - _upstream_queue_seconds()
+    g.deadline = arrival + DEADLINE[cls]
+    budget_left = QUEUE_BUDGET[cls] - (time.perf_counter() - arrival)
+    if budget_left <= 0:
+        return overloaded_response('queue_budget', cls)
+
+    sem = _semaphores[cls]
+    acquired = sem.acquire(timeout=budget_left)
+    QUEUE_WAIT.labels(**{'class': cls}).observe(time.perf_counter() - arrival)
+    if not acquired:
+        return overloaded_response('in_flight_limit', cls)
+    g.admission_slot = sem
+    return None
+
+
+def release():
+    """يُستدعى في teardown_request لتحرير الخانة مهما كانت النتيجة"""
+    sem = g.pop('admission_slot', None)
+    if sem is not None:
+        sem.release()
+
+
+def expired() -> bool:
+    """هل تجاوز الطلب مهلته؟ (تفحصه المعالجات بين المراحل المكلفة)"""
+    deadline = g.get('deadline')
+    return deadline is not None and time.perf_counter() > deadline
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """الوقت المتبقي حتى مهلة الطلب (أو default إن لم تكن له مهلة)"""
+    deadline = g.get('deadline')
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.perf_counter())
+
+
+def status() -> Tuple[dict, dict]:
+    return dict(LIMITS), {cls: dict(queue_budget=QUEUE_BUDGET[cls], deadline=DEADLINE[cls]) for cls in LIMITS}
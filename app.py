@@ -4,10 +4,16 @@
 نظام التنبؤ بأسعار السيارات - Backend API
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g, Response
 from flask_cors import CORS
 import json
 import os
+import time
+import hashlib
+import hmac
+import itertools
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 import joblib
 import numpy as np
@@ -15,9 +21,24 @@ import pandas as pd
 import logging
 from datetime import datetime
 from database import get_database
+import metrics
+import profiler
+import admission
+from warmup import Warmup
+import depreciation
+import catalog
+import shadow
+import drift
+import concurrency
+import warm_cache
+import bulk_format
+import compact_model
+from explain import Explainer
+from encoding import ManualEncoder, NUMERIC_FIELDS, CATEGORICAL_FIELDS, REQUIRED_FIELDS, inverse_target
+from audit_log import audit, setup_logging
 
-# إعداد Logging
-logging.basicConfig(level=logging.INFO)
+# إعداد Logging (غير متزامن عبر طابور - لا I/O في مسار الطلب)
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -27,17 +48,38 @@ CORS(app)
 BASE_DIR = Path(__file__).parent
 FEATURES_PATH = BASE_DIR / 'lgbm_features.txt'
 MODEL_PATH = BASE_DIR / 'lgbm_model.pkl'
+COMPACT_MODEL_PATH = BASE_DIR / 'lgbm_model.compact'
 META_PATH = BASE_DIR / 'lgbm_meta.json'
 SCALER_JSON = BASE_DIR / 'scaler_params.json'
 NAME_LE_JSON = BASE_DIR / 'name_le_mapping.json'
 CATLEVELS_JSON = BASE_DIR / 'categorical_levels.json'
 
+# ===== ADMIN =====
+# نقاط الإدارة (مثل التحليل) معطلة ما لم يتم ضبط ADMIN_TOKEN
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
 # ===== LOAD ASSETS =====
 def load_features():
     feats = FEATURES_PATH.read_text(encoding='utf-8').splitlines()
     return [f for f in feats if f]
 
+# lightgbm (الافتراضي) أو compact: مُقيّم numpy خفيف بدون تحميل LightGBM (انظر compact_model.py)
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'lightgbm')
+
 def load_model():
+    if MODEL_BACKEND == 'compact':
+        if COMPACT_MODEL_PATH.exists():
+            try:
+                compact = compact_model.load(COMPACT_MODEL_PATH)
+            except ValueError as e:
+                logger.warning(f"⚠️ {e} - سيتم استخدام LightGBM")
+                return joblib.load(MODEL_PATH)
+            if compact.header.get('source_model_version') == compute_model_version(MODEL_PATH):
+                logger.info(f"✅ تم تحميل النموذج المضغوط ({compact.n_trees} شجرة)")
+                return compact
+            logger.warning("⚠️ النموذج المضغوط لا يطابق lgbm_model.pkl - سيتم استخدام LightGBM")
+        else:
+            logger.warning("⚠️ lgbm_model.compact غير موجود - سيتم استخدام LightGBM")
     return joblib.load(MODEL_PATH)
 
 def load_meta():
@@ -48,6 +90,13 @@ def load_meta():
             return {}
     return {}
 
+def compute_model_version(path):
+    """بصمة ملف النموذج (أول 12 حرفاً من sha256)"""
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+    except OSError:
+        return 'unknown'
+
 def load_json_file(path):
     try:
         if path.exists():
@@ -60,7 +109,6 @@ def load_json_file(path):
 try:
     # تحميل قاعدة البيانات
     db = get_database()
-    df = db.df
     
     feature_names = load_features()
     model = load_model()
@@ -68,17 +116,155 @@ try:
     scaler_params = load_json_file(SCALER_JSON)
     name_le_map = load_json_file(NAME_LE_JSON)
     cat_levels = load_json_file(CATLEVELS_JSON)
+    model_version = compute_model_version(MODEL_PATH)
     logger.info("✅ تم تحميل جميع الأصول بنجاح")
 except Exception as e:
     logger.error(f"❌ خطأ في تحميل الأصول: {e}")
     db = None
-    df = None
     feature_names = []
     model = None
     meta = {}
     scaler_params = {}
     name_le_map = {}
     cat_levels = {}
+    model_version = 'unavailable'
+
+# مرمّز متجه (نفس منطق predict-manual) للطلبات الدفعية
+encoder = ManualEncoder(feature_names, scaler_params, name_le_map)
+
+# مفسر TreeSHAP دفعي مع ذاكرة LRU (يتطلب LightGBM: LGBMRegressor أو Booster خام، وليس النموذج المضغوط)
+explainer = (Explainer(model, feature_names, meta)
+             if model is not None and not isinstance(model, compact_model.CompactModel) else None)
+
+# جدول الاستهلاك المحسوب مسبقاً (المسار السريع لـ predict-manual)
+depreciation_table = None
+if model is not None and os.environ.get('DEPRECIATION_TABLE', '1') != '0':
+    depreciation_table = depreciation.open_table(name_le_map, expected_version=model_version)
+    if depreciation_table is not None:
+        logger.info(f"✅ جدول الاستهلاك محمل: {depreciation_table.manifest['n_keys']} مفتاح")
+
+# نموذج مرشح للتقييم الظلي (SHADOW_MODEL_PATH) - خارج مسار الطلب
+shadow_scorer = shadow.open_shadow(feature_names, meta, encoder=encoder, version_fn=compute_model_version) if model is not None else None
+
+def shadow_submit(route, X, prices, tier='full'):
+    """إرسال التنبؤ المقدم للعميل إلى الطابور الظلي (لا ينتظر أبداً)"""
+    if shadow_scorer is not None and tier == 'full':
+        shadow_scorer.submit(route, X, prices)
+
+# مراقبة انحراف المدخلات مقابل بيانات التدريب (مخططات ثابتة الحجم لكل عامل)
+drift_monitor = drift.open_drift_monitor(getattr(db, 'store', None), feature_names, scaler_params, name_le_map)
+
+def drift_observe(route, X=None, record=None):
+    """إضافة مدخلات الطلب إلى مخططات الانحراف (مصفوفة مرمّزة أو إدخال خام)"""
+    if drift_monitor is None:
+        return
+    try:
+        if record is not None:
+            drift_monitor.observe_record(route, record)
+        else:
+            drift_monitor.observe(route, X)
+    except Exception as e:
+        logger.warning(f"⚠️ تعذر تحديث مخططات الانحراف: {e}")
+
+# الكتالوج المنشور (نسخ متزايدة + فروق) لمزامنة تطبيق الجوال
+catalog_state = catalog.open_catalog(expected_hash=catalog.content_hash(catalog.build_snapshot(
+    name_le_map, cat_levels, getattr(db, 'store', None), scaler_params)))
+
+metrics.set_info('car_price_model', {
+    'version': model_version,
+    'best_iteration': meta.get('best_iteration', ''),
+    'features': len(feature_names),
+})
+
+# ===== CACHES =====
+# البيانات ثابتة طوال عمر العملية، لذلك تُحسب هذه الاستجابات مرة واحدة
+_cache = {}
+
+# الذاكرة الدافئة الدائمة (cache/warm/<نموذج>-<بيانات>): تبقى بعد إعادة التشغيل
+warm_state = warm_cache.open_warm_cache(getattr(getattr(db, 'store', None), 'version', None))
+WARM_RESPONSES = ('car_names', 'database_stats')
+ROW_PRICE_BATCH = 65536
+
+def cached(key, compute):
+    """إرجاع قيمة محفوظة أو حسابها مرة واحدة مع تسجيل hit/miss (الذاكرة الدافئة قبل الحساب)"""
+    if key in _cache:
+        metrics.record_cache(key, True)
+        return _cache[key]
+    metrics.record_cache(key, False)
+    value = warm_state.get(key) if warm_state is not None and key in WARM_RESPONSES else None
+    if value is None:
+        value = compute()
+    _cache[key] = value
+    return value
+
+def _car_names():
+    return sorted(list(name_le_map.keys())) if name_le_map else []
+
+def _row_prices(tier):
+    """أسعار كل صفوف مخزن الميزات لـ tier (دفعات ثابتة الحجم لتبقى الذاكرة ثابتة)"""
+    store = db.store
+    num_iter = TIER_CUTOFFS[tier] or TIER_CUTOFFS['full']
+    booster = getattr(model, 'booster_', model)
+    prices = np.empty(store.n_rows, dtype=np.float64)
+    for start in range(0, store.n_rows, ROW_PRICE_BATCH):
+        X = store.X[start:start + ROW_PRICE_BATCH]
+        raw = booster.predict(X, num_iteration=num_iter, **concurrency.predict_kwargs(model, len(X)))
+        prices[start:start + len(X)] = inverse_target(raw, meta)
+    return prices
+
+def _data_ranges():
+    return {c: db.get_data_range(c) for c in db.get_statistics().get('numeric_columns', [])}
+
+if warm_state is not None and db is not None:
+    warm_state.register('car_names', warm_cache.JSON, _car_names)
+    warm_state.register('database_stats', warm_cache.JSON, db.get_statistics)
+    warm_state.register('data_ranges', warm_cache.JSON, _data_ranges)
+    if model is not None and db.store.features == feature_names:
+        warm_state.register('row_prices_full', warm_cache.ARRAY, lambda: _row_prices('full'))
+        if meta.get('tiers', {}).get('fast'):
+            warm_state.register('row_prices_fast', warm_cache.ARRAY, lambda: _row_prices('fast'))
+
+# ===== REQUEST METRICS =====
+@app.before_request
+def _start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.route = request.endpoint or 'unmatched'
+    metrics.IN_FLIGHT.labels(route=g.route).inc()
+    if profiler.active:
+        profiler.enter_request(g.route)
+
+@app.after_request
+def _record_request_metrics(response):
+    route = g.get('route', 'unmatched')
+    metrics.REQUESTS.labels(route=route, method=request.method, status=response.status_code).inc()
+    start = g.get('request_start')
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        metrics.REQUEST_LATENCY.labels(route=route).observe(elapsed)
+        audit.record('access', route=route, method=request.method, path=request.path,
+                     status=response.status_code, latency_ms=round(elapsed * 1000, 3))
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    route = g.pop('route', None)
+    if route is not None:
+        metrics.IN_FLIGHT.labels(route=route).dec()
+    if profiler.active:
+        profiler.exit_request()
+
+# ===== ADMISSION CONTROL =====
+# يُسجل بعد مقاييس الطلب حتى تُحسب الطلبات المرفوضة (503) في المقاييس والسجل
+@app.before_request
+def _admit_request():
+    return admission.admit()
+
+@app.teardown_request
+def _release_admission(exc):
+    admission.release()
+
+if os.environ.get('PROFILER_SIGNAL') == '1':
+    profiler.install_signal_handler()
 
 # ===== HELPER FUNCTIONS =====
 def validate_input(data, required_fields):
@@ -92,6 +278,47 @@ def format_price(price):
     """تنسيق السعر بصيغة محلية"""
     return f"{int(price):,}"
 
+def elapsed_ms():
+    """الزمن منذ بداية الطلب بالميلي ثانية"""
+    start = g.get('request_start')
+    return round((time.perf_counter() - start) * 1000, 3) if start is not None else None
+
+def is_admin_request():
+    """التحقق من رمز الإدارة في الترويسة X-Admin-Token"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+# ===== ACCURACY TIERS =====
+# tier=fast|full -> عدد الأشجار المستخدمة (fast محسوب في evaluate_model.py --write-tiers)
+# إعادة التدريب تكتب lgbm_meta.json بدون tiers: fast مرفوض حتى يُعاد حساب القطع للنموذج الجديد
+TIER_CUTOFFS = {
+    'full': getattr(model, 'best_iteration_', None) or meta.get('best_iteration'),
+    'fast': meta.get('tiers', {}).get('fast'),
+}
+
+# tier=approx (predict-manual فقط): جدول الاستهلاك المحسوب مسبقاً، تقريب صريح للنموذج
+# الكامل (خطأ p99 ~3%)؛ لا يُستخدم أبداً لطلبات full
+APPROX_TIER = 'approx'
+
+def resolve_tier(data, extra=()):
+    """
+    قراءة tier من جسم الطلب أو ?tier= (الافتراضي full)
+
+    Args:
+        extra: أسماء tier إضافية يقبلها هذا المسار (عدد أشجارها = full)
+
+    Returns:
+        (tier, num_iteration, رسالة خطأ أو None)
+    """
+    tier = (data.get('tier') if isinstance(data, dict) else None) or request.args.get('tier') or 'full'
+    if tier in extra:
+        return tier, TIER_CUTOFFS['full'], None
+    if tier not in TIER_CUTOFFS:
+        return tier, None, f'tier غير صحيح ({", ".join([*TIER_CUTOFFS, *extra])})'
+    if tier != 'full' and TIER_CUTOFFS[tier] is None:
+        return tier, None, f'tier={tier} غير متاح لهذا النموذج (شغّل evaluate_model.py --write-tiers)'
+    return tier, TIER_CUTOFFS[tier] or TIER_CUTOFFS['full'], None
+
 # ===== API ENDPOINTS =====
 
 @app.route('/api/health', methods=['GET'])
@@ -101,18 +328,37 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'model_loaded': model is not None,
-        'data_loaded': df is not None
+        'data_loaded': db is not None,
+        'ready': warmup_state.ready
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """جاهزية العامل: 200 فقط بعد تحميل الأصول واكتمال الإحماء"""
+    status = warmup_state.status()
+    status['ready'] = status['ready'] and model is not None and db is not None
+    if not status['ready']:
+        response = jsonify({'success': False, **status})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'success': True, **status})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """مقاييس Prometheus مجمعة من جميع العمال"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/car-names', methods=['GET'])
 def get_car_names():
     """الحصول على قائمة أسماء السيارات"""
     try:
-        names = sorted(list(name_le_map.keys())) if name_le_map else []
+        names = cached('car_names', _car_names)
         return jsonify({
             'success': True,
             'names': names,
-            'count': len(names)
+            'count': len(names),
+            'catalog_version': catalog_state.version if catalog_state is not None else None
         })
     except Exception as e:
         logger.error(f"خطأ في get_car_names: {e}")
@@ -128,53 +374,120 @@ def get_car_info():
             'transmissions': cat_levels.get('transmission', []),
             'owner_counts': cat_levels.get('owner', [])
         }
-        return jsonify({'success': True, 'info': info})
+        return jsonify({
+            'success': True,
+            'info': info,
+            'catalog_version': catalog_state.version if catalog_state is not None else None
+        })
     except Exception as e:
         logger.error(f"خطأ في get_car_info: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/catalog/delta', methods=['GET'])
+def get_catalog_delta():
+    """
+    تغييرات الكتالوج منذ نسخة العميل (?since=<version>)
+    since=0 أو نسخة غير معروفة -> اللقطة كاملة مع full=true
+    """
+    try:
+        if catalog_state is None:
+            return jsonify({'success': False, 'error': 'الكتالوج غير منشور'}), 503
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return jsonify({'success': False, 'error': 'since يجب أن يكون رقم نسخة صحيحاً'}), 400
+
+        etag = f'catalog-{catalog_state.version}-{since}'
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        delta = catalog_state.delta(since)
+        response = jsonify({'success': True, **delta})
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response
+    except Exception as e:
+        logger.error(f"خطأ في get_catalog_delta: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/predict-row', methods=['POST'])
 def predict_row():
     """التنبؤ بسعر سيارة من صف في البيانات"""
     try:
+        timer = metrics.StageTimer('predict_row')
         data = request.json
         row_idx = data.get('row_index', 0)
+        tier, num_iter, msg = resolve_tier(data)
+        if msg:
+            return jsonify({'success': False, 'error': msg}), 400
+        timer.mark('parse')
         
-        if df is None:
+        if db is None:
             return jsonify({'success': False, 'error': 'البيانات غير محملة'}), 500
         
-        if row_idx < 0 or row_idx >= len(df):
-            return jsonify({'success': False, 'error': f'رقم الصف غير صحيح (0-{len(df)-1})'}), 400
+        n_rows = db.get_row_count()
+        if row_idx < 0 or row_idx >= n_rows:
+            return jsonify({'success': False, 'error': f'رقم الصف غير صحيح (0-{n_rows-1})'}), 400
         
-        X_row = df.drop(columns=['selling_price']).iloc[[int(row_idx)]].copy()
-        X_row = X_row.reindex(columns=feature_names, fill_value=0)
-        
-        # التنبؤ
-        num_iter = getattr(model, 'best_iteration_', None)
-        if num_iter is not None:
-            y_pred_raw = model.predict(X_row, num_iteration=num_iter)[0]
+        store = getattr(db, 'store', None)
+        row_prices = None
+        if store is not None and store.features == feature_names:
+            # صف واحد من مخزن الميزات (memmap) بدون نسخ الجدول
+            X_row = store.X[int(row_idx):int(row_idx) + 1]
+            # أسعار كل الصفوف محسوبة مسبقاً في الذاكرة الدافئة (نفس النموذج والبيانات)
+            row_prices = warm_state.get(f'row_prices_{tier}') if warm_state is not None else None
         else:
-            y_pred_raw = model.predict(X_row)[0]
+            X_row = db.df.drop(columns=['selling_price']).iloc[[int(row_idx)]].copy()
+            X_row = X_row.reindex(columns=feature_names, fill_value=0)
+        timer.mark('lookup')
         
-        # عكس التحويل
-        transform = meta.get('target_transform')
-        inverse = meta.get('inverse_transform')
-        if transform == 'log1p' and inverse == 'expm1':
-            y_pred = float(np.expm1(y_pred_raw))
+        if row_prices is not None:
+            y_pred = float(row_prices[int(row_idx)])
+            source = 'warm_cache'
+            timer.mark('predict')
         else:
-            y_pred = float(y_pred_raw)
+            if admission.expired():
+                return admission.overloaded_response('deadline')
+            
+            # التنبؤ
+            y_pred_raw = model.predict(X_row, num_iteration=num_iter, **concurrency.predict_kwargs(model, 1))[0]
+            timer.mark('predict')
+            
+            # عكس التحويل
+            transform = meta.get('target_transform')
+            inverse = meta.get('inverse_transform')
+            if transform == 'log1p' and inverse == 'expm1':
+                y_pred = float(np.expm1(y_pred_raw))
+            else:
+                y_pred = float(y_pred_raw)
+            
+            if y_pred < 0:
+                y_pred = 0.0
+            source = 'model'
         
-        if y_pred < 0:
-            y_pred = 0.0
+        if store is not None:
+            y_true = float(store.y[int(row_idx)])
+        else:
+            y_true = float(db.df.iloc[int(row_idx)]['selling_price']) if 'selling_price' in db.df.columns else 0.0
+        timer.mark('inverse')
         
-        y_true = float(df.iloc[int(row_idx)]['selling_price']) if 'selling_price' in df.columns else 0.0
+        audit.record('prediction', route='predict_row', model_version=model_version,
+                     latency_ms=elapsed_ms(), inputs={'row_index': int(row_idx)},
+                     encoded=np.asarray(X_row, dtype=float)[0].tolist(),
+                     prediction=y_pred, real_price=y_true, tier=tier, source=source)
+        shadow_submit('predict_row', X_row, y_pred, tier)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'predicted_price': y_pred,
             'real_price': y_true,
-            'row_index': int(row_idx)
+            'row_index': int(row_idx),
+            'tier': tier,
+            'source': source
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في predict_row: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -183,58 +496,54 @@ def predict_row():
 def predict_manual():
     """التنبؤ بسعر سيارة من إدخال يدوي"""
     try:
+        timer = metrics.StageTimer('predict_manual')
         data = request.json
+        tier, num_iter, msg = resolve_tier(data, extra=(APPROX_TIER,))
+        if msg:
+            return jsonify({'success': False, 'error': msg}), 400
+        timer.mark('parse')
         
         # التحقق من الحقول المطلوبة
         required = ['car_name', 'year', 'km', 'engine', 'power', 'mileage', 'seats', 'fuel', 'transmission', 'seller', 'owner']
         is_valid, msg = validate_input(data, required)
         if not is_valid:
             return jsonify({'success': False, 'error': msg}), 400
+        drift_observe('predict_manual', record=data)
+        timer.mark('validate')
         
-        # بناء الميزات
-        features = {
-            'km_driven': float(data.get('km', 0)),
-            'engine': float(data.get('engine', 0)),
-            'max_power': float(data.get('power', 0)),
-            'seats': float(data.get('seats', 0)),
-            'mileage': float(data.get('mileage', 0)),
-            'name_le': float(name_le_map.get(data.get('car_name', ''), 0)) if name_le_map else 0.0,
-            'car_age': float(2025 - int(data.get('year', 2025))),
-        }
+        # tier=approx: جدول الاستهلاك (بحث + استيفاء) عندما يقع الإدخال على الشبكة
+        if tier == APPROX_TIER and depreciation_table is not None:
+            y_raw = depreciation_table.lookup_raw(data)
+            metrics.record_cache('depreciation_table', y_raw is not None)
+            if y_raw is not None:
+                y_pred = float(inverse_target(y_raw, meta))
+                timer.mark('table')
+                audit.record('prediction', route='predict_manual', model_version=model_version,
+                             latency_ms=elapsed_ms(), inputs=data, prediction=y_pred, source='table',
+                             tier=tier)
+                # لا إرسال للتقييم الظلي: سعر الجدول تقريب للنموذج الأساسي وخطؤه (حتى ~8%)
+                # كان سيُحسب اختلافاً للنموذج المرشح
+                response = jsonify({
+                    'success': True,
+                    'predicted_price': y_pred,
+                    'source': 'table',
+                    'tier': tier
+                })
+                timer.mark('serialize')
+                return response
+        if tier == APPROX_TIER:
+            tier = 'full'  # خارج الشبكة (أو بدون جدول): النموذج الكامل
         
-        # تطبيع الميزات
-        means = scaler_params.get('means', {})
-        scales = scaler_params.get('scales', {})
-        for c in ['km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age']:
-            if c in means and c in scales and scales.get(c, 0) not in (0, None):
-                features[c] = (features[c] - means[c]) / scales[c]
-        
-        # ترميز One-hot
-        onehots = {
-            f'fuel_{data.get("fuel", "")}': 1,
-            f'seller_{data.get("seller", "")}': 1,
-            f'trans_{data.get("transmission", "")}': 1,
-            f'owner_{data.get("owner", "")}': 1,
-        }
+        # نفس المرمّز المشترك مع sweep و bulk والتقييم الظلي
+        X_manual = encoder.encode_one(data)
+        timer.mark('features')
         
-        # بناء الصف
-        row = {}
-        for col in feature_names:
-            if col in features:
-                row[col] = features[col]
-            elif col in onehots:
-                row[col] = 1
-            else:
-                row[col] = 0
-        
-        X_manual = pd.DataFrame([row], columns=feature_names)
+        if admission.expired():
+            return admission.overloaded_response('deadline')
         
         # التنبؤ
-        num_iter = getattr(model, 'best_iteration_', None)
-        if num_iter is not None:
-            y_pred_raw = model.predict(X_manual, num_iteration=num_iter)[0]
-        else:
-            y_pred_raw = model.predict(X_manual)[0]
+        y_pred_raw = model.predict(X_manual, num_iteration=num_iter, **concurrency.predict_kwargs(model, 1))[0]
+        timer.mark('predict')
         
         # عكس التحويل
         transform = meta.get('target_transform')
@@ -246,22 +555,306 @@ def predict_manual():
         
         if y_pred < 0:
             y_pred = 0.0
+        timer.mark('inverse')
         
-        return jsonify({
+        audit.record('prediction', route='predict_manual', model_version=model_version,
+                     latency_ms=elapsed_ms(), inputs=data,
+                     encoded=X_manual[0].tolist(), prediction=y_pred, source='model', tier=tier)
+        shadow_submit('predict_manual', X_manual, y_pred, tier)
+        
+        response = jsonify({
             'success': True,
-            'predicted_price': y_pred
+            'predicted_price': y_pred,
+            'source': 'model',
+            'tier': tier
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في predict_manual: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# حدود شبكة what-if
+MAX_SWEEP_AXES = 2
+MAX_AXIS_STEPS = 500
+MAX_SWEEP_POINTS = 20000
+SWEEP_FIELDS = set(NUMERIC_FIELDS) | {'year'} | set(CATEGORICAL_FIELDS)
+
+def parse_sweep_axis(axis):
+    """
+    محور واحد: {"field": "km", "start": 0, "stop": 200000, "steps": 50}
+    أو {"field": "owner", "values": ["0", "1", "2"]}
+    """
+    if not isinstance(axis, dict):
+        return None, 'كل محور يجب أن يكون كائناً'
+    field = axis.get('field')
+    if field not in SWEEP_FIELDS:
+        return None, f'الحقل {field} غير مدعوم في المحاور ({", ".join(sorted(SWEEP_FIELDS))})'
+    if 'values' in axis:
+        values = axis['values']
+        if not isinstance(values, list) or not values:
+            return None, f'values للحقل {field} يجب أن تكون قائمة غير فارغة'
+        if len(values) > MAX_AXIS_STEPS:
+            return None, f'الحد الأقصى {MAX_AXIS_STEPS} قيمة لكل محور'
+        if field in CATEGORICAL_FIELDS:
+            return (field, [str(v) for v in values]), None
+        try:
+            values = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None, f'values للحقل {field} يجب أن تكون أرقاماً'
+        if not np.isfinite(values).all():
+            return None, f'values للحقل {field} يجب أن تكون أرقاماً محدودة'
+        if field == 'year' and len(np.unique(np.round(values))) != len(values):
+            return None, 'values للحقل year تحتوي سنوات مكررة'
+    else:
+        if field in CATEGORICAL_FIELDS:
+            return None, f'الحقل الفئوي {field} يتطلب values'
+        try:
+            start, stop = float(axis['start']), float(axis['stop'])
+            steps = int(axis.get('steps', 0))
+        except (KeyError, TypeError, ValueError):
+            return None, f'المحور {field} يتطلب start و stop و steps'
+        if not 2 <= steps <= MAX_AXIS_STEPS:
+            return None, f'steps يجب أن يكون بين 2 و {MAX_AXIS_STEPS}'
+        if not (np.isfinite(start) and np.isfinite(stop)):
+            return None, f'start و stop للمحور {field} يجب أن تكون أرقاماً محدودة'
+        values = np.linspace(start, stop, steps)
+    if field == 'year':
+        # بترتيب الطلب؛ التقريب في نطاق start/stop قد يكرر سنة فتُحذف النسخ اللاحقة فقط
+        values = np.asarray(list(dict.fromkeys(np.round(values).astype(int).tolist())))
+    return (field, values.tolist()), None
+
+@app.route('/api/predict-sweep', methods=['POST'])
+def predict_sweep():
+    """شبكة أسعار what-if: مواصفات أساسية + محور أو محوران، بتنبؤ دفعي واحد"""
+    try:
+        timer = metrics.StageTimer('predict_sweep')
+        data = request.json or {}
+        base = data.get('base')
+        axes_in = data.get('axes')
+        tier, num_iter, msg = resolve_tier(data)
+        if msg:
+            return jsonify({'success': False, 'error': msg}), 400
+        timer.mark('parse')
+        
+        if not isinstance(base, dict):
+            return jsonify({'success': False, 'error': 'base مطلوب (نفس حقول predict-manual)'}), 400
+        if not isinstance(axes_in, list) or not 1 <= len(axes_in) <= MAX_SWEEP_AXES:
+            return jsonify({'success': False, 'error': f'axes يجب أن تحتوي محوراً واحداً أو {MAX_SWEEP_AXES}'}), 400
+        
+        axes = []
+        for axis in axes_in:
+            parsed, msg = parse_sweep_axis(axis)
+            if msg:
+                return jsonify({'success': False, 'error': msg}), 400
+            axes.append(parsed)
+        fields = [f for f, _ in axes]
+        if len(set(fields)) != len(fields):
+            return jsonify({'success': False, 'error': 'لا يمكن تكرار نفس الحقل في محورين'}), 400
+        
+        is_valid, msg = validate_input(base, [f for f in REQUIRED_FIELDS if f not in fields])
+        if not is_valid:
+            return jsonify({'success': False, 'error': msg}), 400
+        
+        shape = tuple(len(v) for _, v in axes)
+        n = int(np.prod(shape))
+        if n > MAX_SWEEP_POINTS:
+            return jsonify({'success': False, 'error': f'حجم الشبكة {n} يتجاوز الحد {MAX_SWEEP_POINTS}'}), 400
+        # الشبكة نفسها اصطناعية؛ المواصفات الأساسية فقط هي مدخلات حقيقية
+        drift_observe('predict_sweep', record=base)
+        timer.mark('validate')
+        
+        # الأعمدة: قيم المحاور على الشبكة (ij) والباقي قيم مفردة تُبث
+        columns = {k: v for k, v in base.items()}
+        grids = np.meshgrid(*[np.asarray(v, dtype=object) for _, v in axes], indexing='ij')
+        for (field, _), grid in zip(axes, grids):
+            columns[field] = grid.ravel()
+        X = encoder.encode_columns(columns, n)
+        timer.mark('encode')
+        
+        if admission.expired():
+            return admission.overloaded_response('deadline')
+        
+        y_raw = model.predict(X, num_iteration=num_iter, **concurrency.predict_kwargs(model, n))
+        timer.mark('predict')
+        
+        prices = inverse_target(y_raw, meta).reshape(shape)
+        timer.mark('inverse')
+        
+        # الشبكة كاملة: قيم المحاور بعد التحليل (بترتيب الأبعاد) + الأسعار بنفس الشكل
+        audit.record('prediction', route='predict_sweep', model_version=model_version,
+                     latency_ms=elapsed_ms(), inputs=data, count=n, tier=tier,
+                     axes=[{'field': f, 'values': v} for f, v in axes], prices=prices)
+        shadow_submit('predict_sweep', X, prices.reshape(-1), tier)
+        
+        response = jsonify({
+            'success': True,
+            'axes': [{'field': f, 'values': v} for f, v in axes],
+            'shape': list(shape),
+            'prices': prices.tolist(),
+            'count': n,
+            'tier': tier
+        })
+        timer.mark('serialize')
+        return response
+    except Exception as e:
+        logger.error(f"خطأ في predict_sweep: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+MAX_EXPLAIN_BATCH = 200  # TreeSHAP ~2.6ms/صف على نواة واحدة
+
+# حد صفوف التقييم الدفعي (100k صف × 21 ميزة float32 ≈ 8.4MB)
+MAX_BULK_ROWS = int(os.environ.get('MAX_BULK_ROWS', 200000))
+
+@app.route('/api/predict-bulk', methods=['POST'])
+def predict_bulk():
+    """
+    تقييم دفعي لصفوف مشفرة بترتيب lgbm_features.txt
+    Content-Type:
+        application/x-car-price-f32          مصفوفة float32 خام (انظر bulk_format.py)
+        application/vnd.apache.arrow.stream  Arrow IPC (يتطلب pyarrow)
+        application/json                     {"columns": [...], "rows": [[...], ...]}
+    الرد بنفس صيغة الطلب؛ ?tier=fast|full
+    """
+    try:
+        if model is None:
+            return jsonify({'success': False, 'error': 'النموذج غير محمل'}), 500
+        timer = metrics.StageTimer('predict_bulk')
+        content_type = (request.mimetype or '').lower()
+        max_bytes = MAX_BULK_ROWS * len(feature_names) * 8 + 65536
+        if request.content_length and request.content_length > max_bytes:
+            return jsonify({'success': False, 'error': f'الحد الأقصى {MAX_BULK_ROWS} صف'}), 413
+
+        data = request.get_json(silent=True) if content_type == 'application/json' else {}
+        tier, num_iter, msg = resolve_tier(data or {})
+        if msg:
+            return jsonify({'success': False, 'error': msg}), 400
+
+        copied = False
+        try:
+            if content_type in (bulk_format.RAW_MIMETYPE, 'application/octet-stream'):
+                header, matrix = bulk_format.decode_raw(request.get_data(cache=False))
+                X, copied = bulk_format.model_input(header['columns'], matrix, feature_names)
+                fmt = 'raw'
+            elif content_type == bulk_format.ARROW_MIMETYPE:
+                if not bulk_format.arrow_available():
+                    return jsonify({'success': False, 'error': 'Arrow غير مدعوم على هذا الخادم (pyarrow غير مثبت)',
+                                    'supported': [bulk_format.RAW_MIMETYPE, 'application/json']}), 415
+                X = bulk_format.decode_arrow(request.get_data(cache=False), feature_names)
+                copied, fmt = True, 'arrow'
+            elif content_type == 'application/json':
+                if not isinstance(data, dict) or not isinstance(data.get('rows'), list):
+                    return jsonify({'success': False, 'error': 'rows مطلوب (قائمة صفوف)'}), 400
+                matrix = np.asarray(data['rows'], dtype=np.float64)
+                if matrix.ndim != 2:
+                    return jsonify({'success': False, 'error': 'rows يجب أن تكون مصفوفة ثنائية الأبعاد'}), 400
+                X, copied = bulk_format.model_input(data.get('columns', feature_names), matrix, feature_names)
+                fmt = 'json'
+            else:
+                return jsonify({'success': False, 'error': f'Content-Type غير مدعوم: {content_type}',
+                                'supported': [bulk_format.RAW_MIMETYPE, bulk_format.ARROW_MIMETYPE,
+                                              'application/json']}), 415
+        except (bulk_format.BulkFormatError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        n = len(X)
+        if n == 0 or n > MAX_BULK_ROWS:
+            return jsonify({'success': False, 'error': f'عدد الصفوف يجب أن يكون بين 1 و {MAX_BULK_ROWS}'}), 400
+        drift_observe('predict_bulk', X)
+        timer.mark('decode')
+
+        if admission.expired():
+            return admission.overloaded_response('deadline')
+
+        # Booster مباشرة: float32 المتجاور يصل إلى LightGBM كمؤشر بدون تحويل
+        y_raw = getattr(model, 'booster_', model).predict(X, num_iteration=num_iter,
+                                                          **concurrency.predict_kwargs(model, n))
+        timer.mark('predict')
+        prices = inverse_target(y_raw, meta)
+        timer.mark('inverse')
+
+        # بصمة مدخلات النموذج (بترتيب lgbm_features.txt) + سعر كل صف؛ التحويل إلى JSON في الخيط الكاتب
+        audit.record('prediction', route='predict_bulk', model_version=model_version,
+                     latency_ms=elapsed_ms(), count=n, format=fmt, tier=tier,
+                     inputs_sha256=hashlib.sha256(np.ascontiguousarray(X).tobytes()).hexdigest(),
+                     inputs_dtype=X.dtype.str, predictions=prices)
+        shadow_submit('predict_bulk', X, prices, tier)
+
+        headers = {'X-Model-Version': model_version, 'X-Tier': tier, 'X-Input-Copied': str(copied).lower()}
+        if fmt == 'raw':
+            body = bulk_format.encode_raw(prices, [bulk_format.OUTPUT_COLUMN],
+                                          extra={'model_version': model_version, 'tier': tier})
+            response = Response(body, mimetype=bulk_format.RAW_MIMETYPE, headers=headers)
+        elif fmt == 'arrow':
+            body = bulk_format.encode_arrow(prices, {'model_version': model_version, 'tier': tier})
+            response = Response(body, mimetype=bulk_format.ARROW_MIMETYPE, headers=headers)
+        else:
+            response = jsonify({'success': True, 'predictions': prices.tolist(), 'count': n, 'tier': tier})
+            response.headers.update(headers)
+        timer.mark('serialize')
+        return response
+    except Exception as e:
+        logger.error(f"خطأ في predict_bulk: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/explain', methods=['POST'])
+def explain_prediction():
+    """
+    مساهمة كل ميزة في السعر (TreeSHAP) لسيارة واحدة (نفس حقول predict-manual)
+    أو لدفعة عبر {"items": [...]}
+    """
+    try:
+        timer = metrics.StageTimer('explain_prediction')
+        data = request.json or {}
+        batch = 'items' in data
+        items = data['items'] if batch else [data]
+        timer.mark('parse')
+        
+        if explainer is None:
+            return jsonify({'success': False, 'error': 'التفسير غير متاح (النموذج غير محمل أو مضغوط)'}), 503
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': 'items يجب أن تكون قائمة غير فارغة'}), 400
+        if len(items) > MAX_EXPLAIN_BATCH:
+            return jsonify({'success': False, 'error': f'الحد الأقصى {MAX_EXPLAIN_BATCH} سيارة في الطلب'}), 400
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                return jsonify({'success': False, 'error': f'العنصر {i} يجب أن يكون كائناً'}), 400
+            is_valid, msg = validate_input(item, REQUIRED_FIELDS)
+            if not is_valid:
+                return jsonify({'success': False, 'error': f'العنصر {i}: {msg}' if batch else msg}), 400
+        timer.mark('validate')
+        
+        X = encoder.encode_records(items)
+        timer.mark('encode')
+        
+        if admission.expired():
+            return admission.overloaded_response('deadline')
+        
+        results = explainer.explain(X)
+        timer.mark('explain')
+        
+        audit.record('explanation', route='explain_prediction', model_version=model_version,
+                     latency_ms=elapsed_ms(), count=len(items))
+        
+        if batch:
+            response = jsonify({'success': True, 'results': results, 'count': len(results)})
+        else:
+            response = jsonify({'success': True, **results[0]})
+        timer.mark('serialize')
+        return response
+    except Exception as e:
+        logger.error(f"خطأ في explain_prediction: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/model-info', methods=['GET'])
 def get_model_info():
     """الحصول على معلومات النموذج"""
     try:
         return jsonify({
             'success': True,
-            'info': meta
+            'info': meta,
+            'model_version': model_version,
+            'backend': type(model).__name__ if model is not None else None,
+            'concurrency': concurrency.status()
         })
     except Exception as e:
         logger.error(f"خطأ في get_model_info: {e}")
@@ -274,11 +867,15 @@ def get_database_stats():
         if db is None:
             return jsonify({'success': False, 'error': 'قاعدة البيانات غير محملة'}), 500
         
-        stats = db.get_statistics()
-        return jsonify({
+        timer = metrics.StageTimer('get_database_stats')
+        stats = cached('database_stats', db.get_statistics)
+        timer.mark('query')
+        response = jsonify({
             'success': True,
             'stats': stats
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في get_database_stats: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -293,13 +890,19 @@ def get_all_cars():
         limit = request.args.get('limit', type=int)
         offset = request.args.get('offset', default=0, type=int)
         
+        timer = metrics.StageTimer('get_all_cars')
         cars = db.get_all_cars(limit=limit, offset=offset)
-        return jsonify({
+        timer.mark('query')
+        if admission.expired():
+            return admission.overloaded_response('deadline')
+        response = jsonify({
             'success': True,
             'cars': cars,
             'total': db.get_row_count(),
             'count': len(cars)
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في get_all_cars: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -333,16 +936,26 @@ def search_cars():
         
         query = request.args.get('q', '')
         column = request.args.get('column', 'name_le')
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', default=0, type=int)
         
         if not query:
             return jsonify({'success': False, 'error': 'نص البحث مطلوب'}), 400
         
-        results = db.search_cars(query, column)
-        return jsonify({
+        timer = metrics.StageTimer('search_cars')
+        page = db.search_page(query, column, limit=limit, offset=offset)
+        results = page['results']
+        timer.mark('query')
+        if admission.expired():
+            return admission.overloaded_response('deadline')
+        response = jsonify({
             'success': True,
             'results': results,
-            'count': len(results)
+            'count': len(results),
+            'total': page['total']
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في search_cars: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -354,19 +967,255 @@ def get_data_range(column):
         if db is None:
             return jsonify({'success': False, 'error': 'قاعدة البيانات غير محملة'}), 500
         
-        data_range = db.get_data_range(column)
+        timer = metrics.StageTimer('get_data_range')
+        ranges = warm_state.get('data_ranges') if warm_state is not None else None
+        data_range = ranges[column] if ranges is not None and column in ranges else db.get_data_range(column)
+        timer.mark('query')
         if not data_range:
             return jsonify({'success': False, 'error': 'العمود غير موجود'}), 404
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'column': column,
             'range': data_range
         })
+        timer.mark('serialize')
+        return response
     except Exception as e:
         logger.error(f"خطأ في get_data_range: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/database/top/<column>', methods=['GET'])
+def get_top_cars(column):
+    """أعلى (أو أدنى مع order=asc) k سيارة حسب عمود رقمي"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'قاعدة البيانات غير محملة'}), 500
+
+        k = request.args.get('k', default=10, type=int)
+        order = request.args.get('order', 'desc')
+        if not 1 <= k <= 1000 or order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'error': 'k بين 1 و 1000 و order هو asc أو desc'}), 400
+
+        timer = metrics.StageTimer('get_top_cars')
+        cars = db.get_top_cars(column, k, largest=order == 'desc')
+        timer.mark('query')
+        if not cars:
+            return jsonify({'success': False, 'error': 'العمود غير موجود'}), 404
+
+        response = jsonify({
+            'success': True,
+            'column': column,
+            'order': order,
+            'cars': cars,
+            'count': len(cars)
+        })
+        timer.mark('serialize')
+        return response
+    except Exception as e:
+        logger.error(f"خطأ في get_top_cars: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ===== CHARTS =====
+# خدمة الرسم تُنشأ عند أول طلب حتى لا يحمل كل عامل matplotlib/seaborn/plotly دون حاجة
+_chart_service = None
+_chart_service_lock = threading.Lock()
+
+def get_chart_service():
+    global _chart_service
+    if _chart_service is None and db is not None:
+        with _chart_service_lock:
+            if _chart_service is None:
+                from chart_service import ChartService
+                _chart_service = ChartService(db)
+    return _chart_service
+
+@app.route('/api/charts', methods=['GET'])
+def list_charts():
+    """أنواع المخططات المتاحة وحالة ذاكرة الرسم"""
+    try:
+        service = get_chart_service()
+        if service is None:
+            return jsonify({'success': False, 'error': 'قاعدة البيانات غير محملة'}), 500
+        return jsonify({'success': True, **service.status()})
+    except ImportError as e:
+        # مكتبات الرسم (matplotlib/seaborn/plotly) غير مثبتة على هذا الخادم
+        return jsonify({'success': False, 'error': f'المخططات غير متاحة على هذا الخادم: {e}'}), 503
+    except Exception as e:
+        logger.error(f"خطأ في list_charts: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/charts/<kind>', methods=['GET'])
+def render_chart(kind):
+    """
+    رسم مخطط عند الطلب
+    ?column=km_driven&filter=fuel=Diesel|Petrol,selling_price>=300000
+    """
+    try:
+        service = get_chart_service()
+        if service is None:
+            return jsonify({'success': False, 'error': 'قاعدة البيانات غير محملة'}), 500
+        from chart_service import ChartRequestError, RENDER_TIMEOUT
+
+        column = request.args.get('column')
+        filter_expr = request.args.get('filter')
+        timer = metrics.StageTimer('render_chart')
+        try:
+            etag = service.cache_key(kind, column, filter_expr)[0]
+        except KeyError:
+            return jsonify({'success': False, 'error': f'نوع مخطط غير معروف: {kind}', 'kinds': service.kinds()}), 404
+        except ChartRequestError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        # المفتاح يتضمن نسخة البيانات، فالـ ETag المطابق يعني أن المخطط لم يتغير
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        try:
+            body, mimetype, source, key = service.get(kind, column, filter_expr,
+                                                      timeout=admission.remaining(RENDER_TIMEOUT))
+        except ChartRequestError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except FutureTimeoutError:
+            # الرسم يكمل في الخلفية ويُحفظ، فإعادة المحاولة ستجده جاهزاً
+            return admission.overloaded_response('deadline')
+        timer.mark('render' if source in ('render', 'shared') else 'cache')
+
+        response = Response(body, mimetype=mimetype)
+        response.headers['ETag'] = f'"{key}"'
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        response.headers['X-Chart-Source'] = source
+        return response
+    except ImportError as e:
+        # مكتبات الرسم (matplotlib/seaborn/plotly) غير مثبتة على هذا الخادم
+        return jsonify({'success': False, 'error': f'المخططات غير متاحة على هذا الخادم: {e}'}), 503
+    except Exception as e:
+        logger.error(f"خطأ في render_chart: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/shadow', methods=['GET'])
+def admin_shadow():
+    """إحصائيات اختلاف النموذج المرشح عن الأساسي (لهذا العامل)"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'غير مصرح'}), 403
+    if shadow_scorer is None:
+        return jsonify({'success': False, 'error': 'الوضع الظلي غير مفعل (SHADOW_MODEL_PATH)'}), 404
+    return jsonify({'success': True, 'primary_version': model_version, 'shadow': shadow_scorer.status()})
+
+@app.route('/api/admin/drift', methods=['GET'])
+def admin_drift():
+    """درجات انحراف المدخلات (PSI / KS) مقابل بيانات التدريب (لهذا العامل)"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'غير مصرح'}), 403
+    if drift_monitor is None:
+        return jsonify({'success': False, 'error': 'مراقبة الانحراف غير مفعلة (DRIFT_MONITOR)'}), 404
+    return jsonify({'success': True, 'model_version': model_version, 'drift': drift_monitor.status()})
+
+@app.route('/api/admin/warm-cache', methods=['GET'])
+def admin_warm_cache():
+    """حالة الذاكرة الدافئة الدائمة (المفتاح، الآثار المحملة/المبنية، الحجم)"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'غير مصرح'}), 403
+    if warm_state is None:
+        return jsonify({'success': False, 'error': 'الذاكرة الدافئة غير مفعلة (WARM_CACHE)'}), 404
+    return jsonify({'success': True, 'warm_cache': warm_state.status()})
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """بدء جلسة تحليل أداء في هذا العامل (POST) أو عرض حالتها (GET)"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'غير مصرح'}), 403
+    try:
+        if request.method == 'GET':
+            return jsonify({'success': True, 'profile': profiler.current_status()})
+        
+        data = request.get_json(silent=True) or {}
+        requests_limit = data.get('requests')
+        status = profiler.start(
+            seconds=float(data.get('seconds', profiler.DEFAULT_SECONDS)),
+            requests=int(requests_limit) if requests_limit is not None else None,
+            interval=float(data.get('interval_ms', profiler.DEFAULT_INTERVAL * 1000)) / 1000,
+        )
+        if 'error' in status:
+            return jsonify({'success': False, 'error': 'جلسة تحليل قيد التشغيل بالفعل', 'profile': status}), 409
+        return jsonify({'success': True, 'profile': status}), 202
+    except Exception as e:
+        logger.error(f"خطأ في admin_profile: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/profile/<profile_id>', methods=['GET'])
+def admin_profile_result(profile_id):
+    """تحميل ملف collapsed-stack لجلسة منتهية"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'غير مصرح'}), 403
+    content = profiler.read_profile(profile_id)
+    if content is None:
+        return jsonify({'success': False, 'error': 'ملف التحليل غير موجود'}), 404
+    return Response(content, mimetype='text/plain; charset=utf-8')
+
+# ===== WARM-UP =====
+def _warmup_predictions():
+    """تنبؤات تجريبية لكل توليفات الفئات: صف واحد (مسار الطلب) ثم دفعة كاملة"""
+    if model is None:
+        return 'skipped'
+    base = {c: 0.0 for c in feature_names}  # الميزات الرقمية المطبعة = المتوسط
+    if 'name_le' in base and name_le_map:
+        base['name_le'] = float(np.median(list(name_le_map.values())))
+    rows = []
+    for fuel, seller, trans, owner in itertools.product(
+            cat_levels.get('fuel', []), cat_levels.get('seller_type', []),
+            cat_levels.get('transmission', []), cat_levels.get('owner', [])):
+        row = dict(base)
+        for col in (f'fuel_{fuel}', f'seller_{seller}', f'trans_{trans}', f'owner_{owner}'):
+            if col in row:
+                row[col] = 1.0
+        rows.append(row)
+    if not rows:
+        rows.append(base)
+    X = pd.DataFrame(rows, columns=feature_names)
+    num_iter = getattr(model, 'best_iteration_', None)
+    kwargs = {'num_iteration': num_iter} if num_iter is not None else {}
+    # نفس عدد الخيوط الذي ستستخدمه الطلبات الحقيقية
+    for i in range(len(X)):
+        model.predict(X.iloc[[i]], **kwargs, **concurrency.predict_kwargs(model, 1))
+    model.predict(X, **kwargs, **concurrency.predict_kwargs(model, len(X)))
+    store = getattr(db, 'store', None)
+    if store is not None and store.features == feature_names:
+        model.predict(store.X[0:1], **kwargs, **concurrency.predict_kwargs(model, 1))
+    return {'combinations': len(rows)}
+
+def _warmup_caches():
+    """تعبئة ذاكرات الكتالوج والإحصائيات"""
+    cached('car_names', _car_names)
+    if db is not None:
+        cached('database_stats', db.get_statistics)
+    return sorted(_cache)
+
+def _warmup_dataset_pages():
+    """قراءة بايت من كل صفحة في ملفات memmap (مخزن الميزات، جدول الاستهلاك) لتحميلها في ذاكرة الصفحات"""
+    store = getattr(db, 'store', None)
+    if store is None:
+        return 'skipped'
+    arrays = [store.X, store.y, store.meta]
+    if depreciation_table is not None:
+        arrays.append(depreciation_table.table)
+    touched = 0
+    for arr in arrays:
+        raw = np.asarray(arr).reshape(-1).view(np.uint8)
+        int(raw[::4096].sum())
+        touched += raw.nbytes
+    return {'bytes': touched}
+
+# تحميل آثار الذاكرة الدافئة (memmap) الآن وبناء الناقص في الخلفية - لا ينتظر الإحماء البناء
+if warm_state is not None:
+    warm_state.start()
+
+warmup_state = Warmup()
+warmup_state.start([
+    ('dataset_pages', _warmup_dataset_pages),
+    ('predictions', _warmup_predictions),
+    ('caches', _warmup_caches),
+])
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'success': False, 'error': 'الـ Endpoint غير موجود'}), 404
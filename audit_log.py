@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+سجل التدقيق غير المتزامن - Asynchronous Audit & Access Logging
+تسجيل منظم (JSON) للطلبات والتنبؤات دون أي انتظار I/O في مسار الطلب
+
+- setup_logging(): يستبدل logging.basicConfig بـ QueueHandler + QueueListener،
+  فيصبح استدعاء logger.info() مجرد إضافة إلى طابور.
+- AuditLog: طابور محدود + خيط كاتب خلفي يجمع السجلات على دفعات ويكتبها إلى
+  ملفات JSON-lines دوّارة (لكل عامل ملف) أو إلى جدول SQLite محلي.
+  عند امتلاء الطابور يتم إسقاط السجل وعدّه بدلاً من حجب الطلب.
+- الحقول قد تكون مصفوفات numpy (مثل أسعار دفعة كاملة): تحويلها إلى قوائم JSON
+  يتم في الخيط الكاتب وليس في مسار الطلب.
+
+الإعداد عبر متغيرات البيئة:
+    AUDIT_LOG=0              تعطيل سجل التدقيق
+    AUDIT_SINK=jsonl|sqlite  وجهة الكتابة (الافتراضي jsonl)
+    AUDIT_DIR=logs           مجلد الملفات
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+AUDIT_DIR = Path(os.environ.get('AUDIT_DIR', BASE_DIR / 'logs'))
+AUDIT_SINK = os.environ.get('AUDIT_SINK', 'jsonl')
+AUDIT_ENABLED = os.environ.get('AUDIT_LOG', '1') != '0'
+
+QUEUE_SIZE = 10_000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+MAX_FILE_BYTES = 50 * 1024 * 1024
+BACKUP_COUNT = 5
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _json_default(value):
+    """مصفوفات وأعداد numpy في السجلات (تُحوّل في الخيط الكاتب)"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} غير قابل للتحويل إلى JSON')
+
+
+def setup_logging(level=logging.INFO):
+    """
+    إعداد Logging غير متزامن للعملية كلها
+    جميع المعالجات الفعلية (stderr) تعمل في خيط QueueListener
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class _JsonlSink:
+    """ملف JSON-lines لكل عامل مع تدوير حسب الحجم"""
+
+    def __init__(self, directory: Path):
+        self.path = directory / f'audit-{os.getpid()}.jsonl'
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, records: List[Dict[str, Any]]):
+        self.file.write(''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':'), default=_json_default) + '\n'
+                                for r in records))
+        self.file.flush()
+        if self.file.tell() >= MAX_FILE_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(BACKUP_COUNT - 1, 0, -1):
+            src = self.path.with_name(f'{self.path.name}.{i}')
+            if src.exists():
+                os.replace(src, self.path.with_name(f'{self.path.name}.{i + 1}'))
+        os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+
+class _SqliteSink:
+    """جدول SQLite مشترك بين العمال (WAL) مع إدخال دفعات في معاملة واحدة"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            kind TEXT NOT NULL,
+            route TEXT,
+            status INTEGER,
+            latency_ms REAL,
+            model_version TEXT,
+            prediction REAL,
+            payload TEXT
+        )
+    '''
+
+    def __init__(self, directory: Path):
+        self.conn = sqlite3.connect(directory / 'audit.sqlite3', timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(self.SCHEMA)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)')
+        self.conn.commit()
+
+    def write(self, records: List[Dict[str, Any]]):
+        rows = [
+            (
+                r.get('ts'), r.get('kind'), r.get('route'), r.get('status'), r.get('latency_ms'),
+                r.get('model_version'), r.get('prediction'),
+                json.dumps({k: v for k, v in r.items() if k not in self._COLUMNS}, ensure_ascii=False,
+                           default=_json_default),
+            )
+            for r in records
+        ]
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO events (ts, kind, route, status, latency_ms, model_version, prediction, payload) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+
+    _COLUMNS = {'ts', 'kind', 'route', 'status', 'latency_ms', 'model_version', 'prediction'}
+
+    def close(self):
+        self.conn.close()
+
+
+class AuditLog:
+    """
+    طابور سجلات محدود مع كاتب خلفي
+    record() لا يحجب أبداً: عند الامتلاء يُسقط السجل ويزيد عداد dropped
+    """
+
+    def __init__(self, sink: str = AUDIT_SINK, directory: Path = AUDIT_DIR, enabled: bool = AUDIT_ENABLED):
+        self.sink_name = sink
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self.written = 0
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        # الكاتب يبدأ عند أول سجل في كل عملية (آمن مع fork في gunicorn)
+        # القفل يمنع خيطين متزامنين من بدء كاتبين؛ _pid يُعيَّن أخيراً
+        # حتى لا يضع خيط آخر سجله في الطابور القديم قبل استبداله
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+            self._pid = os.getpid()
+
+    def record(self, kind: str, **fields):
+        """إضافة سجل إلى الطابور (بدون I/O)"""
+        if not self.enabled:
+            return
+        if self._pid != os.getpid():
+            self._ensure_writer()
+        fields['kind'] = kind
+        fields['ts'] = time.time()
+        try:
+            self.queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open_sink(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.sink_name == 'sqlite':
+            return _SqliteSink(self.directory)
+        return _JsonlSink(self.directory)
+
+    def _run(self):
+        try:
+            sink = self._open_sink()
+        except Exception as e:
+            logger.error(f"❌ تعذر فتح وجهة سجل التدقيق: {e}")
+            self.enabled = False
+            return
+
+        pid = os.getpid()
+        while True:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=FLUSH_INTERVAL))
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                for r in batch:
+                    r['pid'] = pid
+                try:
+                    sink.write(batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    logger.error(f"❌ خطأ في كتابة سجل التدقيق: {e}")
+            elif self._stop.is_set():
+                break
+        sink.close()
+
+    def close(self, timeout: float = 5.0):
+        """إنهاء الكاتب بعد تفريغ الطابور"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stop.set()
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sink': self.sink_name,
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+
+audit = AuditLog()
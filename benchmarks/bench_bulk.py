@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+⏱️ Bulk Scoring Benchmark: JSON vs raw float32 vs Arrow IPC
+قياس /api/predict-bulk بنفس الصفوف في كل صيغة (10k و 100k صف افتراضياً)
+
+Rows are sampled (with replacement) from the encoded feature store, so every
+format scores identical inputs.  For each format and size the suite measures
+client-side encoding, the request itself (server decode + predict + encode,
+via the Flask test client) and client-side decoding, and checks that all
+formats return the same prices.  Arrow is skipped when pyarrow is missing.
+
+Usage (from the repository root):
+    python benchmarks/bench_bulk.py
+    python benchmarks/bench_bulk.py --sizes 10000,100000 --repeats 5
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+REPORT_PATH = BASE_DIR / 'benchmarks' / 'results' / 'bulk.json'
+RANDOM_STATE = 42
+
+
+def _json_case(client, X, columns):
+    t0 = time.perf_counter()
+    body = json.dumps({'columns': columns, 'rows': X.tolist()})
+    t1 = time.perf_counter()
+    r = client.post('/api/predict-bulk', data=body, content_type='application/json')
+    t2 = time.perf_counter()
+    prices = np.asarray(json.loads(r.data)['predictions'], dtype=np.float64)
+    t3 = time.perf_counter()
+    return r.status_code, prices, len(body), (t1 - t0, t2 - t1, t3 - t2)
+
+
+def _raw_case(client, X, columns):
+    import bulk_format
+    t0 = time.perf_counter()
+    body = bulk_format.encode_raw(X, columns)
+    t1 = time.perf_counter()
+    r = client.post('/api/predict-bulk', data=body, content_type=bulk_format.RAW_MIMETYPE)
+    t2 = time.perf_counter()
+    _header, prices = bulk_format.decode_raw(r.data)
+    t3 = time.perf_counter()
+    return r.status_code, prices[:, 0].astype(np.float64), len(body), (t1 - t0, t2 - t1, t3 - t2)
+
+
+def _arrow_case(client, X, columns):
+    import pyarrow as pa
+    import bulk_format
+    t0 = time.perf_counter()
+    table = pa.table({c: X[:, i] for i, c in enumerate(columns)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    body = sink.getvalue().to_pybytes()
+    t1 = time.perf_counter()
+    r = client.post('/api/predict-bulk', data=body, content_type=bulk_format.ARROW_MIMETYPE)
+    t2 = time.perf_counter()
+    out = pa.ipc.open_stream(pa.py_buffer(r.data)).read_all()
+    prices = out.column(bulk_format.OUTPUT_COLUMN).to_numpy().astype(np.float64)
+    t3 = time.perf_counter()
+    return r.status_code, prices, len(body), (t1 - t0, t2 - t1, t3 - t2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/predict-bulk formats')
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    # بدون مهلة القبول (JSON لـ 100k صف يتجاوز مهلة predict) وبدون سجل التدقيق
+    os.environ.setdefault('ADMISSION_CONTROL', '0')
+    os.environ.setdefault('AUDIT_LOG', '0')
+    os.environ.setdefault('WARMUP', '0')
+    logging.disable(logging.WARNING)
+    import app as app_module
+    import bulk_format
+    from feature_store import open_feature_store
+
+    client = app_module.app.test_client()
+    store = open_feature_store(build_if_missing=True)
+    columns = app_module.feature_names
+    rng = np.random.default_rng(RANDOM_STATE)
+
+    cases = {'json': _json_case, 'raw_f32': _raw_case}
+    if bulk_format.arrow_available():
+        cases['arrow'] = _arrow_case
+    else:
+        print("⚠️ pyarrow غير مثبت - تخطي Arrow")
+
+    report = {'cpu_count': os.cpu_count(), 'results': []}
+    for n in [int(s) for s in args.sizes.split(',')]:
+        X = np.ascontiguousarray(np.asarray(store.X)[rng.integers(0, store.n_rows, n)], dtype=np.float32)
+        reference = None
+        # زمن النموذج وحده: ما يتبقى من زمن الطلب هو تكلفة الصيغة
+        booster = getattr(app_module.model, 'booster_', app_module.model)
+        num_iter = app_module.TIER_CUTOFFS['full']
+        predict_s = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            booster.predict(X, num_iteration=num_iter)
+            predict_s.append(time.perf_counter() - t0)
+        predict_ms = statistics.median(predict_s) * 1000
+        print(f"\n📦 {n:,} صف (النموذج وحده {predict_ms:.1f}ms)")
+        for name, case in cases.items():
+            case(client, X[:100], columns)  # إحماء
+            timings = []
+            for _ in range(args.repeats):
+                status, prices, size, parts = case(client, X, columns)
+                assert status == 200, f'{name}: HTTP {status}'
+                timings.append(parts)
+            if reference is None:
+                reference = prices
+            max_diff = float(np.max(np.abs(prices - reference) / np.maximum(reference, 1.0)))
+            enc, req, dec = (statistics.median(t[i] for t in timings) for i in range(3))
+            total = enc + req + dec
+            row = {'format': name, 'rows': n, 'request_bytes': size,
+                   'encode_ms': round(enc * 1000, 1), 'request_ms': round(req * 1000, 1),
+                   'decode_ms': round(dec * 1000, 1), 'total_ms': round(total * 1000, 1),
+                   'rows_per_s': round(n / total), 'model_ms': round(predict_ms, 1),
+                   'format_overhead_ms': round(total * 1000 - predict_ms, 1), 'max_rel_diff_vs_json': max_diff}
+            report['results'].append(row)
+            print(f"  {name:8s} {size / 1e6:7.2f}MB  encode {row['encode_ms']:8.1f}ms  request {row['request_ms']:8.1f}ms"
+                  f"  decode {row['decode_ms']:7.1f}ms  total {row['total_ms']:8.1f}ms  {row['rows_per_s']:>9,} rows/s"
+                  f"  overhead {row['format_overhead_ms']:8.1f}ms  Δ {max_diff:.1e}")
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    REPORT_PATH.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\n💾 {REPORT_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+⏱️ Endpoint Latency Benchmarks
+قياس زمن الاستجابة لكل Endpoint عبر Flask test client مع خط أساس محفوظ
+
+Every route in app.py is driven in-process with realistic payloads: manual
+prediction specs are reconstructed from random rows of cleaned_cars.csv
+(de-scaled with scaler_params.json, names from name_le_mapping.json), row
+indices, search terms and range columns are sampled the same way.
+
+For each case the suite records p50/p95/p99 latency, throughput and
+allocations per request (tracemalloc, measured in a separate pass so it does
+not distort the timings), writes a JSON report and compares it with a stored
+baseline.  Baselines are machine-specific: regenerate them with
+``--save-baseline`` on the box you compare on.
+
+Usage (from the repository root):
+    python benchmarks/bench_endpoints.py
+    python benchmarks/bench_endpoints.py --cases predict_manual,predict_row -n 2000
+    python benchmarks/bench_endpoints.py --save-baseline
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# ===== CONFIGURATION =====
+DATA_PATH = BASE_DIR / 'dataset' / 'cleaned_cars.csv'
+NAME_LE_JSON = BASE_DIR / 'name_le_mapping.json'
+SCALER_JSON = BASE_DIR / 'scaler_params.json'
+FEATURES_PATH = BASE_DIR / 'lgbm_features.txt'
+REPORT_PATH = BASE_DIR / 'benchmarks' / 'results' / 'endpoints.json'
+BASELINE_PATH = BASE_DIR / 'benchmarks' / 'baselines' / 'endpoints.json'
+
+DEFAULT_ITERATIONS = 500
+WARMUP = 20
+SETTLE_SECONDS = 120          # background warmup / warm-cache builds must finish before timing
+BULK_ROWS = 100
+SWEEP_STEPS = 50
+ALLOC_ITERATIONS = 50
+REGRESSION_THRESHOLD = 0.20   # 20% slower p50/p95 counts as a regression
+RANDOM_STATE = 42
+REFERENCE_YEAR = 2025
+NUMERIC_FIELDS = {
+    'km': 'km_driven',
+    'engine': 'engine',
+    'power': 'max_power',
+    'mileage': 'mileage',
+    'seats': 'seats',
+}
+
+
+# ===== PAYLOADS =====
+def _onehot_level(row, prefix):
+    for col, val in row.items():
+        if col.startswith(prefix) and val == 1:
+            return col[len(prefix):]
+    return ''
+
+
+def build_manual_payloads(df, n, rng):
+    """Reconstruct raw /api/predict-manual bodies from encoded dataset rows."""
+    scaler = json.loads(SCALER_JSON.read_text(encoding='utf-8'))
+    code_to_name = {v: k for k, v in json.loads(NAME_LE_JSON.read_text(encoding='utf-8')).items()}
+    means, scales = scaler['means'], scaler['scales']
+
+    payloads = []
+    for idx in rng.integers(0, len(df), size=n):
+        row = df.iloc[int(idx)]
+        body = {
+            'car_name': code_to_name.get(int(row['name_le']), ''),
+            'year': int(round(REFERENCE_YEAR - (row['car_age'] * scales['car_age'] + means['car_age']))),
+            'fuel': _onehot_level(row, 'fuel_'),
+            'transmission': _onehot_level(row, 'trans_'),
+            'seller': _onehot_level(row, 'seller_'),
+            'owner': _onehot_level(row, 'owner_'),
+        }
+        for field, col in NUMERIC_FIELDS.items():
+            body[field] = round(float(row[col] * scales[col] + means[col]), 2)
+        payloads.append(body)
+    return payloads
+
+
+def build_cases(df, iterations, rng):
+    """
+    Benchmark cases: name -> (method, [(path, json_body), ...]).
+    Each case gets ``iterations`` pre-built requests so sampling is not timed.
+    """
+    n_rows = len(df)
+    numeric_cols = [c for c in ['km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age', 'selling_price']
+                    if c in df.columns]
+    name_codes = df['name_le'].astype(int).to_numpy()
+    full_iters = max(5, iterations // 50)
+
+    manual = build_manual_payloads(df, iterations, rng)
+    features = [f for f in FEATURES_PATH.read_text(encoding='utf-8').splitlines() if f]
+    bulk_iters = max(5, iterations // 10)
+    bulk = [{'columns': features, 'rows': df[features].iloc[rng.integers(0, n_rows, size=BULK_ROWS)].values.tolist()}
+            for _ in range(bulk_iters)]
+    sweeps = [{'base': body, 'axes': [{'field': 'km', 'start': 0, 'stop': 200000, 'steps': SWEEP_STEPS}]}
+              for body in manual[:bulk_iters]]
+    return {
+        'health': ('GET', [('/api/health', None)] * iterations),
+        'car_names': ('GET', [('/api/car-names', None)] * iterations),
+        'car_info': ('GET', [('/api/car-info', None)] * iterations),
+        'predict_manual': ('POST', [('/api/predict-manual', body) for body in manual]),
+        'predict_row': ('POST', [('/api/predict-row', {'row_index': int(i)})
+                                 for i in rng.integers(0, n_rows, size=iterations)]),
+        'predict_sweep': ('POST', [('/api/predict-sweep', body) for body in sweeps]),
+        'predict_bulk': ('POST', [('/api/predict-bulk', body) for body in bulk]),
+        'explain': ('POST', [('/api/explain', body) for body in manual[:bulk_iters]]),
+        'database_cars_page': ('GET', [(f'/api/database/cars?limit=50&offset={int(o)}', None)
+                                       for o in rng.integers(0, max(n_rows - 50, 1), size=iterations)]),
+        'database_cars_full': ('GET', [('/api/database/cars', None)] * full_iters),
+        'database_car': ('GET', [(f'/api/database/car/{int(i)}', None)
+                                 for i in rng.integers(0, n_rows, size=iterations)]),
+        'database_search': ('GET', [(f'/api/database/search?q={int(c)}&column=name_le', None)
+                                    for c in rng.choice(name_codes, size=max(5, iterations // 10))]),
+        'database_range': ('GET', [(f'/api/database/range/{c}', None)
+                                   for c in rng.choice(numeric_cols, size=iterations)]),
+        'database_stats': ('GET', [('/api/database/stats', None)] * iterations),
+        'database_top': ('GET', [(f'/api/database/top/{c}?k=20', None)
+                                 for c in rng.choice(numeric_cols, size=iterations)]),
+    }
+
+
+# ===== MEASUREMENT =====
+def _call(client, method, path, body):
+    if method == 'POST':
+        return client.post(path, json=body)
+    return client.get(path)
+
+
+def run_case(client, method, requests_):
+    """Time each request; returns latency stats (ms) and throughput."""
+    for path, body in requests_[:WARMUP]:
+        _call(client, method, path, body)
+
+    latencies = np.empty(len(requests_), dtype=np.float64)
+    errors = 0
+    gc.collect()
+    t_start = time.perf_counter()
+    for i, (path, body) in enumerate(requests_):
+        t0 = time.perf_counter_ns()
+        resp = _call(client, method, path, body)
+        latencies[i] = (time.perf_counter_ns() - t0) / 1e6
+        if resp.status_code >= 400:
+            errors += 1
+    wall = time.perf_counter() - t_start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(requests_),
+        'errors': errors,
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(latencies.mean()), 4),
+        'throughput_rps': round(len(requests_) / wall, 2) if wall > 0 else None,
+    }
+
+
+def measure_allocations(client, method, requests_):
+    """Average allocated bytes/blocks and peak traced memory per request."""
+    sample = requests_[:ALLOC_ITERATIONS]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        for path, body in sample:
+            _call(client, method, path, body)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    alloc_bytes = sum(s.size_diff for s in stats if s.size_diff > 0)
+    alloc_blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    return {
+        'retained_bytes_per_req': round(alloc_bytes / len(sample), 1),
+        'retained_blocks_per_req': round(alloc_blocks / len(sample), 1),
+        'peak_traced_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(report, baseline, threshold):
+    """Flag cases whose p50 or p95 got slower than the baseline by > threshold."""
+    regressions = []
+    for name, cur in report['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            b, c = base.get(key), cur.get(key)
+            if b and c and (c - b) / b > threshold:
+                regressions.append({'case': name, 'metric': key, 'baseline': b, 'current': c,
+                                    'change_pct': round(100 * (c - b) / b, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask endpoint latency benchmarks')
+    parser.add_argument('-n', '--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--cases', default='', help='comma-separated subset of cases')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--report', type=Path, default=REPORT_PATH)
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--no-alloc', action='store_true', help='skip the tracemalloc pass')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    import app as app_module
+    app_module.warmup_state.wait(SETTLE_SECONDS)
+    if app_module.warm_state is not None:
+        app_module.warm_state.wait(SETTLE_SECONDS)
+
+    client = app_module.app.test_client()
+    df = pd.read_csv(DATA_PATH)
+    rng = np.random.default_rng(RANDOM_STATE)
+    cases = build_cases(df, args.iterations, rng)
+    if args.cases:
+        wanted = set(args.cases.split(','))
+        cases = {k: v for k, v in cases.items() if k in wanted}
+
+    print("=" * 78)
+    print("⏱️  Endpoint benchmarks")
+    print("=" * 78)
+    print(f"{'case':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'KB/req':>10}")
+
+    results = {}
+    for name, (method, reqs) in cases.items():
+        stats = run_case(client, method, reqs)
+        if not args.no_alloc:
+            stats.update(measure_allocations(client, method, reqs))
+        results[name] = stats
+        kb = stats.get('retained_bytes_per_req')
+        print(f"{name:<22}{stats['requests']:>6}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+              f"{stats['p99_ms']:>10.3f}{stats['throughput_rps']:>10.1f}"
+              f"{(kb / 1024 if kb is not None else float('nan')):>10.1f}")
+
+    report = {
+        'created_at': pd.Timestamp.now().isoformat(),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'iterations': args.iterations,
+        'cases': results,
+    }
+
+    regressions = []
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        regressions = compare(report, baseline, args.threshold)
+        report['regressions'] = regressions
+
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\n💾 Report saved: {args.report}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f"💾 Baseline saved: {args.baseline}")
+    elif regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s) beyond {int(100 * args.threshold)}%:")
+        for r in regressions:
+            print(f"  - {r['case']:<22} {r['metric']}: {r['baseline']:.3f} → {r['current']:.3f} ms (+{r['change_pct']}%)")
+        raise SystemExit(1)
+    elif args.baseline.exists():
+        print("✅ No regressions vs baseline")
+
+
+if __name__ == '__main__':
+    main()
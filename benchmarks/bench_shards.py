@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+🧩 Sharded Catalog Benchmark: single DataFrame vs N shard processes
+قياس زمن استعلامات قاعدة البيانات بجدول واحد مقابل 2 و 4 أجزاء
+
+The listing history is scaled up by tiling dataset/cleaned_cars.csv
+``--scale`` times into a temporary feature store (the repository store is
+not touched).  For every layout the suite times the queries that scan the
+whole table:
+
+    search      search_page('1', 'km_driven', limit=50)    substring scan + count
+    range       get_data_range('km_driven')                 moments + exact median
+    top         get_top_cars('selling_price', 20)           top-k merge
+    page        get_all_cars(limit=100, offset=n/2)         global paging
+
+and checks that every sharded answer equals the single-frame one (floats to
+1e-6 relative: the single frame reduces float32 columns in float32, shards in
+float64).  Shard processes only run in parallel when there are free cores;
+on a single-core machine the sharded layouts measure the IPC overhead.
+
+Usage (from the repository root):
+    python benchmarks/bench_shards.py
+    python benchmarks/bench_shards.py --scale 100 --shards 2,4,8 --repeats 7
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+REPORT_PATH = BASE_DIR / 'benchmarks' / 'results' / 'shards.json'
+CSV_PATH = BASE_DIR / 'dataset' / 'cleaned_cars.csv'
+
+
+def _queries(n_rows):
+    return {
+        'search': lambda db: db.search_page('1', 'km_driven', limit=50),
+        'range': lambda db: db.get_data_range('km_driven'),
+        'top': lambda db: db.get_top_cars('selling_price', 20),
+        'page': lambda db: db.get_all_cars(limit=100, offset=n_rows // 2),
+    }
+
+
+def _same(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6)
+    return a == b
+
+
+def build_scaled_store(scale, work_dir):
+    """نسخة مكررة scale مرة من البيانات في مخزن ميزات مؤقت"""
+    from feature_store import build_feature_store
+    csv_path = work_dir / 'cars.csv'
+    lines = CSV_PATH.read_text(encoding='utf-8').splitlines(keepends=True)
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write(lines[0])
+        for _ in range(scale):
+            f.writelines(lines[1:])
+    store_dir = work_dir / 'store'
+    build_feature_store(csv_path, store_dir)
+    return csv_path, store_dir
+
+
+def time_layout(db, queries, repeats):
+    out, answers = {}, {}
+    for name, query in queries.items():
+        answers[name] = query(db)  # إحماء (ذاكرة الأعمدة الرقمية في كل جزء)
+        samples = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            query(db)
+            samples.append(time.perf_counter() - t0)
+        out[name] = round(statistics.median(samples) * 1000, 2)
+    return out, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded vs single-frame catalog queries')
+    parser.add_argument('--scale', type=int, default=50, help='times to tile cleaned_cars.csv')
+    parser.add_argument('--shards', default='2,4', help='comma-separated shard counts')
+    parser.add_argument('--mode', choices=('hash', 'range'), default='hash')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='bench-shards-metrics-'))
+
+    import concurrency
+    from database import CarDatabase
+    from sharded_database import ShardedCarDatabase
+
+    with tempfile.TemporaryDirectory(prefix='bench-shards-') as tmp:
+        work_dir = Path(tmp)
+        t0 = time.perf_counter()
+        csv_path, store_dir = build_scaled_store(args.scale, work_dir)
+        single = CarDatabase(str(csv_path), store_dir)
+        n_rows = single.get_row_count()
+        print(f"🧩 {n_rows:,} صف ({args.scale}x) جاهزة في {time.perf_counter() - t0:.1f}s - "
+              f"{concurrency.available_cores()} نواة")
+        queries = _queries(n_rows)
+        report = {'rows': n_rows, 'scale': args.scale, 'mode': args.mode, 'cores': concurrency.available_cores(),
+                  'repeats': args.repeats, 'results': []}
+
+        baseline, expected = time_layout(single, queries, args.repeats)
+        report['results'].append({'shards': 1, 'latency_ms': baseline})
+        print(f"  {'single':8s} " + '  '.join(f"{k} {v:8.2f}ms" for k, v in baseline.items()))
+        del single
+
+        for count in (int(c) for c in args.shards.split(',')):
+            db = ShardedCarDatabase(str(csv_path), shards=count, mode=args.mode, store_dir=store_dir,
+                                    socket_dir=work_dir / f'sockets-{count}')
+            try:
+                latency, answers = time_layout(db, queries, args.repeats)
+            finally:
+                db.close()
+            mismatched = [k for k in queries if not _same(expected[k], answers[k])]
+            report['results'].append({'shards': count, 'latency_ms': latency,
+                                      'speedup': {k: round(baseline[k] / latency[k], 2) for k in latency},
+                                      'mismatched': mismatched})
+            print(f"  {f'{count} shards':8s} " + '  '.join(f"{k} {v:8.2f}ms" for k, v in latency.items())
+                  + (f"  ⚠️ mismatch {mismatched}" if mismatched else '  ✅'))
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    REPORT_PATH.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\n💾 {REPORT_PATH}")
+
+
+if __name__ == '__main__':
+    main()
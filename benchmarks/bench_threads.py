@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+🧵 LightGBM Threading Benchmark: default OpenMP teams vs concurrency.py policy
+قياس الإنتاجية وزمن الاستجابة لتخطيطات عمال × خيوط قبل وبعد سياسة التوازي
+
+Each layout ``WxT`` starts W spawned processes (one per gunicorn worker) with
+T Python threads each.  Every thread issues predictions back-to-back for
+``--duration`` seconds with batch sizes drawn from ``--mix`` (mostly single
+rows as in /api/predict-manual, some sweeps and a few bulk batches), so all
+W x T request slots are busy at once, which is the worst case for
+oversubscription.
+
+    before  model.predict(X, num_iteration)           LightGBM picks its own team
+    after   + concurrency.predict_kwargs(model, n)    policy from the same layout
+
+The HTTP stack is deliberately left out so the numbers isolate the model
+call.  ``--train`` additionally times lgb.train on the feature store with
+the library default vs ``concurrency.offline_threads()``.
+
+On a single-core machine both modes are expected to tie (OpenMP already
+uses one thread); the difference shows up on multi-core hosts.
+
+Usage (from the repository root):
+    python benchmarks/bench_threads.py
+    python benchmarks/bench_threads.py --layouts 1x1,4x1,4x4 --duration 10 --train
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+REPORT_PATH = BASE_DIR / 'benchmarks' / 'results' / 'threads.json'
+DEFAULT_MIX = '1:0.9,200:0.09,5000:0.01'
+MODES = ('before', 'after')
+
+
+def _parse_mix(text):
+    sizes, weights = [], []
+    for part in text.split(','):
+        size, weight = part.split(':')
+        sizes.append(int(size))
+        weights.append(float(weight))
+    weights = np.asarray(weights) / sum(weights)
+    return sizes, weights
+
+
+def _slot(model, X, mode, sizes, weights, seed, deadline, out):
+    import concurrency
+    rng = np.random.default_rng(seed)
+    num_iter = getattr(model, 'best_iteration_', None)
+    calls = []
+    while time.perf_counter() < deadline:
+        n = int(rng.choice(sizes, p=weights))
+        start = int(rng.integers(0, len(X) - n + 1))
+        batch = X[start:start + n]
+        kwargs = concurrency.predict_kwargs(model, n) if mode == 'after' else {}
+        t0 = time.perf_counter()
+        model.predict(batch, num_iteration=num_iter, **kwargs)
+        calls.append((n, time.perf_counter() - t0))
+    out.extend(calls)
+
+
+def _worker(mode, threads, duration, mix, seed, barrier, results):
+    """عامل واحد (مثل عامل Gunicorn) بـ threads خيط"""
+    import warnings
+    warnings.filterwarnings('ignore')
+    import joblib
+    from feature_store import open_feature_store
+    model = joblib.load(BASE_DIR / 'lgbm_model.pkl')
+    X = np.ascontiguousarray(np.asarray(open_feature_store(build_if_missing=True).X))
+    sizes, weights = _parse_mix(mix)
+    model.predict(X[:1])  # إحماء
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    calls = []
+    pool = [threading.Thread(target=_slot, args=(model, X, mode, sizes, weights, seed * 100 + i, deadline, calls))
+            for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(calls)
+
+
+def run_layout(workers, threads, mode, duration, mix):
+    ctx = mp.get_context('spawn')
+    # العمال يرثون التخطيط كما ينشره gunicorn.conf.py
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    os.environ['GUNICORN_THREADS'] = str(threads)
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, threads, duration, mix, w + 1, barrier, results))
+             for w in range(workers)]
+    for p in procs:
+        p.start()
+    calls = []
+    for _ in procs:
+        calls.extend(results.get())
+    for p in procs:
+        p.join()
+
+    rows = sum(n for n, _ in calls)
+    by_size = {}
+    for n, seconds in calls:
+        by_size.setdefault(n, []).append(seconds)
+    return {
+        'layout': f'{workers}x{threads}', 'mode': mode, 'calls': len(calls),
+        'rows_per_s': round(rows / duration), 'calls_per_s': round(len(calls) / duration),
+        'latency_ms': {str(n): {'p50': round(float(np.percentile(v, 50)) * 1000, 3),
+                                'p99': round(float(np.percentile(v, 99)) * 1000, 3), 'calls': len(v)}
+                       for n, v in sorted(by_size.items())},
+    }
+
+
+def time_training(rounds):
+    import lightgbm as lgb
+    import concurrency
+    from feature_store import open_feature_store
+    store = open_feature_store(build_if_missing=True)
+    X, y = np.asarray(store.X), np.log1p(np.asarray(store.y))
+    params = {'objective': 'regression', 'num_leaves': 31, 'learning_rate': 0.05, 'verbose': -1}
+    out = {}
+    for mode, extra in (('before', {}), ('after', {'num_threads': concurrency.offline_threads()})):
+        t0 = time.perf_counter()
+        lgb.train({**params, **extra}, lgb.Dataset(X, label=y), num_boost_round=rounds)
+        out[mode] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+def main():
+    import concurrency
+    cores = concurrency.available_cores()
+    parser = argparse.ArgumentParser(description='Benchmark LightGBM threading policy')
+    parser.add_argument('--layouts', default=f'1x1,{cores}x1,{cores}x2', help='comma-separated WORKERSxTHREADS')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per layout and mode')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='batch_size:weight pairs')
+    parser.add_argument('--train', action='store_true', help='also time lgb.train before/after')
+    parser.add_argument('--train-rounds', type=int, default=300)
+    args = parser.parse_args()
+
+    layouts = list(dict.fromkeys(args.layouts.split(',')))
+    report = {'cores': cores, 'mix': args.mix, 'duration': args.duration, 'results': []}
+    print(f"🧵 {cores} نواة متاحة - mix {args.mix}")
+    for layout in layouts:
+        workers, threads = (int(v) for v in layout.lower().split('x'))
+        for mode in MODES:
+            row = run_layout(workers, threads, mode, args.duration, args.mix)
+            report['results'].append(row)
+            single = row['latency_ms'].get('1', {})
+            print(f"  {layout:6s} {mode:6s}  {row['rows_per_s']:>9,} rows/s  {row['calls_per_s']:>7,} calls/s"
+                  f"  1-row p50 {single.get('p50', 0):7.3f}ms  p99 {single.get('p99', 0):7.3f}ms")
+    if args.train:
+        report['training_seconds'] = time_training(args.train_rounds)
+        print(f"  train {args.train_rounds} rounds: {report['training_seconds']}")
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    REPORT_PATH.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"\n💾 {REPORT_PATH}")
+
+
+if __name__ == '__main__':
+    main()
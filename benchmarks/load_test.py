@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+🔥 Local Load Test against Gunicorn
+اختبار تحميل محلي لـ wsgi:app تحت Gunicorn مع مسح إعدادات العمال والخيوط
+
+Starts the real ``wsgi:app`` under gunicorn on localhost for every
+combination of ``--workers`` x ``--threads`` x ``--worker-class``, replays a
+traffic mix at open-loop target rates (arrivals are scheduled on a fixed
+clock and never wait for earlier responses, so queueing shows up as latency
+instead of being hidden), and reports throughput, latency percentiles, error
+rate and total RSS for each configuration.
+
+The traffic mix is either read from a recorded JSON-lines file, one request
+per line::
+
+    {"method": "POST", "path": "/api/predict-manual", "body": {...}, "weight": 1}
+
+or generated from the dataset (the same payload builders as
+bench_endpoints.py).  The sweep maps 1:1 onto the environment variables read
+by ``start.sh`` (WEB_CONCURRENCY, GUNICORN_THREADS, GUNICORN_WORKER_CLASS).
+
+Usage (from the repository root):
+    python benchmarks/load_test.py --workers 1,2 --threads 1,4 --rates 50,100,200
+    python benchmarks/load_test.py --traffic recorded.jsonl --duration 20
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / 'benchmarks'))
+from bench_endpoints import DATA_PATH, build_cases
+
+# ===== CONFIGURATION =====
+REPORT_PATH = BASE_DIR / 'benchmarks' / 'results' / 'load_test.json'
+RANDOM_STATE = 42
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
+CLIENT_THREADS = 256
+P99_SLO_MS = 500.0
+
+# share of generated traffic per case (roughly what the mobile app sends)
+DEFAULT_MIX = {
+    'predict_manual': 0.45,
+    'predict_row': 0.10,
+    'car_names': 0.10,
+    'car_info': 0.05,
+    'health': 0.05,
+    'database_cars_page': 0.10,
+    'database_search': 0.05,
+    'database_range': 0.05,
+    'database_stats': 0.05,
+}
+
+
+# ===== TRAFFIC =====
+def load_traffic(path):
+    """Recorded traffic: list of (method, path, body) plus sampling weights."""
+    entries, weights = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            entries.append((rec.get('method', 'GET').upper(), rec['path'], rec.get('body')))
+            weights.append(float(rec.get('weight', 1.0)))
+    weights = np.asarray(weights)
+    return entries, weights / weights.sum()
+
+
+def generate_traffic(n_per_case=200):
+    """Synthetic traffic mix from dataset rows."""
+    df = pd.read_csv(DATA_PATH)
+    cases = build_cases(df, n_per_case, np.random.default_rng(RANDOM_STATE))
+    entries, weights = [], []
+    for name, share in DEFAULT_MIX.items():
+        method, reqs = cases[name]
+        for path, body in reqs:
+            entries.append((method, path, body))
+            weights.append(share / len(reqs))
+    weights = np.asarray(weights)
+    return entries, weights / weights.sum()
+
+
+# ===== SERVER =====
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, threads, worker_class, timeout):
+    cmd = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--worker-class', worker_class,
+        '--timeout', str(timeout),
+        '--log-level', 'warning',
+        'wsgi:app',
+    ]
+    env = {**os.environ, 'WEB_CONCURRENCY': str(workers), 'GUNICORN_THREADS': str(threads)}
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {proc.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/ready')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc
+            conn.close()
+        except OSError:
+            pass
+        time.sleep(0.25)
+    stop_server(proc)
+    raise RuntimeError('gunicorn did not become ready in time')
+
+
+def stop_server(proc):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def _children(pid):
+    kids = []
+    task_dir = Path(f'/proc/{pid}/task')
+    if not task_dir.exists():
+        return kids
+    for task in task_dir.iterdir():
+        try:
+            kids.extend(int(c) for c in (task / 'children').read_text().split())
+        except OSError:
+            pass
+    return kids
+
+
+def total_rss_mb(pid):
+    """RSS of the gunicorn master plus all workers (Linux /proc)."""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        p = pending.pop()
+        try:
+            for line in Path(f'/proc/{p}/status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total_kb += int(line.split()[1])
+                    break
+        except OSError:
+            continue
+        pending.extend(_children(p))
+    return round(total_kb / 1024, 1)
+
+
+# ===== LOAD GENERATION =====
+class _Client(threading.local):
+    conn = None
+
+
+def run_step(port, entries, weights, rate, duration, rng):
+    """
+    Open-loop load at ``rate`` req/s for ``duration`` seconds.
+
+    Latency is measured from each request's *scheduled* send time, so time
+    spent waiting for a free client slot or a busy server is included.
+    """
+    n = max(1, int(rate * duration))
+    picks = rng.choice(len(entries), size=n, p=weights)
+    schedule = np.arange(n) / rate
+    latencies = np.full(n, np.nan)
+    status = np.zeros(n, dtype=np.int32)
+    local = _Client()
+
+    def send(i, t_sched):
+        method, path, body = entries[picks[i]]
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in range(2):
+            try:
+                if local.conn is None:
+                    local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=REQUEST_TIMEOUT)
+                local.conn.request(method, path, body=payload, headers=headers)
+                resp = local.conn.getresponse()
+                resp.read()
+                status[i] = resp.status
+                break
+            except (OSError, http.client.HTTPException):
+                if local.conn is not None:
+                    local.conn.close()
+                local.conn = None
+                status[i] = -1
+        latencies[i] = (time.perf_counter() - t_sched) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENT_THREADS) as pool:
+        for i in range(n):
+            t_sched = t0 + schedule[i]
+            delay = t_sched - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, t_sched)
+    wall = time.perf_counter() - t0
+
+    ok = (status >= 200) & (status < 400)
+    lat_ok = latencies[ok]
+    pct = np.percentile(lat_ok, [50, 95, 99]) if len(lat_ok) else [np.nan] * 3
+    return {
+        'target_rps': rate,
+        'sent': n,
+        'throughput_rps': round(float(ok.sum()) / wall, 2),
+        'error_rate': round(float((~ok).mean()), 4),
+        'status_503': int((status == 503).sum()),
+        'p50_ms': round(float(pct[0]), 2),
+        'p95_ms': round(float(pct[1]), 2),
+        'p99_ms': round(float(pct[2]), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gunicorn load test with worker/thread sweeps')
+    parser.add_argument('--workers', default='1,2', help='comma-separated worker counts')
+    parser.add_argument('--threads', default='1,4', help='comma-separated thread counts')
+    parser.add_argument('--worker-class', default='sync,gthread', help='comma-separated worker classes')
+    parser.add_argument('--rates', default='25,50,100', help='comma-separated target req/s')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per rate step')
+    parser.add_argument('--timeout', type=int, default=120, help='gunicorn --timeout')
+    parser.add_argument('--traffic', type=Path, help='recorded JSON-lines traffic file')
+    parser.add_argument('--slo-p99', type=float, default=P99_SLO_MS, help='p99 budget (ms) for capacity')
+    parser.add_argument('--report', type=Path, default=REPORT_PATH)
+    args = parser.parse_args()
+
+    entries, weights = load_traffic(args.traffic) if args.traffic else generate_traffic()
+    rates = [float(r) for r in args.rates.split(',')]
+    configs = []
+    for w, t, wc in itertools.product(
+        [int(x) for x in args.workers.split(',')],
+        [int(x) for x in args.threads.split(',')],
+        args.worker_class.split(','),
+    ):
+        # sync workers ignore --threads; gthread with 1 thread equals sync
+        if (wc == 'sync' and t > 1) or (wc == 'gthread' and t == 1):
+            continue
+        configs.append((w, t, wc))
+
+    print("=" * 96)
+    print(f"🔥 Load test: {len(configs)} configs × {len(rates)} rates, {args.duration:.0f}s each, "
+          f"{len(entries)} distinct requests")
+    print("=" * 96)
+    print(f"{'workers':>7}{'threads':>8}{'class':>9}{'target':>8}{'rps':>9}{'err%':>7}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'RSS MB':>9}")
+
+    rng = np.random.default_rng(RANDOM_STATE)
+    results = []
+    for workers, threads, worker_class in configs:
+        port = free_port()
+        proc = start_server(port, workers, threads, worker_class, args.timeout)
+        try:
+            steps = []
+            for rate in rates:
+                step = run_step(port, entries, weights, rate, args.duration, rng)
+                step['rss_mb'] = total_rss_mb(proc.pid)
+                steps.append(step)
+                print(f"{workers:>7}{threads:>8}{worker_class:>9}{rate:>8.0f}{step['throughput_rps']:>9.1f}"
+                      f"{100 * step['error_rate']:>7.1f}{step['p50_ms']:>9.1f}{step['p95_ms']:>9.1f}"
+                      f"{step['p99_ms']:>9.1f}{step['rss_mb']:>9.1f}")
+        finally:
+            stop_server(proc)
+
+        within_slo = [s for s in steps if s['error_rate'] < 0.01 and s['p99_ms'] <= args.slo_p99]
+        results.append({
+            'workers': workers,
+            'threads': threads,
+            'worker_class': worker_class,
+            'steps': steps,
+            'capacity_rps': max((s['throughput_rps'] for s in within_slo), default=0.0),
+        })
+
+    # ties (e.g. every config keeps up with the offered load) go to the leanest one
+    best = max(results, key=lambda r: (r['capacity_rps'], -max(s['rss_mb'] for s in r['steps']))) if results else None
+    report = {
+        'created_at': pd.Timestamp.now().isoformat(),
+        'cpus': os.cpu_count(),
+        'duration_s': args.duration,
+        'slo_p99_ms': args.slo_p99,
+        'traffic': str(args.traffic) if args.traffic else 'generated',
+        'results': results,
+        'recommended': best and {k: best[k] for k in ('workers', 'threads', 'worker_class', 'capacity_rps')},
+    }
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    if best:
+        print(f"\n🏆 Best under p99 ≤ {args.slo_p99:.0f} ms: WEB_CONCURRENCY={best['workers']} "
+              f"GUNICORN_THREADS={best['threads']} GUNICORN_WORKER_CLASS={best['worker_class']} "
+              f"→ {best['capacity_rps']:.1f} req/s per node")
+    print(f"💾 Report saved: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,4 +5,15 @@ echo "Installing dependencies..."
 pip install --upgrade pip setuptools wheel
 pip install -r requirements.txt
 
+echo "Building encoded feature store..."
+python feature_store.py
+echo "Building depreciation table..."
+python depreciation.py
+echo "Checking published catalog..."
+python catalog.py --check || echo "⚠️ catalog/ is stale - run python catalog.py and commit catalog/"
+echo "Compacting model..."
+python compact_model.py
+echo "Building warm cache..."
+python warm_cache.py --build
+
 echo "Build completed successfully!"
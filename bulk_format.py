@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+صيغ التقييم الدفعي الثنائية - Binary Bulk-Scoring Formats
+لتقييم عشرات الآلاف من الصفوف دون تكلفة JSON (كائن Python لكل قيمة).
+
+1) مصفوفة float32 خام (application/x-car-price-f32):
+
+    0   4 بايت   MAGIC  b'CPB1'
+    4   4 بايت   uint32 little-endian: طول الترويسة (مع الحشو)
+    8   ترويسة JSON UTF-8 محشوة بمسافات حتى يبدأ الجسم على حد 8 بايت:
+            {"columns": [...], "rows": n, "dtype": "<f4"}
+    ... n × len(columns) قيم float32 little-endian بترتيب الصفوف (row-major)
+
+   الطلب: columns = ميزات lgbm_features.txt (بأي ترتيب؛ الترتيب المطابق = بدون نسخ)
+   الرد: نفس الصيغة بعمود واحد predicted_price.
+   القراءة عبر np.frombuffer على بايتات الطلب مباشرة، فالمصفوفة view بدون نسخ
+   وتصل إلى LightGBM كمؤشر float32 كما هي.
+
+2) Arrow IPC stream (application/vnd.apache.arrow.stream) - يتطلب pyarrow (اختياري):
+   جدول بأعمدة الميزات؛ الرد جدول بعمود predicted_price. تحويل الأعمدة إلى مصفوفة
+   صفوف نسخة واحدة متجهة (Arrow عمودي و LightGBM يحتاج صفوفاً متجاورة).
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # اعتمادية اختيارية
+    pa = None
+
+MAGIC = b'CPB1'
+RAW_MIMETYPE = 'application/x-car-price-f32'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+ALIGNMENT = 8
+OUTPUT_COLUMN = 'predicted_price'
+
+
+class BulkFormatError(ValueError):
+    """جسم طلب غير صالح (يرجع 400)"""
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _order(columns: List[str], feature_names: List[str]) -> Optional[np.ndarray]:
+    """فهارس إعادة الترتيب إلى ترتيب الميزات، أو None إذا كان الترتيب مطابقاً"""
+    # LightGBM يستبدل المسافات بـ _ في أسماء الميزات؛ نقبل الصيغتين
+    normalized = {c.replace(' ', '_'): i for i, c in enumerate(columns)}
+    missing = [f for f in feature_names if f.replace(' ', '_') not in normalized]
+    if missing:
+        raise BulkFormatError(f'أعمدة ناقصة: {missing}')
+    perm = np.array([normalized[f.replace(' ', '_')] for f in feature_names])
+    if len(columns) == len(feature_names) and np.array_equal(perm, np.arange(len(feature_names))):
+        return None
+    return perm
+
+
+# ===== RAW FLOAT32 =====
+
+def encode_raw(matrix: np.ndarray, columns: List[str], extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """ترميز مصفوفة (n, k) إلى صيغة CPB1"""
+    matrix = np.ascontiguousarray(matrix, dtype='<f4')
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(-1, 1)
+    header = dict(extra or {}, columns=list(columns), rows=int(matrix.shape[0]), dtype='<f4')
+    raw = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    pad = (-(len(MAGIC) + 4 + len(raw))) % ALIGNMENT
+    raw += b' ' * pad
+    return b''.join([MAGIC, struct.pack('<I', len(raw)), raw, matrix.tobytes()])
+
+
+def decode_raw(body: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    فك صيغة CPB1 إلى (الترويسة, مصفوفة view على body بدون نسخ)
+
+    Raises:
+        BulkFormatError: ترويسة أو أبعاد غير صالحة
+    """
+    if len(body) < 8 or body[:4] != MAGIC:
+        raise BulkFormatError('صيغة غير صالحة: MAGIC مفقود (CPB1)')
+    (header_len,) = struct.unpack_from('<I', body, 4)
+    offset = 8 + header_len
+    if offset > len(body):
+        raise BulkFormatError('ترويسة مقطوعة')
+    try:
+        header = json.loads(bytes(body[8:offset]).decode('utf-8'))
+        columns = list(header['columns'])
+        rows = int(header['rows'])
+    except (ValueError, KeyError, TypeError):
+        raise BulkFormatError('ترويسة JSON غير صالحة')
+    if header.get('dtype', '<f4') != '<f4':
+        raise BulkFormatError('dtype المدعوم: <f4 فقط')
+    expected = rows * len(columns) * 4
+    if rows < 0 or len(body) - offset != expected:
+        raise BulkFormatError(f'حجم البيانات {len(body) - offset} لا يطابق {rows}×{len(columns)} float32')
+    matrix = np.frombuffer(body, dtype='<f4', count=rows * len(columns), offset=offset)
+    return header, matrix.reshape(rows, len(columns))
+
+
+def model_input(columns: List[str], matrix: np.ndarray, feature_names: List[str]) -> Tuple[np.ndarray, bool]:
+    """
+    مصفوفة بترتيب الميزات
+
+    Returns:
+        (المصفوفة, هل تم النسخ)
+    """
+    if matrix.ndim != 2 or matrix.shape[1] != len(columns):
+        raise BulkFormatError(f'عرض الصفوف {matrix.shape[-1]} لا يطابق عدد الأعمدة {len(columns)}')
+    perm = _order(columns, feature_names)
+    if perm is None:
+        return matrix, False
+    return np.ascontiguousarray(matrix[:, perm]), True
+
+
+# ===== ARROW IPC =====
+
+def decode_arrow(body: bytes, feature_names: List[str]) -> np.ndarray:
+    """جدول Arrow -> مصفوفة float32 (n, n_features) بنسخة متجهة واحدة"""
+    if pa is None:
+        raise RuntimeError('pyarrow غير مثبت')
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise BulkFormatError(f'Arrow IPC غير صالح: {e}')
+    perm = _order(table.column_names, feature_names)
+    names = table.column_names
+    order = range(len(feature_names)) if perm is None else perm
+    X = np.empty((table.num_rows, len(feature_names)), dtype=np.float32)
+    for j, i in enumerate(order):
+        column = table.column(names[i])
+        if column.null_count:
+            raise BulkFormatError(f'قيم فارغة في العمود {names[i]}')
+        X[:, j] = column.to_numpy()
+    return X
+
+
+def encode_arrow(prices: np.ndarray, metadata: Optional[Dict[str, str]] = None) -> bytes:
+    if pa is None:
+        raise RuntimeError('pyarrow غير مثبت')
+    table = pa.table({OUTPUT_COLUMN: pa.array(np.asarray(prices, dtype=np.float32))})
+    if metadata:
+        table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+📦 Offline Bulk Scoring - تسعير مخزون كامل من ملف CSV
+تقييم ملفات بملايين الصفوف بذاكرة ثابتة على كل الأنوية
+
+المدخل أحد مخططين (يُكتشف من الترويسة):
+    listing   dataset/cardekho.csv   إعلانات خام -> encoding.listing_columns + ManualEncoder
+    encoded   dataset/cleaned_cars.csv  ميزات مرمّزة ومطبّعة جاهزة بترتيب lgbm_features.txt
+
+The parent process only parses the CSV in chunks (pandas C parser, far faster
+than prediction) and fans them out to a process pool.  Every worker loads the
+model and encoder once in its initializer and encodes + predicts whole chunks
+with ``concurrency.offline_threads(jobs)`` threads, so N processes share the cores
+without oversubscription.
+At most ``2 × jobs`` chunks are in flight and results are written in input
+order as soon as the oldest chunk completes, so memory stays flat regardless
+of file size.
+
+Usage (from the repository root):
+    python bulk_score.py dataset/cardekho.csv -o predictions.csv
+    python bulk_score.py big.csv -o big.parquet --jobs 8 --chunksize 100000
+    python bulk_score.py dataset/cleaned_cars.csv -o out.csv --tier fast --keep id,name
+"""
+
+import argparse
+import collections
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import concurrency
+from encoding import LISTING_COLUMNS, NUMERIC_FIELDS, REFERENCE_YEAR, ManualEncoder, inverse_target, listing_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # اعتمادية اختيارية (مخرجات Parquet فقط)
+    pa = pq = None
+
+# ===== CONFIGURATION =====
+DEFAULT_CHUNKSIZE = 50000
+IN_FLIGHT_PER_JOB = 2
+OUTPUT_COLUMN = 'predicted_price'
+LISTING = 'listing'
+ENCODED = 'encoded'
+
+# ===== PATHS =====
+MODEL_PATH = BASE_DIR / 'lgbm_model.pkl'
+FEATURES_PATH = BASE_DIR / 'lgbm_features.txt'
+META_PATH = BASE_DIR / 'lgbm_meta.json'
+SCALER_JSON = BASE_DIR / 'scaler_params.json'
+NAME_LE_JSON = BASE_DIR / 'name_le_mapping.json'
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+
+
+def _normalize(name: str) -> str:
+    return name.replace(' ', '_')
+
+
+def detect_schema(columns: List[str], feature_names: List[str]) -> str:
+    """listing أو encoded حسب أعمدة الترويسة"""
+    present = {_normalize(c) for c in columns}
+    if all(_normalize(f) in present for f in feature_names):
+        return ENCODED
+    required = [c for c in LISTING_COLUMNS if c not in ('seats', 'mileage(km/ltr/kg)', 'engine', 'max_power')]
+    if all(c in columns for c in required):
+        return LISTING
+    raise ValueError(f'مخطط غير معروف: يتوقع أعمدة cardekho.csv {list(LISTING_COLUMNS)} '
+                     f'أو ميزات lgbm_features.txt')
+
+
+def training_medians(scaler: Dict[str, Any]) -> Dict[str, float]:
+    """وسيط كل حقل رقمي بالوحدات الخام من مخزن الميزات (قيم الملء للمفقود)"""
+    from feature_store import open_feature_store
+    store = open_feature_store(build_if_missing=True)
+    means, scales = scaler.get('means', {}), scaler.get('scales', {})
+    medians = {}
+    for field, col in dict(NUMERIC_FIELDS, year='car_age').items():
+        if col in store.features and col in means and col in scales:
+            median = float(np.median(np.asarray(store.column(col), dtype=np.float64))) * scales[col] + means[col]
+            medians[field] = float(REFERENCE_YEAR - round(median)) if field == 'year' else median
+    return medians
+
+
+# ===== WORKER =====
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(model_path: str, schema: str, tier: str, medians: Dict[str, float], num_threads: int = 1):
+    """يُنفذ مرة واحدة لكل عملية: تحميل النموذج والمرمّز"""
+    import joblib
+    model = joblib.load(model_path)
+    meta = _load_json(META_PATH)
+    feature_names = [f for f in FEATURES_PATH.read_text(encoding='utf-8').splitlines() if f]
+    tiers = meta.get('tiers', {})
+    _worker.update(
+        booster=getattr(model, 'booster_', model),
+        meta=meta,
+        features=feature_names,
+        schema=schema,
+        num_iteration=tiers.get(tier) or meta.get('best_iteration'),
+        medians=medians,
+        num_threads=num_threads,
+        encoder=ManualEncoder(feature_names, _load_json(SCALER_JSON), _load_json(NAME_LE_JSON)),
+    )
+
+
+def _encode(chunk: pd.DataFrame) -> np.ndarray:
+    if _worker['schema'] == ENCODED:
+        by_name = {_normalize(c): c for c in chunk.columns}
+        cols = [by_name[_normalize(f)] for f in _worker['features']]
+        return np.ascontiguousarray(chunk[cols].to_numpy(dtype=np.float32))
+    columns = listing_columns(chunk, _worker['medians'])
+    return _worker['encoder'].encode_columns(columns, len(chunk)).astype(np.float32)
+
+
+def score_chunk(chunk: pd.DataFrame) -> np.ndarray:
+    """ترميز + تنبؤ لقطعة كاملة (داخل العامل)"""
+    X = _encode(chunk)
+    raw = _worker['booster'].predict(X, num_iteration=_worker['num_iteration'],
+                                     num_threads=_worker['num_threads'])
+    return inverse_target(raw, _worker['meta'])
+
+
+class _InlineExecutor:
+    """--jobs 1: نفس المسار بدون Process Pool"""
+
+    def __init__(self, initargs):
+        _init_worker(*initargs)
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+# ===== OUTPUT =====
+class _Writer:
+    """كتابة متتابعة بترتيب الإدخال (CSV بالإلحاق أو Parquet row groups)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.parquet = path.suffix.lower() in ('.parquet', '.pq')
+        if self.parquet and pq is None:
+            raise RuntimeError('مخرجات Parquet تتطلب pyarrow (غير مثبت)')
+        self._pq_writer = None
+        self._header = True
+
+    def write(self, frame: pd.DataFrame):
+        if self.parquet:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._pq_writer is None:
+                self._pq_writer = pq.ParquetWriter(str(self.path), table.schema)
+            self._pq_writer.write_table(table)
+            return
+        frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+
+
+# ===== RUN =====
+def score_file(input_path: Path, output_path: Path, jobs: int = 1, chunksize: int = DEFAULT_CHUNKSIZE,
+               tier: str = 'full', keep: Optional[List[str]] = None, model_path: Path = MODEL_PATH) -> Dict[str, Any]:
+    """تقييم ملف كامل؛ يرجع ملخص التشغيل"""
+    feature_names = [f for f in FEATURES_PATH.read_text(encoding='utf-8').splitlines() if f]
+    header = list(pd.read_csv(input_path, nrows=0).columns)
+    schema = detect_schema(header, feature_names)
+    if tier != 'full' and not _load_json(META_PATH).get('tiers', {}).get(tier):
+        raise ValueError(f'tier={tier} غير متاح لهذا النموذج (شغّل evaluate_model.py --write-tiers)')
+    keep = keep or []
+    missing = [c for c in keep if c not in header]
+    if missing:
+        raise ValueError(f'أعمدة --keep غير موجودة: {missing}')
+
+    if schema == ENCODED:
+        wanted = {_normalize(f) for f in feature_names}
+        usecols = [c for c in header if _normalize(c) in wanted or c in keep]
+        medians = {}
+    else:
+        usecols = [c for c in header if c in LISTING_COLUMNS or c in keep]
+        medians = training_medians(_load_json(SCALER_JSON))
+
+    initargs = (str(model_path), schema, tier, medians, concurrency.offline_threads(jobs))
+    executor = (_InlineExecutor(initargs) if jobs <= 1 else
+                ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs))
+    writer = _Writer(output_path)
+    pending = collections.deque()
+    max_in_flight = max(1, jobs) * IN_FLIGHT_PER_JOB
+    rows = 0
+    start = time.perf_counter()
+
+    def flush_oldest():
+        nonlocal rows
+        future, kept, offset = pending.popleft()
+        prices = future.result()
+        out = kept.copy() if kept is not None else pd.DataFrame(index=range(len(prices)))
+        out.insert(0, 'row', np.arange(offset, offset + len(prices)))
+        out[OUTPUT_COLUMN] = np.round(prices, 2)
+        writer.write(out)
+        rows += len(prices)
+
+    try:
+        offset = 0
+        reader = pd.read_csv(input_path, usecols=usecols, chunksize=chunksize)
+        for chunk in reader:
+            kept = chunk[keep].reset_index(drop=True) if keep else None
+            pending.append((executor.submit(score_chunk, chunk), kept, offset))
+            offset += len(chunk)
+            # الحد من القطع المعلقة = ذاكرة ثابتة مهما كان حجم الملف
+            while len(pending) >= max_in_flight or (pending and pending[0][0].done()):
+                flush_oldest()
+        while pending:
+            flush_oldest()
+    finally:
+        writer.close()
+        executor.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - start
+    return {'input': str(input_path), 'output': str(output_path), 'schema': schema, 'tier': tier,
+            'rows': rows, 'jobs': jobs, 'chunksize': chunksize, 'seconds': round(elapsed, 3),
+            'rows_per_s': round(rows / elapsed) if elapsed > 0 else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a large CSV (cardekho.csv or cleaned_cars.csv schema)')
+    parser.add_argument('input', type=Path, help='input CSV')
+    parser.add_argument('-o', '--output', type=Path, required=True, help='output .csv or .parquet')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes (one core each)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='CSV rows per chunk')
+    parser.add_argument('--tier', choices=['fast', 'full'], default='full', help='ensemble cutoff from lgbm_meta.json')
+    parser.add_argument('--keep', default='', help='comma-separated input columns copied to the output')
+    parser.add_argument('--model', type=Path, default=MODEL_PATH, help='model pickle')
+    args = parser.parse_args()
+
+    keep = [c for c in args.keep.split(',') if c]
+    try:
+        summary = score_file(args.input, args.output, jobs=args.jobs, chunksize=args.chunksize,
+                             tier=args.tier, keep=keep, model_path=args.model)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ {summary['rows']:,} صف ({summary['schema']}) في {summary['seconds']:.2f}s "
+          f"= {summary['rows_per_s']:,} rows/s على {summary['jobs']} عملية -> {summary['output']}")
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+كتالوج السيارات بنسخ متزايدة - Versioned Catalog with Delta Sync
+لقطة الكتالوج = أسماء السيارات + المستويات الفئوية + نطاقات الحقول الرقمية
+(بالوحدات الخام كما يدخلها المستخدم). كل تغيير في اللقطة ينشر نسخة جديدة
+برقم متزايد مع الفرق (المضاف/المحذوف) عن النسخة السابقة.
+
+/api/catalog/delta?since=<version> يجمع الفروق المخزنة من since+1 حتى النسخة
+الحالية، فيحصل العميل على التغييرات فقط بدلاً من تحميل القوائم كاملة.
+
+التخطيط على القرص (ضمن المستودع لأن أرقام النسخ يجب أن تبقى عبر عمليات النشر):
+    catalog/
+        manifest.json        النسخة الحالية + سجل النسخ
+        snapshot.json        اللقطة الحالية كاملة
+        diffs/<version>.json الفرق عن النسخة السابقة (النسخة 1 = اللقطة كاملة)
+
+الأقسام:
+    names, fuel_types, seller_types, transmissions, owner_counts   مجموعات (قوائم)
+    ranges                                                        قاموس حقل -> {min, max}
+
+الاستخدام:
+    python catalog.py              # نشر نسخة جديدة إذا تغيرت الأصول
+    python catalog.py --check      # خطأ إذا كانت الأصول غير منشورة
+    python catalog.py --delta 3    # عرض الفرق منذ النسخة 3
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+
+from encoding import NUMERIC_FIELDS, REFERENCE_YEAR
+
+logger = logging.getLogger(__name__)
+
+# ===== PATHS =====
+BASE_DIR = Path(__file__).parent
+CATALOG_DIR = BASE_DIR / 'catalog'
+SCALER_JSON = BASE_DIR / 'scaler_params.json'
+NAME_LE_JSON = BASE_DIR / 'name_le_mapping.json'
+CATLEVELS_JSON = BASE_DIR / 'categorical_levels.json'
+
+FORMAT_VERSION = 1
+
+# قسم الكتالوج -> مفتاح categorical_levels.json (نفس أسماء /api/car-info)
+LEVEL_SECTIONS = {
+    'fuel_types': 'fuel',
+    'seller_types': 'seller_type',
+    'transmissions': 'transmission',
+    'owner_counts': 'owner',
+}
+SET_SECTIONS = ['names'] + list(LEVEL_SECTIONS)
+MAP_SECTIONS = ['ranges']
+
+# عدد المنازل العشرية لكل نطاق رقمي (يمنع نسخاً جديدة بسبب ضجيج الفاصلة العائمة)
+RANGE_DECIMALS = {'year': 0, 'km': 0, 'engine': 0, 'power': 1, 'mileage': 2, 'seats': 0}
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+
+
+def _write_json(path: Path, data: Any):
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def content_hash(snapshot: Mapping[str, Any]) -> str:
+    payload = json.dumps(snapshot, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _round(value: float, decimals: int):
+    value = round(float(value), decimals) + 0.0  # بدون -0.0
+    return int(value) if decimals == 0 else value
+
+
+def numeric_ranges(store, scaler: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """نطاقات الحقول الرقمية بالوحدات الخام (عكس التطبيع في مخزن الميزات)"""
+    if store is None:
+        return {}
+    means, scales = scaler.get('means', {}), scaler.get('scales', {})
+    columns = dict(NUMERIC_FIELDS, year='car_age')
+    ranges = {}
+    for field, col in columns.items():
+        if col not in store.features or col not in means or col not in scales:
+            continue
+        values = np.asarray(store.column(col), dtype=np.float64) * scales[col] + means[col]
+        lo, hi = float(values.min()), float(values.max())
+        if field == 'year':
+            lo, hi = REFERENCE_YEAR - round(hi), REFERENCE_YEAR - round(lo)
+        ranges[field] = {'min': _round(lo, RANGE_DECIMALS[field]), 'max': _round(hi, RANGE_DECIMALS[field])}
+    return ranges
+
+
+def build_snapshot(name_le_map: Mapping[str, int], cat_levels: Mapping[str, Any],
+                   store=None, scaler: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """لقطة الكتالوج من الأصول المحملة"""
+    snapshot: Dict[str, Any] = {'names': sorted(name_le_map)}
+    for section, key in LEVEL_SECTIONS.items():
+        snapshot[section] = sorted(str(v) for v in cat_levels.get(key, []))
+    snapshot['ranges'] = numeric_ranges(store, scaler or {})
+    return snapshot
+
+
+def diff_snapshots(old: Mapping[str, Any], new: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """الفرق بين لقطتين؛ الأقسام بدون تغيير لا تظهر"""
+    changes = {}
+    for section in SET_SECTIONS:
+        before, after = set(old.get(section, [])), set(new.get(section, []))
+        added, removed = sorted(after - before), sorted(before - after)
+        if added or removed:
+            changes[section] = {'added': added, 'removed': removed}
+    for section in MAP_SECTIONS:
+        before, after = old.get(section, {}), new.get(section, {})
+        added = {k: v for k, v in after.items() if before.get(k) != v}
+        removed = sorted(set(before) - set(after))
+        if added or removed:
+            changes[section] = {'added': added, 'removed': removed}
+    return changes
+
+
+def compose_diffs(diffs) -> Dict[str, Dict[str, Any]]:
+    """
+    دمج فروق متتالية في فرق واحد صافٍ مقارنة بنسخة البداية
+    لكل مدخل: هل كان موجوداً في البداية (أول حدث حذف = نعم، أول إضافة في قسم
+    مجموعة = لا، وفي قسم قاموسي غير معروف لأن الإضافة قد تكون تعديلاً) وحالته
+    بعد آخر حدث. موجود الآن -> مضاف بآخر قيمة (إلا مدخل مجموعة كان موجوداً)؛
+    غير موجود -> محذوف ما لم يُعرف أنه لم يكن موجوداً أصلاً (حذف مدخل غير موجود
+    عند العميل لا يضر).
+    """
+    # section -> key -> [موجود في البداية (True/False/None), موجود الآن, القيمة]
+    state: Dict[str, Dict[str, list]] = {}
+    for diff in diffs:
+        for section, change in diff.items():
+            sec = state.setdefault(section, {})
+            for key in change.get('removed', []):
+                entry = sec.setdefault(key, [True, True, None])
+                entry[1], entry[2] = False, None
+            items = change.get('added', [])
+            items = items.items() if isinstance(items, dict) else ((k, True) for k in items)
+            for key, value in items:
+                entry = sec.setdefault(key, [None if section in MAP_SECTIONS else False, False, None])
+                entry[1], entry[2] = True, value
+    composed = {}
+    for section, sec in state.items():
+        # المجموعات: مدخل كان موجوداً وما زال = بلا تغيير؛ القواميس: آخر قيمة دائماً
+        sec_added = {key: value for key, (initial, present, value) in sec.items()
+                     if present and (section in MAP_SECTIONS or initial is not True)}
+        sec_removed = sorted(key for key, (initial, present, _) in sec.items() if not present and initial is not False)
+        if not sec_added and not sec_removed:
+            continue
+        out_added: Any = sec_added if section in MAP_SECTIONS else sorted(sec_added)
+        composed[section] = {'added': out_added, 'removed': sec_removed}
+    return composed
+
+
+def _diff_size(changes: Mapping[str, Any]) -> int:
+    return sum(len(c['added']) + len(c['removed']) for c in changes.values())
+
+
+def _diff_path(catalog_dir: Path, version: int) -> Path:
+    return catalog_dir / 'diffs' / f'{version:06d}.json'
+
+
+def publish(snapshot: Mapping[str, Any], catalog_dir: Path = CATALOG_DIR) -> Dict[str, Any]:
+    """
+    نشر اللقطة كنسخة جديدة إذا اختلفت عن الحالية
+
+    Returns:
+        manifest بعد النشر (بدون تغيير إذا كانت اللقطة منشورة مسبقاً)
+    """
+    catalog_dir = Path(catalog_dir)
+    manifest = _load_json(catalog_dir / 'manifest.json')
+    digest = content_hash(snapshot)
+    if manifest.get('content_hash') == digest:
+        return manifest
+
+    previous = _load_json(catalog_dir / 'snapshot.json')
+    changes = diff_snapshots(previous, snapshot)
+    version = int(manifest.get('version', 0)) + 1
+    created_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    (catalog_dir / 'diffs').mkdir(parents=True, exist_ok=True)
+    _write_json(_diff_path(catalog_dir, version), {'version': version, 'created_at': created_at, 'changes': changes})
+    _write_json(catalog_dir / 'snapshot.json', snapshot)
+    history = list(manifest.get('history', []))
+    history.append({
+        'version': version,
+        'created_at': created_at,
+        'content_hash': digest,
+        'added': sum(len(c['added']) for c in changes.values()),
+        'removed': sum(len(c['removed']) for c in changes.values()),
+    })
+    manifest = {'format': FORMAT_VERSION, 'version': version, 'content_hash': digest, 'history': history}
+    # manifest آخراً: القراء يرون النسخة الجديدة فقط بعد اكتمال ملفاتها
+    _write_json(catalog_dir / 'manifest.json', manifest)
+    logger.info(f"✅ نسخة كتالوج جديدة {version}: {history[-1]['added']} مضاف، {history[-1]['removed']} محذوف")
+    return manifest
+
+
+class Catalog:
+    """قراءة الكتالوج المنشور وحساب الفروق (مع حفظ النتائج لكل since معروفة)"""
+
+    def __init__(self, catalog_dir: Path = CATALOG_DIR):
+        self.path = Path(catalog_dir)
+        self.manifest = _load_json(self.path / 'manifest.json')
+        self.snapshot = _load_json(self.path / 'snapshot.json')
+        self._diffs: Dict[int, Dict[str, Any]] = {}
+        self._deltas: Dict[int, Dict[str, Any]] = {}
+        self._full: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return int(self.manifest.get('version', 0))
+
+    @property
+    def content_hash(self) -> Optional[str]:
+        return self.manifest.get('content_hash')
+
+    def _diff(self, version: int) -> Dict[str, Any]:
+        if version not in self._diffs:
+            self._diffs[version] = _load_json(_diff_path(self.path, version)).get('changes', {})
+        return self._diffs[version]
+
+    def full(self) -> Dict[str, Any]:
+        """اللقطة كاملة بصيغة الفرق (كل المدخلات مضافة)؛ تُحسب مرة واحدة ويشاركها كل الردود"""
+        if self._full is None:
+            self._full = diff_snapshots({}, self.snapshot)
+        return self._full
+
+    def delta(self, since: int) -> Dict[str, Any]:
+        """
+        التغييرات منذ النسخة since
+
+        Returns:
+            {'version', 'since', 'full', 'changes'}؛ full=True عندما يجب على العميل
+            استبدال نسخته كاملة (since=0، نسخة غير معروفة، أو فرق أكبر من اللقطة)
+
+        يُحفظ الناتج فقط للنسخ المعروفة 1..version (عدد محدود)؛ since يأتي من العميل
+        فالنسخ غير المعروفة لا تُخزن وتتشارك اللقطة الكاملة نفسها
+        """
+        version = self.version
+        with self._lock:
+            if not 0 < since <= version:
+                return {'version': version, 'since': since, 'full': True, 'changes': self.full()}
+            hit = self._deltas.get(since)
+            if hit is not None:
+                return hit
+            changes = compose_diffs(self._diff(v) for v in range(since + 1, version + 1))
+            full = _diff_size(changes) > _diff_size(self.full())
+            result = {
+                'version': version,
+                'since': since,
+                'full': full,
+                'changes': self.full() if full else changes,
+            }
+            self._deltas[since] = result
+            return result
+
+
+def open_catalog(catalog_dir: Path = CATALOG_DIR, expected_hash: Optional[str] = None) -> Optional[Catalog]:
+    """
+    فتح الكتالوج المنشور
+
+    Args:
+        expected_hash: بصمة اللقطة المحسوبة من الأصول الحالية؛ عند الاختلاف يُسجل
+                       تحذير (النشر يتم في خطوة البناء وليس في عمال الخادم)
+    """
+    try:
+        catalog = Catalog(catalog_dir)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ تعذر تحميل الكتالوج: {e}")
+        return None
+    if catalog.version == 0:
+        logger.warning("⚠️ لا يوجد كتالوج منشور - شغّل python catalog.py")
+        return None
+    if expected_hash is not None and expected_hash != catalog.content_hash:
+        logger.warning(f"⚠️ الكتالوج المنشور (v{catalog.version}) لا يطابق الأصول الحالية - شغّل python catalog.py")
+    return catalog
+
+
+def snapshot_from_files() -> Dict[str, Any]:
+    from feature_store import open_feature_store
+    return build_snapshot(_load_json(NAME_LE_JSON), _load_json(CATLEVELS_JSON),
+                          open_feature_store(build_if_missing=True), _load_json(SCALER_JSON))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Publish the versioned car catalog')
+    parser.add_argument('--catalog-dir', type=Path, default=CATALOG_DIR)
+    parser.add_argument('--check', action='store_true', help='exit 1 if the assets differ from the published catalog')
+    parser.add_argument('--delta', type=int, default=None, help='print the delta since VERSION')
+    args = parser.parse_args()
+
+    if args.delta is not None:
+        catalog = Catalog(args.catalog_dir)
+        print(json.dumps(catalog.delta(args.delta), ensure_ascii=False, indent=2))
+    elif args.check:
+        current = Catalog(args.catalog_dir)
+        digest = content_hash(snapshot_from_files())
+        if digest != current.content_hash:
+            print(f"❌ الكتالوج غير محدث (v{current.version})")
+            raise SystemExit(1)
+        print(f"✅ الكتالوج محدث (v{current.version})")
+    else:
+        manifest = publish(snapshot_from_files(), args.catalog_dir)
+        print(f"📚 نسخة الكتالوج: {manifest['version']} ({manifest['content_hash']})")
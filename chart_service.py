@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+رسم المخططات عند الطلب - On-demand Chart Rendering
+يعيد استخدام دوال الرسم في generate_charts.py لخدمة /api/charts/<kind>
+
+- الرسم يتم في Process Pool صغير (spawn) خارج خيوط الطلبات؛ pyplot غير آمن
+  للخيوط ولا يجب أن يحجز الـ GIL عن طلبات التنبؤ.
+- النتائج في ذاكرة LRU بطبقتين محدودتين بالحجم (ذاكرة العملية + قرص مشترك
+  بين عمال Gunicorn)، والمفتاح = نسخة البيانات + نوع المخطط + المعاملات
+  + الفلتر + بصمة كود الرسم، فلا حاجة لإبطال يدوي عند تغير أي منها.
+- الطلبات المتزامنة لنفس المفتاح تنتظر رسماً واحداً (single-flight).
+
+صيغة الفلتر (شروط مفصولة بفواصل):
+    fuel=Diesel|Petrol,transmission=Manual,selling_price>=300000
+الحقول الفئوية: fuel, seller, transmission, owner (مساواة، عدة قيم بـ |)
+الأعمدة الرقمية: مقارنة >= أو <= أو = بنفس وحدات محاور المخططات
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import generate_charts
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.environ.get('CHART_CACHE_DIR', Path(__file__).parent / 'cache' / 'charts'))
+MEMORY_CACHE_BYTES = int(float(os.environ.get('CHART_CACHE_MEMORY_MB', 32)) * 1024 * 1024)
+DISK_CACHE_BYTES = int(float(os.environ.get('CHART_CACHE_DISK_MB', 256)) * 1024 * 1024)
+RENDER_WORKERS = max(1, int(os.environ.get('CHART_RENDER_WORKERS', 1)))
+RENDER_TIMEOUT = float(os.environ.get('CHART_RENDER_TIMEOUT', 30))
+
+# حقل الفلتر -> العمود الفئوي المشتق
+FILTER_FIELDS = {
+    'fuel': 'Fuel_Type',
+    'seller': 'Seller_Type',
+    'transmission': 'Transmission',
+    'owner': 'Owner_Count',
+}
+COLUMN_KINDS = {'hist', 'box', 'scatter'}
+GROUP_KINDS = {'violin', 'bar', 'count'}
+MULTI_COLUMN_KINDS = {'corr_heatmap', 'corr_interactive', 'pairplot', 'distributions'}
+
+_CONDITION = re.compile(r'^\s*(\w+)\s*(>=|<=|=)\s*(.+?)\s*$')
+_MIME_EXT = {'image/png': 'png', 'text/html; charset=utf-8': 'html'}
+_EXT_MIME = {v: k for k, v in _MIME_EXT.items()}
+
+RENDER_SECONDS = metrics.histogram('car_price_chart_render_seconds', 'Chart render time in the render pool', ['kind'],
+                                   buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+SHARED_RENDERS = metrics.counter('car_price_chart_singleflight_total', 'Chart requests served by an in-flight render')
+
+
+class ChartRequestError(ValueError):
+    """معاملات مخطط غير صالحة (ترجع 400)"""
+
+
+class _MemoryLRU:
+    """LRU محدود بإجمالي البايتات"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items: 'OrderedDict[str, Tuple[bytes, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: str, body: bytes, mimetype: str):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._items[key] = (body, mimetype)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _key, (evicted, _mime) = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def info(self) -> Dict[str, int]:
+        return {'entries': len(self._items), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+
+class _DiskLRU:
+    """
+    طبقة قرص مشتركة بين العمليات: ملف لكل مفتاح، وmtime يمثل آخر استخدام
+    التقليم يحذف الأقدم حتى يعود الحجم تحت الحد
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, ext: str) -> Path:
+        return self.dir / f'{key}.{ext}'
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        for ext, mimetype in _EXT_MIME.items():
+            path = self._path(key, ext)
+            try:
+                body = path.read_bytes()
+            except OSError:
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return body, mimetype
+        return None
+
+    def put(self, key: str, body: bytes, mimetype: str):
+        if self.max_bytes <= 0 or len(body) > self.max_bytes:
+            return
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key, _MIME_EXT[mimetype])
+            tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+            self.prune()
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر حفظ المخطط في ذاكرة القرص: {e}")
+
+    def prune(self):
+        with self._lock:
+            entries = []
+            for path in self.dir.iterdir():
+                if path.suffix.lstrip('.') not in _EXT_MIME:
+                    continue
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _m, size, _p in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+
+    def info(self) -> Dict[str, Any]:
+        try:
+            sizes = [p.stat().st_size for p in self.dir.iterdir() if p.suffix.lstrip('.') in _EXT_MIME]
+        except OSError:
+            sizes = []
+        return {'entries': len(sizes), 'bytes': sum(sizes), 'max_bytes': self.max_bytes, 'path': str(self.dir)}
+
+
+def _render(kind: str, data: pd.DataFrame, params: Dict[str, Any]) -> Tuple[bytes, str, float]:
+    """يعمل داخل عملية الرسم"""
+    start = time.perf_counter()
+    body, mimetype = generate_charts.render_bytes(kind, data, params)
+    return body, mimetype, time.perf_counter() - start
+
+
+class ChartService:
+    """رسم المخططات عند الطلب مع ذاكرة LRU بطبقتين و single-flight"""
+
+    def __init__(self, db, cache_dir: Path = CACHE_DIR, memory_bytes: int = MEMORY_CACHE_BYTES,
+                 disk_bytes: int = DISK_CACHE_BYTES, workers: int = RENDER_WORKERS):
+        self.db = db
+        self.workers = workers
+        self.memory = _MemoryLRU(memory_bytes)
+        self.disk = _DiskLRU(cache_dir, disk_bytes)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._frame_version: Optional[str] = None
+        self._frame: Optional[pd.DataFrame] = None
+
+    # ----- البيانات -----
+
+    def data_version(self) -> str:
+        store = getattr(self.db, 'store', None)
+        if store is not None:
+            return store.version
+        try:
+            st = Path(self.db.csv_path).stat()
+            return f'csv-{st.st_size}-{st.st_mtime_ns}'
+        except OSError:
+            return 'unknown'
+
+    def _data(self) -> pd.DataFrame:
+        """إطار البيانات مع الأعمدة الفئوية المشتقة (يُبنى مرة لكل نسخة بيانات)"""
+        version = self.data_version()
+        with self._lock:
+            if self._frame is None or self._frame_version != version:
+                self._frame = generate_charts.derive_groups(self.db.df.copy())
+                self._frame_version = version
+            return self._frame
+
+    # ----- التحقق من المعاملات -----
+
+    def kinds(self) -> List[str]:
+        return sorted(generate_charts.CHARTS)
+
+    def _numeric_columns(self) -> List[str]:
+        return [c for c in generate_charts.NUM_COLS if c in self.db.df.columns]
+
+    def _params(self, kind: str, column: Optional[str]) -> Tuple[Dict[str, Any], Tuple[str, ...]]:
+        """معاملات دالة الرسم والأعمدة التي تقرأها"""
+        numeric = self._numeric_columns()
+        target = generate_charts.TARGET
+        if kind in COLUMN_KINDS:
+            if column not in numeric:
+                raise ChartRequestError(f'column مطلوب ويجب أن يكون أحد: {numeric}')
+            if kind == 'scatter':
+                if column == target:
+                    raise ChartRequestError(f'لا يمكن رسم {target} مقابل نفسه')
+                return {'column': column}, (column, target)
+            return {'column': column}, (column,)
+        if kind in GROUP_KINDS:
+            group = FILTER_FIELDS.get(column or '', column)
+            if group not in generate_charts.GROUPS:
+                raise ChartRequestError(f'column مطلوب ويجب أن يكون أحد: {sorted(FILTER_FIELDS)}')
+            return {'group': group}, ((group,) if kind == 'count' else (group, target))
+        if kind in MULTI_COLUMN_KINDS:
+            columns = [c.strip() for c in column.split(',')] if column else numeric
+            unknown = [c for c in columns if c not in numeric]
+            if unknown or not columns:
+                raise ChartRequestError(f'أعمدة غير معروفة: {unknown}')
+            return {'columns': columns}, tuple(columns)
+        # 3d_scatter
+        return {}, ('engine', 'mileage', target, 'Fuel_Type')
+
+    def _filters(self, expr: Optional[str]) -> List[Tuple[str, str, Any]]:
+        """تحليل الفلتر إلى شروط مرتبة (مرتبة لتثبيت مفتاح الذاكرة)"""
+        if not expr:
+            return []
+        numeric = self._numeric_columns()
+        conditions = []
+        for part in expr.split(','):
+            if not part.strip():
+                continue
+            match = _CONDITION.match(part)
+            if match is None:
+                raise ChartRequestError(f'شرط فلتر غير صالح: {part}')
+            field, op, value = match.groups()
+            if field in FILTER_FIELDS or field in generate_charts.GROUPS:
+                if op != '=':
+                    raise ChartRequestError(f'الحقل {field} يدعم المساواة فقط')
+                conditions.append((FILTER_FIELDS.get(field, field), 'in', sorted(v.strip() for v in value.split('|'))))
+            elif field in numeric:
+                try:
+                    conditions.append((field, op, float(value)))
+                except ValueError:
+                    raise ChartRequestError(f'قيمة رقمية غير صالحة: {value}')
+            else:
+                raise ChartRequestError(f'حقل فلتر غير معروف: {field}')
+        return sorted(conditions, key=lambda c: json.dumps(c))
+
+    @staticmethod
+    def _apply_filters(df: pd.DataFrame, conditions) -> pd.DataFrame:
+        if not conditions:
+            return df
+        mask = pd.Series(True, index=df.index)
+        for col, op, value in conditions:
+            if op == 'in':
+                mask &= df[col].isin(value)
+            elif op == '>=':
+                mask &= df[col] >= value
+            elif op == '<=':
+                mask &= df[col] <= value
+            else:
+                mask &= df[col] == value
+        return df[mask]
+
+    # ----- الرسم -----
+
+    def _submit(self, kind, data, params) -> Future:
+        with self._lock:
+            if self._pool is None:
+                # spawn: لا fork لعملية متعددة الخيوط
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            pool = self._pool
+        try:
+            return pool.submit(_render, kind, data, params)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+
+    def _lead(self, key: str, result: Future, kind: str, params: Dict[str, Any],
+              columns: Tuple[str, ...], conditions):
+        """العامل الأول للمفتاح: ذاكرة القرص ثم الرسم؛ النتيجة تصل لكل المنتظرين"""
+
+        def _finish(value=None, error=None):
+            with self._lock:
+                self._inflight.pop(key, None)
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(value)
+
+        try:
+            cached = self.disk.get(key)
+            metrics.record_cache('chart_disk', cached is not None)
+            if cached is not None:
+                self.memory.put(key, *cached)
+                _finish((cached[0], cached[1], 'disk'))
+                return
+            df = self._data()
+            needed = [c for c in columns if c in df.columns]
+            data = self._apply_filters(df, conditions)[needed]
+            if data.empty:
+                raise ChartRequestError('لا توجد بيانات مطابقة للفلتر')
+            render_future = self._submit(kind, data, params)
+        except Exception as e:
+            _finish(error=e)
+            return
+
+        def _rendered(f: Future):
+            try:
+                body, mimetype, seconds = f.result()
+            except BrokenProcessPool as e:
+                with self._lock:
+                    self._pool = None
+                _finish(error=e)
+                return
+            except Exception as e:
+                _finish(error=e)
+                return
+            RENDER_SECONDS.labels(kind=kind).observe(seconds)
+            self.memory.put(key, body, mimetype)
+            self.disk.put(key, body, mimetype)
+            _finish((body, mimetype, 'render'))
+
+        render_future.add_done_callback(_rendered)
+
+    def cache_key(self, kind: str, column: Optional[str] = None, filter_expr: Optional[str] = None) -> Tuple[str, Dict[str, Any], Tuple[str, ...], list]:
+        """
+        التحقق من الطلب وحساب مفتاحه دون لمس البيانات
+
+        Raises:
+            KeyError: نوع مخطط غير معروف
+            ChartRequestError: معاملات غير صالحة
+        """
+        if kind not in generate_charts.CHARTS:
+            raise KeyError(kind)
+        params, columns = self._params(kind, column)
+        conditions = self._filters(filter_expr)
+        payload = json.dumps([self.data_version(), generate_charts.RENDER_VERSION, generate_charts.code_hash(kind),
+                              kind, params, conditions], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:40], params, columns, conditions
+
+    def get(self, kind: str, column: Optional[str] = None, filter_expr: Optional[str] = None,
+            timeout: float = RENDER_TIMEOUT) -> Tuple[bytes, str, str, str]:
+        """
+        الحصول على مخطط (من الذاكرة أو القرص أو برسمه)
+
+        Returns:
+            (المحتوى, نوع MIME, المصدر memory|disk|render|shared, المفتاح)
+
+        Raises:
+            concurrent.futures.TimeoutError: عند تجاوز المهلة (الرسم يكمل ويُحفظ)
+        """
+        key, params, columns, conditions = self.cache_key(kind, column, filter_expr)
+        cached = self.memory.get(key)
+        metrics.record_cache('chart_memory', cached is not None)
+        if cached is not None:
+            return cached[0], cached[1], 'memory', key
+
+        with self._lock:
+            result = self._inflight.get(key)
+            leader = result is None
+            if leader:
+                result = Future()
+                self._inflight[key] = result
+        if leader:
+            self._lead(key, result, kind, params, columns, conditions)
+        else:
+            SHARED_RENDERS.labels().inc()
+        body, mimetype, source = result.result(timeout=timeout)
+        return body, mimetype, source if leader else 'shared', key
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'data_version': self.data_version(),
+            'kinds': self.kinds(),
+            'workers': self.workers,
+            'in_flight': len(self._inflight),
+            'memory': self.memory.info(),
+            'disk': self.disk.info(),
+        }
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+النموذج المضغوط - Compact Tree Model
+يحوّل Booster الخاص بـ LightGBM إلى ملف ثنائي صغير ومُقيّم (scorer) خفيف
+مبني على numpy فقط، فلا يحتاج العامل إلى تحميل LightGBM إطلاقاً.
+
+خطوات الضغط:
+    1. القص عند best_iteration من lgbm_meta.json
+    2. تحويل قيم الأوراق إلى float32؛ العتبات تبقى float64 كما في LightGBM
+       (أي تقريب للعتبة يغيّر اتجاه x <= t للقيم الواقعة بين العتبة وتقريبها)
+    3. دمج الأوراق المتطابقة: كل عقدة ابناها ورقتان بنفس القيمة تصبح ورقة
+    4. كتابة مصفوفات مسطحة لكل العقد في ملف واحد قابل لـ mmap
+
+صيغة الملف:
+    MAGIC (8 بايت) | طول الترويسة uint32 | ترويسة JSON | مصفوفات محاذاة على 64 بايت
+
+الاستخدام:
+    python compact_model.py             # كتابة lgbm_model.compact
+    python compact_model.py --report    # + مقارنة الحجم و RSS والزمن وأقصى فرق في التنبؤ
+
+في الخادم: MODEL_BACKEND=compact يحمّل هذا الملف بدلاً من lgbm_model.pkl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ===== PATHS =====
+BASE_DIR = Path(__file__).parent
+MODEL_PATH = BASE_DIR / 'lgbm_model.pkl'
+META_PATH = BASE_DIR / 'lgbm_meta.json'
+COMPACT_PATH = BASE_DIR / 'lgbm_model.compact'
+DATA_PATH = BASE_DIR / 'dataset' / 'cleaned_cars.csv'
+
+MAGIC = b'CPMODEL1'
+FORMAT_VERSION = 2
+ALIGN = 64
+ROWS_PER_CHUNK_BUDGET = 1 << 20   # أقصى عدد أزواج (صف، شجرة) نشطة في الذاكرة
+COMPACT_EVERY = 4                 # حذف الأزواج المنتهية كل N مستويات
+COMPACT_MIN_PAIRS = 4096          # للدفعات الصغيرة لا يستحق الحذف تكلفته
+
+# أعلام العقدة: bit0 = default_left ، bits1-2 = نوع القيم المفقودة
+MISSING_TYPES = {'None': 0, 'Zero': 1, 'NaN': 2}
+ZERO_THRESHOLD = 1e-35
+
+
+class _TreeFlattener:
+    """تسطيح أشجار dump_model() مع دمج الأوراق المتطابقة"""
+
+    def __init__(self):
+        self.feature: List[int] = []
+        self.threshold: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.flags: List[int] = []
+        self.leaf_value: List[float] = []
+        self.merged = 0
+        self.max_depth = 0
+
+    def _merge(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        if 'split_index' not in node:
+            return {'leaf_value': float(np.float32(node['leaf_value']))}
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError(f"نوع التقسيم {node['decision_type']} غير مدعوم في النموذج المضغوط")
+        left = self._merge(node['left_child'])
+        right = self._merge(node['right_child'])
+        if 'leaf_value' in left and 'leaf_value' in right and left['leaf_value'] == right['leaf_value']:
+            self.merged += 1
+            return left
+        return {**node, 'left_child': left, 'right_child': right}
+
+    def _emit(self, node: Dict[str, Any], depth: int) -> int:
+        """إرجاع مرجع العقدة: >= 0 عقدة داخلية، < 0 ورقة (~index)"""
+        if 'leaf_value' in node:
+            self.leaf_value.append(node['leaf_value'])
+            self.max_depth = max(self.max_depth, depth)
+            return ~(len(self.leaf_value) - 1)
+        idx = len(self.feature)
+        self.feature.append(node['split_feature'])
+        self.threshold.append(float(node['threshold']))
+        self.flags.append(int(bool(node.get('default_left', True))) | (MISSING_TYPES[node.get('missing_type', 'None')] << 1))
+        self.left.append(0)
+        self.right.append(0)
+        self.left[idx] = self._emit(node['left_child'], depth + 1)
+        self.right[idx] = self._emit(node['right_child'], depth + 1)
+        return idx
+
+    def add_tree(self, structure: Dict[str, Any]) -> int:
+        return self._emit(self._merge(structure), 0)
+
+
+def compact(model, num_iteration: Optional[int], features: List[str], source_version: str) -> Dict[str, Any]:
+    """
+    بناء مصفوفات النموذج المضغوط من LGBMRegressor أو Booster
+
+    Returns:
+        {'header': ..., 'arrays': {name: ndarray}}
+    """
+    booster = getattr(model, 'booster_', model)
+    dump = booster.dump_model(num_iteration=num_iteration or -1)
+    if dump.get('num_tree_per_iteration', 1) != 1:
+        raise ValueError('النموذج المضغوط يدعم الانحدار (شجرة واحدة لكل تكرار) فقط')
+
+    flat = _TreeFlattener()
+    original_nodes = 0
+    roots = []
+    for tree in dump['tree_info']:
+        original_nodes += tree['num_leaves'] - 1
+        roots.append(flat.add_tree(tree['tree_structure']))
+
+    arrays = {
+        'roots': np.asarray(roots, dtype=np.int32),
+        'feature': np.asarray(flat.feature, dtype=np.int16),
+        'threshold': np.asarray(flat.threshold, dtype=np.float64),
+        'left': np.asarray(flat.left, dtype=np.int32),
+        'right': np.asarray(flat.right, dtype=np.int32),
+        'flags': np.asarray(flat.flags, dtype=np.uint8),
+        'leaf_value': np.asarray(flat.leaf_value, dtype=np.float32),
+    }
+    header = {
+        'format_version': FORMAT_VERSION,
+        'source_model_version': source_version,
+        'features': features,
+        'n_features': len(features),
+        'n_trees': len(roots),
+        'num_iteration': num_iteration,
+        'n_nodes': len(flat.feature),
+        'n_leaves': len(flat.leaf_value),
+        'original_nodes': original_nodes,
+        'merged_nodes': flat.merged,
+        'max_depth': flat.max_depth,
+        'objective': dump.get('objective'),
+        'has_missing_handling': bool(np.any(arrays['flags'] >> 1)),
+    }
+    return {'header': header, 'arrays': arrays}
+
+
+def write_compact(compacted: Dict[str, Any], path: Path = COMPACT_PATH) -> int:
+    """كتابة الملف الثنائي (ذرياً) وإرجاع حجمه بالبايت"""
+    header = dict(compacted['header'])
+    specs = {}
+    offset = 0
+    for name, arr in compacted['arrays'].items():
+        offset = -(-offset // ALIGN) * ALIGN
+        specs[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset += arr.nbytes
+    header['arrays'] = specs
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp = Path(path).with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in compacted['arrays'].items():
+            f.seek(data_start + specs[name]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return Path(path).stat().st_size
+
+
+class CompactModel:
+    """
+    مُقيّم خفيف للنموذج المضغوط (numpy فقط)
+    مصفوفات الملف عبر mmap بدون نسخ + جدول عقد موحد صغير في الذاكرة
+    واجهة predict() متوافقة مع الاستخدام في app.py
+    """
+
+    def __init__(self, path: Path = COMPACT_PATH):
+        self.path = Path(path)
+        buf = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{self.path} ليس ملف نموذج مضغوط')
+        (header_len,) = struct.unpack('<I', bytes(buf[len(MAGIC):len(MAGIC) + 4]))
+        self.header = json.loads(bytes(buf[len(MAGIC) + 4:len(MAGIC) + 4 + header_len]).decode('utf-8'))
+        if self.header.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{self.path} بصيغة {self.header.get('format_version')} والمطلوب {FORMAT_VERSION} "
+                             f"- أعد التوليد: python compact_model.py")
+        data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+        for name, spec in self.header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            start = data_start + spec['offset']
+            setattr(self, name, np.frombuffer(buf, dtype=dtype, count=count, offset=start).reshape(spec['shape']))
+        self._buf = buf
+        self.n_trees = self.header['n_trees']
+        self.feature_names_ = self.header['features']
+        self._build_lookup()
+
+    def _build_lookup(self):
+        """
+        جدول عقد موحد للتقييم: الأوراق عقد تشير إلى نفسها (عتبة +inf)،
+        فتتقدم كل الأزواج (صف، شجرة) خطوة بعمليتي فهرسة فقط دون تفرع
+        """
+        n_int, n_leaf = len(self.feature), len(self.leaf_value)
+        self._n_internal = n_int
+
+        def ref(child):
+            child = child.astype(np.intp)
+            return np.where(child < 0, n_int + ~child, child)
+
+        ids = np.arange(n_int + n_leaf, dtype=np.intp)
+        self._children = np.empty((n_int + n_leaf, 2), dtype=np.intp)   # [right, left]
+        self._children[:n_int, 0] = ref(self.right)
+        self._children[:n_int, 1] = ref(self.left)
+        self._children[n_int:, 0] = ids[n_int:]
+        self._children[n_int:, 1] = ids[n_int:]
+        self._node_feature = np.concatenate([self.feature.astype(np.intp), np.zeros(n_leaf, dtype=np.intp)])
+        self._node_threshold = np.concatenate([self.threshold, np.full(n_leaf, np.inf)])
+        self._node_flags = np.concatenate([self.flags, np.zeros(n_leaf, dtype=np.uint8)])
+        self._node_value = np.concatenate([np.zeros(n_int), self.leaf_value.astype(np.float64)])
+        self._roots = ref(self.roots)
+
+    def _go_left(self, x: np.ndarray, node: np.ndarray) -> np.ndarray:
+        go_left = x <= self._node_threshold[node]
+        if self.header.get('has_missing_handling'):
+            flags = self._node_flags[node]
+            missing_type = flags >> 1
+            is_missing = np.where(missing_type == 2, np.isnan(x),
+                                  np.where(missing_type == 1, np.isnan(x) | (np.abs(x) <= ZERO_THRESHOLD), False))
+            go_left = np.where(is_missing, (flags & 1).astype(bool), go_left)
+        return go_left
+
+    def _predict_chunk(self, X: np.ndarray, roots: np.ndarray) -> np.ndarray:
+        n = len(X)
+        Xf = X.ravel()
+        width = X.shape[1]
+        out = np.zeros(n, dtype=np.float64)
+        rows = np.repeat(np.arange(n, dtype=np.intp), len(roots))
+        node = np.tile(roots, n)
+        base = rows * width
+        for depth in range(1, self.header['max_depth'] + 1):
+            x = Xf[base + self._node_feature[node]]
+            node = self._children[node, self._go_left(x, node).view(np.uint8)]
+            # إزالة الأزواج المنتهية كل بضع خطوات لتقليل العمل على الدفعات الكبيرة
+            if depth % COMPACT_EVERY == 0 and len(node) > COMPACT_MIN_PAIRS:
+                done = node >= self._n_internal
+                out += np.bincount(rows[done], weights=self._node_value[node[done]], minlength=n)
+                keep = ~done
+                rows, node, base = rows[keep], node[keep], base[keep]
+        out += np.bincount(rows, weights=self._node_value[node], minlength=n)
+        return out
+
+    def predict(self, X, num_iteration: Optional[int] = None) -> np.ndarray:
+        """التنبؤ الخام (نفس مخرج Booster.predict)؛ num_iteration يستخدم أول N شجرة فقط"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if not self.header.get('has_missing_handling'):
+            # missing_type=None: LightGBM يعامل NaN كصفر
+            X = np.nan_to_num(X, nan=0.0)
+        roots = self._roots[:num_iteration] if num_iteration and num_iteration > 0 else self._roots
+        chunk = max(1, ROWS_PER_CHUNK_BUDGET // max(len(roots), 1))
+        if len(X) <= chunk:
+            return self._predict_chunk(X, roots)
+        return np.concatenate([self._predict_chunk(X[i:i + chunk], roots) for i in range(0, len(X), chunk)])
+
+
+def load(path: Path = COMPACT_PATH) -> CompactModel:
+    return CompactModel(path)
+
+
+# ===== REPORT =====
+_RSS_SNIPPET = '''
+import sys, gc
+sys.path.insert(0, {base!r})
+def rss():
+    for line in open('/proc/self/status'):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) * 1024
+import numpy
+before = rss()
+{load}
+gc.collect()
+print(rss() - before)
+'''
+
+
+def _rss_delta(load_code: str) -> Optional[int]:
+    """زيادة RSS بعد تحميل النموذج في عملية جديدة (تشمل استيراد المكتبات)"""
+    code = _RSS_SNIPPET.format(base=str(BASE_DIR), load=load_code)
+    try:
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, timeout=120)
+        return int(out.stdout.strip().splitlines()[-1])
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+
+
+def _latency_us(fn, X: np.ndarray, repeats: int) -> float:
+    fn(X[:1])
+    samples = []
+    for i in range(repeats):
+        row = X[i % len(X):i % len(X) + 1]
+        t0 = time.perf_counter()
+        fn(row)
+        samples.append(time.perf_counter() - t0)
+    return round(float(np.median(samples)) * 1e6, 2)
+
+
+def build_report(model, compact_model: CompactModel, meta: Dict[str, Any]) -> Dict[str, Any]:
+    import pandas as pd
+    from encoding import inverse_target
+
+    features = compact_model.feature_names_
+    X = pd.read_csv(DATA_PATH).reindex(columns=features, fill_value=0).to_numpy(dtype=np.float64)
+    num_iteration = meta.get('best_iteration')
+    booster = getattr(model, 'booster_', model)
+
+    t0 = time.perf_counter()
+    raw_ref = booster.predict(X, num_iteration=num_iteration)
+    batch_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    raw_new = compact_model.predict(X)
+    batch_new = time.perf_counter() - t0
+
+    price_ref = inverse_target(raw_ref, meta)
+    price_new = inverse_target(raw_new, meta)
+    rel = np.abs(price_new - price_ref) / np.maximum(price_ref, 1.0)
+
+    load_lgbm = f"import joblib; m = joblib.load({str(MODEL_PATH)!r})"
+    load_compact = f"import compact_model; m = compact_model.load({str(compact_model.path)!r}); m.predict(numpy.zeros((1, {len(features)})))"
+
+    return {
+        'rows': int(len(X)),
+        'trees': {'original': booster.num_trees(), 'compact': compact_model.n_trees},
+        'nodes': {'original': compact_model.header['original_nodes'], 'compact': compact_model.header['n_nodes'],
+                  'merged': compact_model.header['merged_nodes']},
+        'size_bytes': {'original_pkl': MODEL_PATH.stat().st_size, 'compact': compact_model.path.stat().st_size},
+        'rss_delta_bytes': {'original': _rss_delta(load_lgbm), 'compact': _rss_delta(load_compact)},
+        'latency_us': {
+            'single_row_original_sklearn': _latency_us(lambda r: model.predict(r, num_iteration=num_iteration), X, 300),
+            'single_row_original_booster': _latency_us(lambda r: booster.predict(r, num_iteration=num_iteration), X, 300),
+            'single_row_compact': _latency_us(compact_model.predict, X, 300),
+            'batch_original_ms': round(batch_ref * 1000, 2),
+            'batch_compact_ms': round(batch_new * 1000, 2),
+        },
+        'max_delta': {
+            'raw': float(np.max(np.abs(raw_new - raw_ref))),
+            'price': float(np.max(np.abs(price_new - price_ref))),
+            'price_rel_pct': round(float(rel.max()) * 100, 6),
+        },
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Compact the LightGBM model for lightweight serving')
+    parser.add_argument('--model', type=Path, default=MODEL_PATH)
+    parser.add_argument('--output', type=Path, default=COMPACT_PATH)
+    parser.add_argument('--report', action='store_true', help='compare size, RSS, latency and predictions')
+    args = parser.parse_args()
+
+    import joblib
+
+    meta = json.loads(META_PATH.read_text(encoding='utf-8')) if META_PATH.exists() else {}
+    model = joblib.load(args.model)
+    features = [f for f in (BASE_DIR / 'lgbm_features.txt').read_text(encoding='utf-8').splitlines() if f]
+    version = hashlib.sha256(args.model.read_bytes()).hexdigest()[:12]
+    compacted = compact(model, meta.get('best_iteration'), features, version)
+    size = write_compact(compacted, args.output)
+    h = compacted['header']
+    print(f"trees={h['n_trees']} nodes={h['n_nodes']} (merged {h['merged_nodes']}) "
+          f"leaves={h['n_leaves']} max_depth={h['max_depth']} size={size / 1024:.1f}KB -> {args.output}")
+
+    if args.report:
+        report = build_report(model, CompactModel(args.output), meta)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+سياسة التوازي المركزية - Core-Aware Threading Policy
+مكان واحد يحدد عدد خيوط OpenMP لكل استدعاء LightGBM.
+
+بدون num_threads يفتح LightGBM فريق OpenMP بعدد كل الأنوية في كل استدعاء
+(والنموذج الحالي محفوظ بـ num_threads=12 من جهاز التدريب). مع عدة عمال
+Gunicorn × عدة خيوط يصبح كل تنبؤ بصف واحد منافساً على كل الأنوية.
+
+الخدمة (predict_threads):
+    حصة كل طلب متزامن = الأنوية المتاحة ÷ (العمال × الخيوط)، بحد أدنى 1
+    الدفعات الصغيرة (< 2 × MIN_ROWS_PER_THREAD صف) خيط واحد دائماً؛ الأكبر
+    خيط لكل MIN_ROWS_PER_THREAD صف حتى الحصة.
+خارج الخدمة (offline_threads): الأنوية ÷ عدد العمليات (التدريب = عملية واحدة).
+
+الأنوية المتاحة = sched_getaffinity مع حد حصة cgroup (cpu.max) إن وجد.
+التخطيط يُقرأ من WEB_CONCURRENCY و GUNICORN_THREADS؛ gunicorn.conf.py ينشر
+القيم الفعلية من إعدادات Gunicorn قبل تحميل العمال (publish_layout).
+
+المتغيرات:
+    LGBM_MAX_THREADS        سقف صريح لخيوط أي استدعاء (الافتراضي: بدون)
+    LGBM_ROWS_PER_THREAD    أقل عدد صفوف يستحق خيطاً إضافياً (الافتراضي 64)
+"""
+
+import functools
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+MIN_ROWS_PER_THREAD = max(1, int(os.environ.get('LGBM_ROWS_PER_THREAD', 64)))
+CGROUP_CPU_MAX = Path('/sys/fs/cgroup/cpu.max')
+
+
+@functools.lru_cache(maxsize=None)
+def available_cores() -> int:
+    """الأنوية التي يمكن للعملية استخدامها فعلاً (affinity + حصة الحاوية)"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = os.cpu_count() or 1
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text().split()[:2]
+        if quota != 'max':
+            cores = min(cores, max(1, math.floor(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def _cap(threads: int) -> int:
+    limit = os.environ.get('LGBM_MAX_THREADS')
+    if limit and limit.isdigit() and int(limit) > 0:
+        threads = min(threads, int(limit))
+    return max(1, threads)
+
+
+def layout() -> Dict[str, int]:
+    return {'cores': available_cores(), 'workers': _env_int('WEB_CONCURRENCY', 1),
+            'threads': _env_int('GUNICORN_THREADS', 1)}
+
+
+def publish_layout(workers: int, threads: int):
+    """تُستدعى من gunicorn.conf.py: العمال يرثون التخطيط الفعلي عبر البيئة"""
+    os.environ['WEB_CONCURRENCY'] = str(max(1, int(workers)))
+    os.environ['GUNICORN_THREADS'] = str(max(1, int(threads)))
+    request_budget.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def request_budget() -> int:
+    """أقصى خيوط لطلب واحد دون تجاوز الأنوية عندما تعمل كل الخانات معاً (محسوبة مرة واحدة)"""
+    current = layout()
+    return _cap(current['cores'] // (current['workers'] * current['threads']))
+
+
+def predict_threads(n_rows: int) -> int:
+    """خيوط OpenMP لاستدعاء تنبؤ بـ n_rows صف داخل الخدمة"""
+    return max(1, min(request_budget(), int(n_rows) // MIN_ROWS_PER_THREAD))
+
+
+def offline_threads(processes: int = 1) -> int:
+    """خيوط كل عملية لمهمة خارج الخدمة (تدريب، تقييم، تقييم دفعي) بـ processes عملية"""
+    return _cap(available_cores() // max(1, int(processes)))
+
+
+def predict_kwargs(model: Any, n_rows: int) -> Dict[str, int]:
+    """
+    وسائط num_threads لاستدعاء model.predict
+    النماذج غير LightGBM (compact) لا تقبل num_threads فترجع {}.
+    """
+    if not (hasattr(model, 'booster_') or type(model).__name__ == 'Booster'):
+        return {}
+    return {'num_threads': predict_threads(n_rows)}
+
+
+def status() -> Dict[str, Any]:
+    return dict(layout(), request_budget=request_budget(), rows_per_thread=MIN_ROWS_PER_THREAD,
+                offline_threads=offline_threads())
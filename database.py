@@ -6,9 +6,11 @@
 
 import pandas as pd
 import json
+import os
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
+from feature_store import open_feature_store, STORE_DIR
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +20,28 @@ class CarDatabase:
     تعمل مع نفس البيانات للويب و Flutter
     """
     
-    def __init__(self, csv_path: str):
+    def __init__(self, csv_path: str, store_dir: Path = STORE_DIR):
         """
         تهيئة قاعدة البيانات
         
         Args:
             csv_path: مسار ملف CSV
+            store_dir: مجلد مخزن الميزات
         """
         self.csv_path = Path(csv_path)
+        self.store_dir = Path(store_dir)
         self.df = None
+        self.store = None
         self.load_data()
         
     def load_data(self):
-        """تحميل البيانات من CSV"""
+        """تحميل البيانات من مخزن الميزات (memmap) أو من CSV كبديل"""
         try:
+            self.store = open_feature_store(self.store_dir, csv_path=self.csv_path, build_if_missing=True)
+            if self.store is not None:
+                self.df = self.store.frame(restore_dtypes=True)
+                logger.info(f"✅ تم تحميل البيانات من مخزن الميزات {self.store.version}: {len(self.df)} صف")
+                return
             self.df = pd.read_csv(self.csv_path)
             logger.info(f"✅ تم تحميل البيانات: {len(self.df)} صف")
         except Exception as e:
@@ -179,13 +189,45 @@ class CarDatabase:
         Returns:
             قائمة النتائج
         """
+        return self.search_page(query, column)['results']
+    
+    def search_page(self, query: str, column: str = 'name_le', limit: int = None,
+                    offset: int = 0) -> Dict[str, Any]:
+        """
+        صفحة من نتائج البحث بترتيب الصفوف مع العدد الكلي للنتائج
+        
+        Returns:
+            {'results': [...], 'total': عدد كل النتائج}
+        """
         try:
             if column in self.df.columns:
                 mask = self.df[column].astype(str).str.contains(query, case=False, na=False)
-                return self.df[mask].to_dict('records')
-            return []
+                matches = self.df[mask]
+                stop = offset + limit if limit else None
+                return {'results': matches.iloc[offset:stop].to_dict('records'), 'total': len(matches)}
+            return {'results': [], 'total': 0}
         except Exception as e:
             logger.error(f"خطأ في search_cars: {e}")
+            return {'results': [], 'total': 0}
+    
+    def get_top_cars(self, column: str, k: int = 10, largest: bool = True) -> List[Dict[str, Any]]:
+        """
+        أعلى (أو أدنى) k سيارة حسب عمود رقمي؛ التعادل يُحسم بترتيب الصفوف
+        
+        Returns:
+            قائمة السيارات مع row_index لكل منها
+        """
+        try:
+            if column not in self.df.columns:
+                return []
+            values = pd.to_numeric(self.df[column], errors='coerce')
+            top = values.nlargest(k) if largest else values.nsmallest(k)
+            cars = self.df.loc[top.index].to_dict('records')
+            for car, index in zip(cars, top.index):
+                car['row_index'] = int(index)
+            return cars
+        except Exception as e:
+            logger.error(f"خطأ في get_top_cars: {e}")
             return []
     
     def get_data_range(self, column: str) -> Dict[str, Any]:
@@ -225,6 +267,14 @@ class CarDatabase:
 
 # إنشاء instance عام من قاعدة البيانات
 def get_database() -> CarDatabase:
-    """الحصول على instance قاعدة البيانات"""
+    """
+    الحصول على instance قاعدة البيانات
+    DB_SHARDS > 1 يفعّل الوضع المجزأ (sharded_database.py): عمليات shards محلية
+    ومنسق يوزع الاستعلامات ويدمج النتائج.
+    """
     csv_path = Path(__file__).parent / 'dataset' / 'cleaned_cars.csv'
+    shards = int(os.environ.get('DB_SHARDS', 0) or 0)
+    if shards > 1:
+        from sharded_database import ShardedCarDatabase
+        return ShardedCarDatabase(str(csv_path), shards=shards)
     return CarDatabase(str(csv_path))
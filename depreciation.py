@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+جدول الاستهلاك المحسوب مسبقاً - Materialized Depreciation Table
+لكل اسم سيارة وكل توليفة (وقود، ناقل حركة، مالك، بائع) ظهرت في البيانات،
+يُحسب تنبؤ النموذج مسبقاً على شبكة (عمر السيارة × المسافة المقطوعة) بمواصفات
+السيارة الأكثر شيوعاً (المحرك، القوة، الاستهلاك، المقاعد).
+
+/api/predict-manual مع tier=approx يجيب من الجدول (بحث في dict + استيفاء خطي
+على المسافة) عندما يطابق الإدخال مفتاحاً ومواصفاته ضمن السماحية، ويعود للنموذج
+الكامل فيما عدا ذلك. طلبات full و fast تستخدم النموذج دائماً.
+
+التخطيط على القرص:
+    dataset/depreciation/
+        CURRENT                      -> نسخة النموذج الحالية
+        <model_version>/manifest.json
+        <model_version>/table.npy    float32 (n_keys, n_ages, n_km) مخرج النموذج الخام (log1p)
+        <model_version>/keys.npy     (name_le, fuel, trans, owner, seller)
+        <model_version>/specs.npy    float32 (n_keys, 4) engine, max_power, mileage, seats
+        <model_version>/report.json  تقرير خطأ التقريب (--report)
+
+الاستخدام:
+    python depreciation.py              # بناء الجدول للنموذج الحالي
+    python depreciation.py --report     # بناء (إن لزم) + قياس خطأ التقريب وزمن البحث
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import concurrency
+from encoding import ManualEncoder, REFERENCE_YEAR, inverse_target
+from feature_store import load_feature_names, open_feature_store
+
+logger = logging.getLogger(__name__)
+
+# ===== PATHS =====
+BASE_DIR = Path(__file__).parent
+TABLE_DIR = BASE_DIR / 'dataset' / 'depreciation'
+MODEL_PATH = BASE_DIR / 'lgbm_model.pkl'
+META_PATH = BASE_DIR / 'lgbm_meta.json'
+SCALER_JSON = BASE_DIR / 'scaler_params.json'
+NAME_LE_JSON = BASE_DIR / 'name_le_mapping.json'
+
+FORMAT_VERSION = 1
+AGE_GRID = np.arange(0, 36, dtype=np.int32)           # سنوات (السنة عدد صحيح دائماً)
+KM_GRID = np.arange(0, 300_001, 5_000, dtype=np.float64)
+KM_SNAP = 1_000.0                                     # أقصى بعد عن نقطة شبكة لاستخدام الجدول
+SPEC_FIELDS = ['engine', 'power', 'mileage', 'seats']
+SPEC_COLUMNS = ['engine', 'max_power', 'mileage', 'seats']
+SPEC_TOLERANCE = 0.001                                # سماحية نسبية لمطابقة المواصفات
+KEYS_PER_BATCH = 256
+
+KEY_DTYPE = np.dtype([
+    ('name_le', np.int32),
+    ('fuel', np.int8),
+    ('trans', np.int8),
+    ('owner', np.int8),
+    ('seller', np.int8),
+])
+# مجموعة المفتاح -> حقل الإدخال في predict-manual
+KEY_FIELDS = {'fuel': 'fuel', 'trans': 'transmission', 'owner': 'owner', 'seller': 'seller'}
+
+
+def model_version(path: Path = MODEL_PATH) -> str:
+    """نفس بصمة النموذج المستخدمة في app.py"""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:12]
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+
+
+def _predict_raw(model, X: np.ndarray) -> np.ndarray:
+    kwargs = concurrency.predict_kwargs(model, len(X))
+    num_iter = getattr(model, 'best_iteration_', None)
+    if num_iter is not None:
+        return model.predict(X, num_iteration=num_iter, **kwargs)
+    return model.predict(X, **kwargs)
+
+
+def collect_keys(store, scaler: Dict[str, Any]) -> pd.DataFrame:
+    """
+    المفاتيح الظاهرة في البيانات مع المواصفات الأكثر شيوعاً لكل مفتاح
+
+    Returns:
+        DataFrame بأعمدة KEY_DTYPE + SPEC_COLUMNS + rows (عدد الصفوف)
+    """
+    df = pd.DataFrame({g: store.meta[g] for g in KEY_FIELDS})
+    df['name_le'] = store.column('name_le').astype(np.int32)
+    means, scales = scaler.get('means', {}), scaler.get('scales', {})
+    for col in SPEC_COLUMNS:
+        values = store.column(col).astype(np.float64)
+        if col in means and scales.get(col):
+            values = values * scales[col] + means[col]
+        df[col] = np.round(values, 2)
+    df = df[(df[list(KEY_FIELDS)] >= 0).all(axis=1)]
+
+    keys = list(KEY_DTYPE.names)
+    counts = df.groupby(keys + SPEC_COLUMNS, sort=False).size().rename('n').reset_index()
+    counts = counts.sort_values('n', ascending=False)
+    modal = counts.drop_duplicates(keys).drop(columns='n')
+    sizes = df.groupby(keys).size().rename('rows').reset_index()
+    return modal.merge(sizes, on=keys).sort_values(keys).reset_index(drop=True)
+
+
+def build_table(table_dir: Path = TABLE_DIR, force: bool = False) -> Dict[str, Any]:
+    """
+    حساب الجدول لكل المفاتيح على شبكة AGE_GRID × KM_GRID
+
+    Returns:
+        الـ manifest الخاص بالنسخة المبنية
+    """
+    table_dir = Path(table_dir)
+    version = model_version()
+    target_dir = table_dir / version
+    if target_dir.exists() and not force:
+        _set_current(table_dir, version)
+        logger.info(f"✅ جدول الاستهلاك محدث بالفعل: {version}")
+        return json.loads((target_dir / 'manifest.json').read_text(encoding='utf-8'))
+
+    store = open_feature_store(build_if_missing=True)
+    if store is None:
+        raise RuntimeError('مخزن الميزات غير متاح')
+    scaler = _load_json(SCALER_JSON)
+    name_le_map = _load_json(NAME_LE_JSON)
+    code_to_name = {code: name for name, code in name_le_map.items()}
+    levels = store.category_levels
+    features = load_feature_names()
+    encoder = ManualEncoder(features, scaler, name_le_map)
+    model = joblib.load(MODEL_PATH)
+
+    keys = collect_keys(store, scaler)
+    keys = keys[keys['name_le'].isin(list(code_to_name))].reset_index(drop=True)
+    n_keys, n_ages, n_km = len(keys), len(AGE_GRID), len(KM_GRID)
+    per_key = n_ages * n_km
+    logger.info(f"🧮 حساب جدول الاستهلاك: {n_keys} مفتاح × {n_ages} عمر × {n_km} مسافة")
+
+    table_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f'.{version}-', dir=table_dir))
+    t0 = time.perf_counter()
+    try:
+        table = np.lib.format.open_memmap(tmp_dir / 'table.npy', mode='w+', dtype=np.float32,
+                                          shape=(n_keys, n_ages, n_km))
+        ages = np.tile(np.repeat(AGE_GRID, n_km), KEYS_PER_BATCH)
+        kms = np.tile(np.tile(KM_GRID, n_ages), KEYS_PER_BATCH)
+        for start in range(0, n_keys, KEYS_PER_BATCH):
+            batch = keys.iloc[start:start + KEYS_PER_BATCH]
+            n = len(batch) * per_key
+            columns = {
+                'car_name': np.repeat([code_to_name[c] for c in batch['name_le']], per_key),
+                'year': REFERENCE_YEAR - ages[:n],
+                'km': kms[:n],
+            }
+            for group, field in KEY_FIELDS.items():
+                columns[field] = np.repeat(np.asarray(levels[group], dtype=object)[batch[group].to_numpy()], per_key)
+            for field, col in zip(SPEC_FIELDS, SPEC_COLUMNS):
+                columns[field] = np.repeat(batch[col].to_numpy(), per_key)
+            raw = _predict_raw(model, encoder.encode_columns(columns, n))
+            table[start:start + len(batch)] = raw.reshape(len(batch), n_ages, n_km)
+        table.flush()
+        del table
+
+        key_arr = np.empty(n_keys, dtype=KEY_DTYPE)
+        for name in KEY_DTYPE.names:
+            key_arr[name] = keys[name].to_numpy()
+        np.save(tmp_dir / 'keys.npy', key_arr)
+        np.save(tmp_dir / 'specs.npy', keys[SPEC_COLUMNS].to_numpy(dtype=np.float32))
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'model_version': version,
+            'feature_store_version': store.version,
+            'created_at': pd.Timestamp.now().isoformat(),
+            'build_seconds': round(time.perf_counter() - t0, 2),
+            'n_keys': n_keys,
+            'rows_covered': int(keys['rows'].sum()),
+            'reference_year': REFERENCE_YEAR,
+            'age_grid': AGE_GRID.tolist(),
+            'km_grid': KM_GRID.tolist(),
+            'km_snap': KM_SNAP,
+            'spec_fields': SPEC_FIELDS,
+            'spec_tolerance': SPEC_TOLERANCE,
+            'category_levels': {g: levels[g] for g in KEY_FIELDS},
+            'target': 'raw',
+        }
+        (tmp_dir / 'manifest.json').write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding='utf-8')
+
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _set_current(table_dir, version)
+    size_mb = (target_dir / 'table.npy').stat().st_size / 1e6
+    logger.info(f"✅ تم بناء جدول الاستهلاك {version}: {n_keys} مفتاح، {size_mb:.1f}MB، "
+                f"{manifest['build_seconds']}s")
+    return manifest
+
+
+def _set_current(table_dir: Path, version: str):
+    tmp = table_dir / f'.CURRENT.{os.getpid()}'
+    tmp.write_text(version, encoding='utf-8')
+    os.replace(tmp, table_dir / 'CURRENT')
+
+
+class DepreciationTable:
+    """
+    جدول للقراءة فقط (memmap) مع فهرس dict للمفاتيح
+    lookup_raw() يرجع مخرج النموذج الخام أو None للعودة إلى النموذج
+    """
+
+    def __init__(self, version_dir: Path, name_le_map: Mapping[str, int]):
+        self.path = Path(version_dir)
+        self.manifest = json.loads((self.path / 'manifest.json').read_text(encoding='utf-8'))
+        self.table = np.load(self.path / 'table.npy', mmap_mode='r')
+        self.keys = np.load(self.path / 'keys.npy', mmap_mode='r')
+        self.specs = np.load(self.path / 'specs.npy').tolist()
+        self.name_le_map = name_le_map
+        self._index = {tuple(k): i for i, k in enumerate(self.keys.tolist())}
+        self._levels = {
+            field: {level: code for code, level in enumerate(self.manifest['category_levels'][group])}
+            for group, field in KEY_FIELDS.items()
+        }
+        self.age_min = self.manifest['age_grid'][0]
+        self.n_ages = len(self.manifest['age_grid'])
+        km_grid = self.manifest['km_grid']
+        self.km_step = km_grid[1] - km_grid[0]
+        self.km_max = km_grid[-1]
+        self.km_snap = self.manifest['km_snap']
+        self.tolerance = self.manifest['spec_tolerance']
+        self.reference_year = self.manifest['reference_year']
+
+    @property
+    def version(self) -> str:
+        return self.manifest['model_version']
+
+    def lookup_raw(self, data: Mapping[str, Any]) -> Optional[float]:
+        """
+        بحث + استيفاء خطي على المسافة
+        None إذا كان الإدخال خارج الجدول أو بعيداً عن الشبكة (أكثر من km_snap)
+        """
+        try:
+            code = self.name_le_map.get(data.get('car_name'))
+            if code is None:
+                return None
+            key = (code,) + tuple(self._levels[f].get(str(data.get(f))) for f in ('fuel', 'transmission', 'owner', 'seller'))
+            i = self._index.get(key)
+            if i is None:
+                return None
+
+            a = self.reference_year - int(data.get('year')) - self.age_min
+            km = float(data.get('km'))
+            if not (0 <= a < self.n_ages and 0 <= km <= self.km_max):
+                return None
+
+            for field, ref in zip(SPEC_FIELDS, self.specs[i]):
+                if abs(float(data.get(field)) - ref) > self.tolerance * max(abs(ref), 1.0):
+                    return None
+        except (TypeError, ValueError):
+            return None
+
+        pos = km / self.km_step
+        j = int(pos)
+        frac = pos - j
+        if min(frac, 1.0 - frac) * self.km_step > self.km_snap:
+            return None
+        row = self.table[i, a]
+        if frac == 0.0:
+            return float(row[j])
+        return float(row[j] * (1.0 - frac) + row[j + 1] * frac)
+
+
+def open_table(name_le_map: Mapping[str, int], expected_version: Optional[str] = None,
+               table_dir: Path = TABLE_DIR) -> Optional[DepreciationTable]:
+    """
+    فتح النسخة الحالية من الجدول
+
+    Args:
+        name_le_map: ترميز أسماء السيارات المستخدم في الخادم
+        expected_version: بصمة النموذج المحمل؛ يُتجاهل الجدول إذا لم تطابق
+    """
+    try:
+        current = Path(table_dir) / 'CURRENT'
+        if not current.exists():
+            return None
+        table = DepreciationTable(Path(table_dir) / current.read_text(encoding='utf-8').strip(), name_le_map)
+        if expected_version is not None and table.version != expected_version:
+            logger.info("⚠️ جدول الاستهلاك مبني لنموذج آخر - سيتم تجاهله")
+            return None
+        return table
+    except Exception as e:
+        logger.error(f"❌ خطأ في فتح جدول الاستهلاك: {e}")
+        return None
+
+
+# ===== REPORT =====
+def _error_stats(approx: np.ndarray, exact: np.ndarray) -> Dict[str, float]:
+    rel = np.abs(approx - exact) / np.maximum(exact, 1.0)
+    return {
+        'n': int(len(rel)),
+        'mean_abs_pct': round(float(rel.mean()) * 100, 4),
+        'p50_abs_pct': round(float(np.percentile(rel, 50)) * 100, 4),
+        'p95_abs_pct': round(float(np.percentile(rel, 95)) * 100, 4),
+        'p99_abs_pct': round(float(np.percentile(rel, 99)) * 100, 4),
+        'max_abs_pct': round(float(rel.max()) * 100, 4),
+        'mean_abs': round(float(np.abs(approx - exact).mean()), 2),
+    }
+
+
+def approximation_report(table: DepreciationTable, n_samples: int = 5000, seed: int = 42) -> Dict[str, Any]:
+    """
+    خطأ التقريب مقارنة بالنموذج:
+      - off_grid: مسافات عشوائية لمفاتيح عشوائية (ما يقبله المسار السريع منها)
+      - dataset: صفوف البيانات الحقيقية التي تمر بالمسار السريع
+    بالإضافة إلى زمن البحث مقارنة بتنبؤ صف واحد من النموذج
+    """
+    meta = _load_json(META_PATH)
+    scaler = _load_json(SCALER_JSON)
+    encoder = ManualEncoder(load_feature_names(), scaler, table.name_le_map)
+    model = joblib.load(MODEL_PATH)
+    code_to_name = {c: n for n, c in table.name_le_map.items()}
+    levels = table.manifest['category_levels']
+    rng = np.random.default_rng(seed)
+
+    def payload(key, spec, year, km):
+        p = {'car_name': code_to_name[key[0]], 'year': int(year), 'km': float(km)}
+        for (group, field), code in zip(KEY_FIELDS.items(), key[1:]):
+            p[field] = levels[group][code]
+        p.update(zip(SPEC_FIELDS, spec))
+        return p
+
+    keys = table.keys.tolist()
+    idx = rng.integers(0, len(keys), n_samples)
+    ages = rng.integers(table.age_min, table.age_min + table.n_ages, n_samples)
+    kms = rng.uniform(0, table.km_max, n_samples)
+    payloads = [payload(keys[i], table.specs[i], table.reference_year - a, km) for i, a, km in zip(idx, ages, kms)]
+
+    t0 = time.perf_counter()
+    approx_raw = np.array([table.lookup_raw(p) for p in payloads], dtype=np.float64)
+    lookup_us = (time.perf_counter() - t0) / n_samples * 1e6
+    hit = ~np.isnan(approx_raw)
+    exact = inverse_target(_predict_raw(model, encoder.encode_records([p for p, h in zip(payloads, hit) if h])), meta)
+    off_grid = {'hit_pct': round(float(hit.mean()) * 100, 2),
+                **_error_stats(inverse_target(approx_raw[hit], meta), exact)}
+
+    t0 = time.perf_counter()
+    for p in payloads[:200]:
+        _predict_raw(model, encoder.encode_one(p))
+    model_us = (time.perf_counter() - t0) / 200 * 1e6
+
+    # صفوف البيانات الحقيقية
+    store = open_feature_store()
+    rows = collect_rows_as_payloads(store, scaler, code_to_name)
+    hits = [(p, r) for p in rows if (r := table.lookup_raw(p)) is not None]
+    dataset = {'rows': len(rows), 'fast_path_rows': len(hits),
+               'coverage_pct': round(len(hits) / max(len(rows), 1) * 100, 2)}
+    if hits:
+        exact_ds = inverse_target(_predict_raw(model, encoder.encode_records([p for p, _ in hits])), meta)
+        dataset.update(_error_stats(inverse_target(np.array([r for _, r in hits]), meta), exact_ds))
+
+    return {
+        'model_version': table.version,
+        'table_bytes': int(table.table.nbytes),
+        'n_keys': len(keys),
+        'off_grid': off_grid,
+        'dataset': dataset,
+        'latency_us': {'table_lookup': round(lookup_us, 2), 'model_single_row': round(model_us, 2)},
+    }
+
+
+def collect_rows_as_payloads(store, scaler: Dict[str, Any], code_to_name: Dict[int, str]):
+    """تحويل صفوف مخزن الميزات إلى مدخلات خام بصيغة predict-manual"""
+    means, scales = scaler.get('means', {}), scaler.get('scales', {})
+    cols = {}
+    for field, col in zip(['km'] + SPEC_FIELDS, ['km_driven'] + SPEC_COLUMNS):
+        values = store.column(col).astype(np.float64)
+        if col in means and scales.get(col):
+            values = values * scales[col] + means[col]
+        cols[field] = np.round(values, 2)
+    levels = store.category_levels
+    names = store.column('name_le').astype(int)
+    out = []
+    for r in range(store.n_rows):
+        if names[r] not in code_to_name or min(int(store.meta[g][r]) for g in KEY_FIELDS) < 0:
+            continue
+        p = {'car_name': code_to_name[names[r]], 'year': int(REFERENCE_YEAR - store.meta['car_age'][r])}
+        for group, field in KEY_FIELDS.items():
+            p[field] = levels[group][store.meta[group][r]]
+        for field, values in cols.items():
+            p[field] = float(values[r])
+        out.append(p)
+    return out
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Build the materialized depreciation table')
+    parser.add_argument('--table-dir', type=Path, default=TABLE_DIR)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--report', action='store_true', help='measure approximation error and lookup latency')
+    parser.add_argument('--samples', type=int, default=5000)
+    args = parser.parse_args()
+
+    manifest = build_table(args.table_dir, args.force)
+    print(f"model={manifest['model_version']} keys={manifest['n_keys']} "
+          f"grid={len(manifest['age_grid'])}x{len(manifest['km_grid'])}")
+    if args.report:
+        table = open_table(_load_json(NAME_LE_JSON), table_dir=args.table_dir)
+        report = approximation_report(table, args.samples)
+        (table.path / 'report.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+مراقبة انحراف المدخلات أثناء الخدمة - Streaming Input-Drift Monitor
+يقارن توزيع مدخلات الطلبات بتوزيع بيانات التدريب دون تخزين الطلبات نفسها.
+
+- خط الأساس: مخزن الميزات (cleaned_cars.csv بعد التطبيع). لكل ميزة رقمية
+  حدود خانات من كمّيات التدريب (NUM_BINS خانة) + خانتا ذيل لما تحت/فوق مدى
+  التدريب + خانة "مفقود" للقيم NaN (خارج حساب PSI/KS وتُعرض كنسبة منفصلة).
+  لكل مجموعة One-hot نسبة كل مستوى + خانة "مجهول" (كل الأعمدة 0).
+  الحدود تُعرض بالوحدات الخام عبر scaler_params.json.
+- المخطط: مصفوفة عدادات int64 واحدة ثابتة الحجم لكل نافذة (حالية + سابقة،
+  تدور كل DRIFT_WINDOW_SECONDS). التحديث = حساب الخانات خارج القفل ثم إضافة
+  واحدة تحت القفل، فالتكلفة O(عدد الميزات) لكل صف ولا تعتمد على عدد الطلبات.
+- أسماء السيارات غير الموجودة في name_le_mapping.json (تُرمّز name_le=0)
+  تُعد، وأكثرها تكراراً يُتتبع بخوارزمية Misra-Gries بسعة UNKNOWN_NAMES_K.
+- status(): PSI لكل ميزة و KS (أقصى فرق بين دالتي التوزيع التراكمي على حدود
+  الخانات) للميزات الرقمية، على النافذتين معاً.
+
+المخطط لكل عامل (مثل الوضع الظلي)؛ مقياس PSI يُصدّر كـ gauge عند كل قراءة.
+
+المتغيرات:
+    DRIFT_MONITOR          0 لتعطيل المراقبة (الافتراضي 1)
+    DRIFT_WINDOW_SECONDS   طول النافذة (الافتراضي 3600)
+    DRIFT_MIN_ROWS         أقل عدد صفوف لحساب الدرجات (الافتراضي 100)
+"""
+
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+import metrics
+from encoding import CATEGORICAL_FIELDS, NUMERIC_FIELDS, REFERENCE_YEAR
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('DRIFT_MONITOR', '1') != '0'
+WINDOW_SECONDS = float(os.environ.get('DRIFT_WINDOW_SECONDS', 3600))
+MIN_ROWS = int(os.environ.get('DRIFT_MIN_ROWS', 100))
+NUM_BINS = 20                # خانات الكمّيات لكل ميزة رقمية (+ خانتا الذيل)
+MAX_ROWS_PER_OBSERVE = 2048  # الدفعات الكبيرة تُراقب عبر عينة منتظمة من صفوفها
+UNKNOWN_NAMES_K = 16
+PSI_EPSILON = 1e-4
+# حدود PSI المتعارف عليها: < 0.1 مستقر، 0.1-0.25 متوسط، > 0.25 انحراف كبير
+PSI_THRESHOLDS = ((0.1, 'stable'), (0.25, 'moderate'), (float('inf'), 'significant'))
+
+OBSERVED = metrics.counter('car_price_drift_observed_rows_total', 'Rows folded into the drift sketches', ['route'])
+UNKNOWN = metrics.counter('car_price_drift_unknown_total', 'Inputs outside the training vocabulary', ['field'])
+PSI = metrics.gauge('car_price_drift_psi', 'Population stability index vs training (last read)', ['feature'])
+
+# حقل الإدخال -> عمود الميزة الرقمي (بما فيها العمر)
+_RECORD_NUMERIC = dict(NUMERIC_FIELDS, year='car_age')
+
+
+def _severity(psi: float) -> str:
+    for limit, label in PSI_THRESHOLDS:
+        if psi < limit:
+            return label
+    return PSI_THRESHOLDS[-1][1]
+
+
+def _psi(current: np.ndarray, baseline: np.ndarray) -> float:
+    """PSI بين توزيعين (مع تنعيم الخانات الفارغة)؛ الخانات الفارغة في كليهما لا تساهم"""
+    used = (current > 0) | (baseline > 0)
+    p = np.maximum(current[used] / max(current.sum(), 1), PSI_EPSILON)
+    q = np.maximum(baseline[used] / max(baseline.sum(), 1), PSI_EPSILON)
+    return float(np.sum((p - q) * np.log(p / q)))
+
+
+def _ks(current: np.ndarray, baseline: np.ndarray) -> float:
+    cdf_p = np.cumsum(current) / max(current.sum(), 1)
+    cdf_q = np.cumsum(baseline) / max(baseline.sum(), 1)
+    return float(np.max(np.abs(cdf_p - cdf_q)))
+
+
+class DriftMonitor:
+    """مخططات ثابتة الحجم لمدخلات الخدمة مقابل خط أساس التدريب"""
+
+    def __init__(self, X_train: np.ndarray, feature_names: List[str], scaler: Optional[Mapping[str, Any]] = None,
+                 name_le_map: Optional[Mapping[str, int]] = None, window_seconds: float = WINDOW_SECONDS):
+        self.feature_names = list(feature_names)
+        index = {c: i for i, c in enumerate(self.feature_names)}
+        scaler = scaler or {}
+        self._means, self._scales = scaler.get('means', {}), scaler.get('scales', {})
+        self.name_le_map = name_le_map or {}
+        self.window_seconds = window_seconds
+
+        one_hot = {}
+        for field, prefix in CATEGORICAL_FIELDS.items():
+            cols = [c for c in self.feature_names if c.startswith(prefix)]
+            if cols:
+                one_hot[field] = (prefix, cols)
+        one_hot_cols = {c for _, cols in one_hot.values() for c in cols}
+        self.numeric = [c for c in self.feature_names if c not in one_hot_cols]
+        self._num_idx = np.array([index[c] for c in self.numeric], dtype=np.intp)
+
+        # حدود الخانات: [min, كمّيات..., بعد max] -> خانة 0 تحت المدى والأخيرة فوقه
+        X_train = np.asarray(X_train, dtype=np.float64)
+        quantiles = np.linspace(0, 1, NUM_BINS + 1)[1:-1]
+        self._edges: List[np.ndarray] = []
+        for i in self._num_idx:
+            col = X_train[:, i]
+            lo, hi = float(col.min()), float(col.max())
+            inner = np.quantile(col, quantiles)
+            self._edges.append(np.unique(np.concatenate([[lo], inner, [np.nextafter(hi, np.inf)]])))
+        width = max(len(e) for e in self._edges) + 1
+        # مصفوفة حدود مستطيلة (الحشو بـ inf لا يلتقط أي قيمة)
+        self._edge_matrix = np.full((len(self._edges), width - 1), np.inf)
+        for k, e in enumerate(self._edges):
+            self._edge_matrix[k, :len(e)] = e
+        self._edge_lists = [e.tolist() for e in self._edges]
+        self._num_width = width
+        # خانة إضافية بعد خانات كل ميزة للقيم المفقودة (NaN)
+        self._missing_slot = width
+
+        # المجموعات الفئوية: المستويات + خانة مجهول
+        self.groups = {}
+        for field, (prefix, cols) in one_hot.items():
+            self.groups[field] = {'levels': [c[len(prefix):] for c in cols],
+                                  'idx': np.array([index[c] for c in cols], dtype=np.intp)}
+
+        # تخطيط العدادات: [ميزات رقمية × (width + مفقود)] ثم [مستويات كل مجموعة + 1]
+        self._num_offsets = np.arange(len(self.numeric), dtype=np.intp) * (width + 1)
+        offset = len(self.numeric) * (width + 1)
+        self._group_offsets = {}
+        for field, group in self.groups.items():
+            self._group_offsets[field] = offset
+            offset += len(group['levels']) + 1
+        self._size = offset
+
+        self.baseline = self._bin_counts(X_train)
+        self._lock = threading.Lock()
+        self._current = np.zeros(self._size, dtype=np.int64)
+        self._previous = np.zeros(self._size, dtype=np.int64)
+        self._rows = [0, 0]            # صفوف النافذة الحالية / السابقة
+        self._window_start = time.time()
+        self._unknown_names: Dict[str, int] = {}
+        self._unknown_name_total = 0
+        self._record_total = 0
+
+    # ===== BINNING =====
+    def _bin_counts(self, X: np.ndarray) -> np.ndarray:
+        """عدادات الخانات لمصفوفة (n, features) بعمليات متجهة فقط"""
+        n = X.shape[0]
+        parts = []
+        if len(self.numeric):
+            values = X[:, self._num_idx]
+            bins = (values[:, :, None] >= self._edge_matrix[None]).sum(axis=2)
+            # NaN >= edge دائماً False فتقع في خانة "تحت المدى"؛ تُنقل إلى خانة المفقود
+            bins[np.isnan(values)] = self._missing_slot
+            parts.append((bins + self._num_offsets).ravel())
+        for field, group in self.groups.items():
+            onehot = X[:, group['idx']]
+            code = np.where(onehot.max(axis=1) > 0.5, onehot.argmax(axis=1), len(group['levels']))
+            parts.append(code + self._group_offsets[field])
+        if not parts or n == 0:
+            return np.zeros(self._size, dtype=np.int64)
+        return np.bincount(np.concatenate(parts), minlength=self._size).astype(np.int64)
+
+    def _rotate(self, now: float):
+        """تدوير النوافذ (تحت القفل)؛ نافذة فارغة كاملة تمسح السابقة أيضاً"""
+        elapsed = now - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        if elapsed < 2 * self.window_seconds:
+            self._previous, self._current = self._current, self._previous
+            self._rows = [0, self._rows[0]]
+        else:
+            self._previous[:] = 0
+            self._rows = [0, 0]
+        self._current[:] = 0
+        self._window_start = now - (elapsed % self.window_seconds)
+
+    def _add(self, rows: int, counts: Optional[np.ndarray] = None, idx: Optional[List[int]] = None,
+             unknown_name: Optional[str] = None):
+        """الجزء الوحيد تحت القفل: إضافة العدادات المحسوبة مسبقاً"""
+        now = time.time()
+        with self._lock:
+            self._rotate(now)
+            if counts is not None:
+                self._current += counts
+            for i in idx or ():
+                self._current[i] += 1
+            self._rows[0] += rows
+            if idx is not None:
+                self._record_total += 1
+            if unknown_name is not None:
+                self._count_unknown_name(unknown_name)
+
+    # ===== OBSERVE =====
+    def observe(self, route: str, X) -> None:
+        """إضافة مصفوفة مرمّزة (بترتيب الميزات) إلى المخطط"""
+        X = np.asarray(getattr(X, 'values', X), dtype=np.float32).astype(np.float64)  # دقة خط الأساس
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[0] > MAX_ROWS_PER_OBSERVE:
+            X = X[::-(-X.shape[0] // MAX_ROWS_PER_OBSERVE)]
+        counts = self._bin_counts(X)
+        for field, group in self.groups.items():
+            unknown = int(counts[self._group_offsets[field] + len(group['levels'])])
+            if unknown:
+                UNKNOWN.labels(field=field).inc(unknown)
+        self._add(X.shape[0], counts=counts)
+        OBSERVED.labels(route=route).inc(X.shape[0])
+
+    def observe_record(self, route: str, record: Mapping[str, Any]) -> None:
+        """
+        إضافة إدخال خام واحد (حقول /api/predict-manual) بدون ترميز كامل
+        الحقول الناقصة أو غير الرقمية تُتخطى.
+        """
+        idx = []
+        for k, col in enumerate(self.numeric):
+            value = self._record_value(col, record)
+            if value is None:
+                continue
+            slot = self._missing_slot if math.isnan(value) else bisect.bisect_right(self._edge_lists[k], value)
+            idx.append(int(self._num_offsets[k]) + slot)
+        for field, group in self.groups.items():
+            if field not in record:
+                continue
+            level = str(record[field])
+            try:
+                code = group['levels'].index(level)
+            except ValueError:
+                code = len(group['levels'])
+                UNKNOWN.labels(field=field).inc()
+            idx.append(self._group_offsets[field] + code)
+        name = record.get('car_name')
+        unknown_name = name if isinstance(name, str) and self.name_le_map and name not in self.name_le_map else None
+        if unknown_name is not None:
+            UNKNOWN.labels(field='car_name').inc()
+        self._add(1, idx=idx, unknown_name=unknown_name)
+        OBSERVED.labels(route=route).inc()
+
+    def _record_value(self, col: str, record: Mapping[str, Any]) -> Optional[float]:
+        try:
+            if col == 'name_le':
+                if 'car_name' not in record:
+                    return None
+                return float(self.name_le_map.get(record['car_name'], 0))
+            field = next((f for f, c in _RECORD_NUMERIC.items() if c == col), None)
+            if field is None or field not in record:
+                return None
+            value = float(record[field])
+        except (TypeError, ValueError):
+            return None
+        if math.isnan(value):
+            return value
+        if col == 'car_age':
+            value = REFERENCE_YEAR - int(value)
+        if col in self._means and self._scales.get(col):
+            value = (value - self._means[col]) / self._scales[col]
+        # نفس دقة خط الأساس (مخزن الميزات float32)، وإلا تقع القيم المتقطعة
+        # مثل seats=5 في الخانة المجاورة لقيمتها في التدريب
+        return float(np.float32(value))
+
+    def _count_unknown_name(self, name: str):
+        """Misra-Gries: أكثر الأسماء المجهولة تكراراً بذاكرة ثابتة (تحت القفل)"""
+        self._unknown_name_total += 1
+        if name in self._unknown_names:
+            self._unknown_names[name] += 1
+        elif len(self._unknown_names) < UNKNOWN_NAMES_K:
+            self._unknown_names[name] = 1
+        else:
+            for key in list(self._unknown_names):
+                self._unknown_names[key] -= 1
+                if self._unknown_names[key] == 0:
+                    del self._unknown_names[key]
+
+    # ===== SCORES =====
+    def _raw_edges(self, col: str, edges: np.ndarray) -> List[float]:
+        if col in self._means and self._scales.get(col):
+            edges = edges * self._scales[col] + self._means[col]
+        if col == 'car_age':
+            edges = REFERENCE_YEAR - edges
+        return [round(float(e), 2) for e in edges]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._rotate(time.time())
+            counts = self._current + self._previous
+            rows = sum(self._rows)
+            unknown_names = sorted(self._unknown_names.items(), key=lambda kv: -kv[1])
+            unknown_name_total, record_total = self._unknown_name_total, self._record_total
+            window_age = time.time() - self._window_start
+
+        enough = rows >= MIN_ROWS
+        features = {}
+        for k, col in enumerate(self.numeric):
+            start = int(self._num_offsets[k])
+            cur = counts[start:start + self._num_width]
+            base = self.baseline[start:start + self._num_width]
+            missing = int(counts[start + self._missing_slot])
+            entry = {
+                'type': 'numeric',
+                'rows': int(cur.sum()),
+                'missing': missing,
+                'missing_rate': round(missing / max(int(cur.sum()) + missing, 1), 4),
+                'below_range': round(float(cur[0]) / max(cur.sum(), 1), 4),
+                'above_range': round(float(cur[len(self._edges[k])]) / max(cur.sum(), 1), 4),
+            }
+            if enough:
+                psi = _psi(cur, base)
+                entry.update(psi=round(psi, 4), ks=round(_ks(cur, base), 4), severity=_severity(psi))
+            features[col] = entry
+        for field, group in self.groups.items():
+            start = self._group_offsets[field]
+            n_levels = len(group['levels'])
+            cur = counts[start:start + n_levels + 1]
+            base = self.baseline[start:start + n_levels + 1]
+            total = max(cur.sum(), 1)
+            entry = {
+                'type': 'categorical',
+                'rows': int(cur.sum()),
+                'unknown_rate': round(float(cur[n_levels]) / total, 4),
+                'share': {lvl: round(float(c) / total, 4) for lvl, c in zip(group['levels'], cur[:n_levels])},
+                'baseline_share': {lvl: round(float(c) / max(base.sum(), 1), 4)
+                                   for lvl, c in zip(group['levels'], base[:n_levels])},
+            }
+            if enough:
+                psi = _psi(cur, base)
+                entry.update(psi=round(psi, 4), severity=_severity(psi))
+            features[field] = entry
+
+        for name, entry in features.items():
+            if 'psi' in entry:
+                PSI.labels(feature=name).set(entry['psi'])
+        worst = max((e.get('psi', 0.0) for e in features.values()), default=0.0)
+        return {
+            'rows': rows,
+            'min_rows': MIN_ROWS,
+            'status': _severity(worst) if enough else 'insufficient_data',
+            'window_seconds': self.window_seconds,
+            'current_window_age_seconds': round(window_age, 1),
+            'features': features,
+            'unknown_car_names': {
+                'count': unknown_name_total,
+                'rate': round(unknown_name_total / max(record_total, 1), 4),
+                'top': [{'name': n, 'count_lower_bound': c} for n, c in unknown_names],
+            },
+            'bin_edges': {col: self._raw_edges(col, self._edges[k]) for k, col in enumerate(self.numeric)},
+        }
+
+
+def open_drift_monitor(store, feature_names: List[str], scaler: Optional[Mapping[str, Any]] = None,
+                       name_le_map: Optional[Mapping[str, int]] = None) -> Optional[DriftMonitor]:
+    """مراقب الانحراف من مخزن الميزات، أو None إذا كان معطلاً/بدون خط أساس"""
+    if not ENABLED or store is None:
+        return None
+    if [f.replace(' ', '_') for f in store.features] != [f.replace(' ', '_') for f in feature_names]:
+        logger.warning("⚠️ ميزات مخزن الميزات لا تطابق النموذج - مراقبة الانحراف معطلة")
+        return None
+    try:
+        monitor = DriftMonitor(np.asarray(store.X), feature_names, scaler, name_le_map)
+    except Exception as e:
+        logger.warning(f"⚠️ تعذر بناء خط أساس الانحراف: {e}")
+        return None
+    logger.info(f"✅ مراقبة الانحراف: {len(monitor.numeric)} ميزة رقمية، {len(monitor.groups)} مجموعة فئوية")
+    return monitor
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+ترميز المدخلات الخام إلى مصفوفة الميزات - Vectorized Serving Encoder
+نفس منطق /api/predict-manual لكن على أعمدة كاملة دفعة واحدة:
+
+    car_name  -> name_le      (name_le_mapping.json، المجهول = 0)
+    year      -> car_age      (REFERENCE_YEAR - year) ثم التطبيع
+    km/engine/power/mileage/seats -> تطبيع (x - mean) / scale
+    fuel/seller/transmission/owner -> One-hot (القيم المجهولة = كل الأعمدة 0)
+
+كل حقل في encode_columns() إما قيمة مفردة (تُبث على كل الصفوف) أو مصفوفة
+بطول n، فتبني شبكة what-if أو دفعة من عدة آلاف صف بدون حلقة Python لكل صف.
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+REFERENCE_YEAR = 2025
+
+# حقل الإدخال -> عمود الميزة الرقمي
+NUMERIC_FIELDS = {
+    'km': 'km_driven',
+    'engine': 'engine',
+    'power': 'max_power',
+    'mileage': 'mileage',
+    'seats': 'seats',
+}
+# حقل الإدخال -> بادئة أعمدة One-hot
+CATEGORICAL_FIELDS = {
+    'fuel': 'fuel_',
+    'seller': 'seller_',
+    'transmission': 'trans_',
+    'owner': 'owner_',
+}
+REQUIRED_FIELDS = ['car_name', 'year', 'km', 'engine', 'power', 'mileage', 'seats',
+                   'fuel', 'transmission', 'seller', 'owner']
+
+# أعمدة إعلانات cardekho.csv الخام -> حقول الإدخال
+LISTING_COLUMNS = {
+    'name': 'car_name',
+    'year': 'year',
+    'km_driven': 'km',
+    'engine': 'engine',
+    'max_power': 'power',
+    'mileage(km/ltr/kg)': 'mileage',
+    'seats': 'seats',
+    'fuel': 'fuel',
+    'seller_type': 'seller',
+    'transmission': 'transmission',
+    'owner': 'owner',
+}
+# تسميات المالك في البيانات الخام -> مستويات owner_*
+OWNER_LEVELS = {
+    'Test Drive Car': '0',
+    'First Owner': '1',
+    'Second Owner': '2',
+    'Third Owner': '3',
+    'Fourth & Above Owner': '4+',
+}
+
+
+class ManualEncoder:
+    """مرمّز متجه لإدخال السيارات اليدوي بترتيب lgbm_features.txt"""
+
+    def __init__(self, feature_names: List[str], scaler_params: Optional[Dict] = None,
+                 name_le_map: Optional[Dict[str, int]] = None):
+        self.feature_names = list(feature_names)
+        self.index = {c: i for i, c in enumerate(self.feature_names)}
+        self.name_le_map = name_le_map or {}
+        scaler_params = scaler_params or {}
+        means = scaler_params.get('means', {})
+        scales = scaler_params.get('scales', {})
+        self.scaling = {
+            c: (means[c], scales[c]) for c in ['km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age']
+            if c in means and c in scales and scales.get(c, 0) not in (0, None)
+        }
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def _put(self, X: np.ndarray, col: str, values: np.ndarray):
+        i = self.index.get(col)
+        if i is None:
+            return
+        if col in self.scaling:
+            mean, scale = self.scaling[col]
+            values = (values - mean) / scale
+        X[:, i] = values
+
+    def encode_columns(self, columns: Mapping[str, Any], n: int) -> np.ndarray:
+        """
+        ترميز n صفاً من أعمدة (قيمة مفردة أو مصفوفة بطول n لكل حقل)
+
+        Returns:
+            مصفوفة float64 بشكل (n, n_features)
+        """
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+
+        for field, col in NUMERIC_FIELDS.items():
+            values = np.broadcast_to(np.asarray(columns.get(field, 0), dtype=np.float64), (n,))
+            self._put(X, col, values)
+
+        years = np.trunc(np.asarray(columns.get('year', REFERENCE_YEAR), dtype=np.float64))
+        self._put(X, 'car_age', np.broadcast_to(REFERENCE_YEAR - years, (n,)))
+
+        if 'name_le' in self.index:
+            names = np.asarray(columns.get('car_name', ''), dtype=object)
+            if names.ndim == 0:
+                codes = float(self.name_le_map.get(names.item(), 0))
+            else:
+                lookup = {u: float(self.name_le_map.get(u, 0)) for u in set(names.tolist())}
+                codes = np.fromiter((lookup[v] for v in names.tolist()), dtype=np.float64, count=len(names))
+            X[:, self.index['name_le']] = codes
+
+        for field, prefix in CATEGORICAL_FIELDS.items():
+            values = np.asarray(columns.get(field, ''), dtype=object)
+            if values.ndim == 0:
+                i = self.index.get(f'{prefix}{values.item()}')
+                if i is not None:
+                    X[:, i] = 1.0
+                continue
+            strings = values.astype(str)
+            for level in np.unique(strings):
+                i = self.index.get(f'{prefix}{level}')
+                if i is not None:
+                    X[strings == level, i] = 1.0
+        return X
+
+    def encode_records(self, records: Iterable[Mapping[str, Any]]) -> np.ndarray:
+        """ترميز قائمة قواميس بنفس صيغة /api/predict-manual"""
+        records = list(records)
+        fields = list(NUMERIC_FIELDS) + list(CATEGORICAL_FIELDS) + ['year', 'car_name']
+        columns = {f: [r.get(f, '' if f in CATEGORICAL_FIELDS or f == 'car_name' else 0) for r in records]
+                   for f in fields}
+        return self.encode_columns(columns, len(records))
+
+    def encode_one(self, record: Mapping[str, Any]) -> np.ndarray:
+        return self.encode_records([record])
+
+
+def listing_columns(frame, fill: Optional[Mapping[str, float]] = None) -> Dict[str, np.ndarray]:
+    """
+    أعمدة DataFrame بمخطط cardekho.csv -> حقول encode_columns()
+
+    القيم الرقمية تُنظف من الوحدات ("74 bhp") والمفقودة تُملأ من fill
+    (وسيط بيانات التدريب بالوحدات الخام)، كما في تنظيف cleaned_cars.csv.
+    """
+    fill = fill or {}
+    columns = {}
+    for source, field in LISTING_COLUMNS.items():
+        if source not in frame:
+            continue
+        values = frame[source]
+        if field in NUMERIC_FIELDS or field == 'year':
+            if values.dtype.kind not in 'iuf':
+                values = values.astype(str).str.extract(r'([-+]?\d*\.?\d+)', expand=False).astype(float)
+            values = np.asarray(values, dtype=np.float64)
+            missing = np.isnan(values)
+            if missing.any():
+                values = np.where(missing, fill.get(field, 0.0), values)
+            columns[field] = values
+        elif field == 'owner':
+            strings = values.astype(str).str.strip()
+            columns[field] = strings.map(OWNER_LEVELS).fillna(strings).to_numpy(dtype=object)
+        else:
+            columns[field] = values.astype(str).str.strip().to_numpy(dtype=object)
+    return columns
+
+
+def inverse_target(raw: np.ndarray, meta: Mapping[str, Any]) -> np.ndarray:
+    """عكس تحويل الهدف (log1p -> expm1) مع قص القيم السالبة"""
+    raw = np.asarray(raw, dtype=np.float64)
+    if meta.get('target_transform') == 'log1p' and meta.get('inverse_transform') == 'expm1':
+        raw = np.expm1(raw)
+    return np.maximum(raw, 0.0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+تفسير التنبؤات - Batched TreeSHAP Explanations
+يستخدم pred_contrib المدمج في LightGBM: استدعاء واحد للـ Booster على الدفعة
+كاملة يعطي مساهمة كل ميزة + القيمة الأساسية، ومجموعها هو التنبؤ الخام نفسه،
+لذلك لا حاجة لتنبؤ منفصل.
+
+- أعمدة One-hot تُجمع في مجموعاتها (fuel, seller, transmission, owner)
+  والميزات الرقمية تُسمى بأسماء حقول الإدخال (km, power, year, car_name ...)
+  عبر ضرب مصفوفة واحد (n, F) @ (F, G).
+- المساهمات محسوبة في فضاء log1p؛ تحويلها إلى وحدات السعر يتم بتوزيع الفرق
+  (السعر - السعر الأساسي) بنسبة المساهمات، فيبقى المجموع مساوياً للسعر تماماً.
+- النتائج محفوظة في LRU مفتاحه بايتات الصف المشفر.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+import concurrency
+import metrics
+from encoding import CATEGORICAL_FIELDS, NUMERIC_FIELDS, inverse_target
+
+CACHE_SIZE = 4096
+
+# عمود الميزة -> حقل الإدخال
+_FEATURE_FIELDS = {col: field for field, col in NUMERIC_FIELDS.items()}
+_FEATURE_FIELDS.update({'name_le': 'car_name', 'car_age': 'year'})
+
+
+def feature_group(feature: str) -> str:
+    """اسم المجموعة (حقل الإدخال) الذي تنتمي إليه الميزة"""
+    for field, prefix in CATEGORICAL_FIELDS.items():
+        if feature.startswith(prefix):
+            return field
+    return _FEATURE_FIELDS.get(feature, feature)
+
+
+class Explainer:
+    """مفسر دفعي مع ذاكرة LRU مشتركة بين الخيوط"""
+
+    def __init__(self, model, feature_names: List[str], meta: Mapping[str, Any], cache_size: int = CACHE_SIZE):
+        self.booster = getattr(model, 'booster_', model)
+        self.num_iteration = getattr(model, 'best_iteration_', None) or meta.get('best_iteration')
+        self.meta = meta
+        self.groups: List[str] = []
+        for f in feature_names:
+            g = feature_group(f)
+            if g not in self.groups:
+                self.groups.append(g)
+        self.fold = np.zeros((len(feature_names), len(self.groups)), dtype=np.float64)
+        for i, f in enumerate(feature_names):
+            self.fold[i, self.groups.index(feature_group(f))] = 1.0
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[bytes, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _compute(self, X: np.ndarray) -> List[Dict[str, Any]]:
+        kwargs = {'pred_contrib': True, 'num_threads': concurrency.predict_threads(len(X))}
+        if self.num_iteration:
+            kwargs['num_iteration'] = self.num_iteration
+        contrib = np.asarray(self.booster.predict(X, **kwargs), dtype=np.float64)
+        bias = contrib[:, -1]
+        folded = contrib[:, :-1] @ self.fold           # (n, G) في فضاء log1p
+        raw = bias + folded.sum(axis=1)
+
+        price = inverse_target(raw, self.meta)
+        base_price = inverse_target(bias, self.meta)
+        total_log = raw - bias
+        # نسبة التحويل log -> سعر؛ عند مجموع ~0 نستخدم المشتقة المحلية
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(np.abs(total_log) > 1e-12, (price - base_price) / total_log, np.exp(raw))
+        in_price = folded * ratio[:, None]
+
+        results = []
+        for i in range(len(X)):
+            order = np.argsort(-np.abs(in_price[i]))
+            results.append({
+                'predicted_price': float(price[i]),
+                'base_price': float(base_price[i]),
+                'contributions': [
+                    {'feature': self.groups[j], 'contribution': float(in_price[i, j]),
+                     'contribution_log': float(folded[i, j])}
+                    for j in order
+                ],
+            })
+        return results
+
+    def explain(self, X: np.ndarray) -> List[Dict[str, Any]]:
+        """تفسير دفعة صفوف مشفرة؛ الصفوف غير المحفوظة تُحسب في استدعاء واحد"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        keys = [row.tobytes() for row in X]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(X)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                hit = self._cache.get(key)
+                if hit is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = hit
+                else:
+                    missing.append(i)
+        for i in range(len(X)):
+            metrics.record_cache('explain', results[i] is not None)
+
+        if missing:
+            # صفوف مكررة داخل الدفعة تُحسب مرة واحدة
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            rows = {k: n for n, k in enumerate(unique)}
+            first = {}
+            for i in missing:
+                first.setdefault(keys[i], i)
+            computed = self._compute(X[[first[k] for k in unique]])
+            with self._lock:
+                for key, res in zip(unique, computed):
+                    self._cache[key] = res
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for i in missing:
+                results[i] = computed[rows[keys[i]]]
+        return results
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'size': len(self._cache), 'capacity': self.cache_size}
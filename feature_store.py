@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+مخزن الميزات المشفرة - Encoded Feature Store
+يكتب مصفوفة الميزات والهدف وبيانات الصفوف مرة واحدة كملفات .npy
+تُفتح بعد ذلك عبر memmap (بدون نسخ) في التدريب والتقييم والرسوم والخادم
+
+التخطيط على القرص:
+    dataset/feature_store/
+        CURRENT                 -> اسم النسخة الحالية
+        <version>/manifest.json
+        <version>/X.npy         float32 (n_rows, n_features) بترتيب lgbm_features.txt
+        <version>/X64.npy       float64 للأعمدة غير الصحيحة فقط (قيم CSV كما هي للعرض)
+        <version>/y.npy         float64 (n_rows,) السعر الأصلي
+        <version>/meta.npy      بيانات الصفوف (رموز الفئات + عمر السيارة بالسنوات)
+
+الاستخدام:
+    python feature_store.py            # بناء المخزن (يتخطى البناء إن كان محدثاً)
+    python feature_store.py --force    # إعادة البناء
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ===== PATHS =====
+BASE_DIR = Path(__file__).parent
+DATA_PATH = BASE_DIR / 'dataset' / 'cleaned_cars.csv'
+STORE_DIR = BASE_DIR / 'dataset' / 'feature_store'
+FEATURES_PATH = BASE_DIR / 'lgbm_features.txt'
+SCALER_JSON = BASE_DIR / 'scaler_params.json'
+
+FORMAT_VERSION = 2
+TARGET = 'selling_price'
+DEFAULT_CHUNKSIZE = 100_000
+
+# مجموعات One-hot: اسم المجموعة -> بادئة العمود
+CATEGORY_GROUPS = {
+    'fuel': 'fuel_',
+    'seller': 'seller_',
+    'trans': 'trans_',
+    'owner': 'owner_',
+}
+
+META_DTYPE = np.dtype([
+    ('fuel', np.int8),
+    ('seller', np.int8),
+    ('trans', np.int8),
+    ('owner', np.int8),
+    ('car_age', np.float32),
+])
+
+
+def load_feature_names(path: Path = FEATURES_PATH) -> List[str]:
+    """قراءة ترتيب الميزات الذي يتوقعه النموذج"""
+    feats = path.read_text(encoding='utf-8').splitlines()
+    return [f for f in feats if f]
+
+
+def count_rows(csv_path: Path, block_size: int = 1 << 24) -> int:
+    """عدّ صفوف البيانات بمرور واحد على البايتات دون تحليل CSV"""
+    n_lines = 0
+    last = b'\n'
+    with open(csv_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        n_lines += 1
+    return max(n_lines - 1, 0)
+
+
+def _file_digest(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_stamp(path: Path) -> Dict[str, int]:
+    st = path.stat()
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def compute_version(csv_path: Path, features: List[str]) -> str:
+    """نسخة المخزن = بصمة ملف البيانات + ترتيب الميزات + صيغة التخزين"""
+    h = hashlib.sha256()
+    h.update(_file_digest(csv_path).encode())
+    h.update('\n'.join(features).encode('utf-8'))
+    h.update(str(FORMAT_VERSION).encode())
+    return h.hexdigest()[:16]
+
+
+def _group_levels(features: List[str]) -> Dict[str, List[str]]:
+    return {
+        group: [f[len(prefix):] for f in features if f.startswith(prefix)]
+        for group, prefix in CATEGORY_GROUPS.items()
+    }
+
+
+def _encode_meta(X: np.ndarray, features: List[str], scaler: Dict[str, Any]) -> np.ndarray:
+    """استخراج رموز الفئات (argmax على أعمدة One-hot) وعمر السيارة الحقيقي"""
+    meta = np.empty(len(X), dtype=META_DTYPE)
+    for group, prefix in CATEGORY_GROUPS.items():
+        cols = [i for i, f in enumerate(features) if f.startswith(prefix)]
+        if cols:
+            block = X[:, cols]
+            codes = block.argmax(axis=1).astype(np.int8)
+            codes[block.max(axis=1) <= 0] = -1
+            meta[group] = codes
+        else:
+            meta[group] = -1
+
+    if 'car_age' in features:
+        age = X[:, features.index('car_age')].astype(np.float64)
+        mean = scaler.get('means', {}).get('car_age')
+        scale = scaler.get('scales', {}).get('car_age')
+        if mean is not None and scale:
+            age = age * scale + mean
+        meta['car_age'] = np.round(age).astype(np.float32)
+    else:
+        meta['car_age'] = np.nan
+    return meta
+
+
+def build_feature_store(csv_path: Path = DATA_PATH,
+                        store_dir: Path = STORE_DIR,
+                        chunksize: int = DEFAULT_CHUNKSIZE,
+                        force: bool = False) -> Dict[str, Any]:
+    """
+    بناء مخزن الميزات من CSV المشفر (مخطط cleaned_cars.csv) بقراءة مجزأة
+
+    Args:
+        csv_path: ملف البيانات المشفرة
+        store_dir: مجلد المخزن
+        chunksize: عدد الصفوف في كل جزء
+        force: إعادة البناء حتى لو كانت النسخة موجودة
+
+    Returns:
+        الـ manifest الخاص بالنسخة المبنية
+    """
+    csv_path = Path(csv_path)
+    store_dir = Path(store_dir)
+    features = load_feature_names()
+    version = compute_version(csv_path, features)
+    target_dir = store_dir / version
+
+    if target_dir.exists() and not force:
+        _set_current(store_dir, version)
+        logger.info(f"✅ مخزن الميزات محدث بالفعل: {version}")
+        return json.loads((target_dir / 'manifest.json').read_text(encoding='utf-8'))
+
+    scaler = json.loads(SCALER_JSON.read_text(encoding='utf-8')) if SCALER_JSON.exists() else {}
+    n_rows = count_rows(csv_path)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f'.{version}-', dir=store_dir))
+
+    try:
+        X_out = np.lib.format.open_memmap(tmp_dir / 'X.npy', mode='w+', dtype=np.float32, shape=(n_rows, len(features)))
+        y_out = np.lib.format.open_memmap(tmp_dir / 'y.npy', mode='w+', dtype=np.float64, shape=(n_rows,))
+        meta_out = np.lib.format.open_memmap(tmp_dir / 'meta.npy', mode='w+', dtype=META_DTYPE, shape=(n_rows,))
+
+        integral = np.ones(len(features), dtype=bool)
+        pos = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.reindex(columns=[TARGET] + features, fill_value=0)
+            X = chunk[features].to_numpy(dtype=np.float64)
+            integral &= np.all(X == np.round(X), axis=0)
+
+            stop = pos + len(chunk)
+            X_out[pos:stop] = X
+            y_out[pos:stop] = chunk[TARGET].to_numpy(dtype=np.float64)
+            meta_out[pos:stop] = _encode_meta(X, features, scaler)
+            pos = stop
+
+        # نسخة float64 للأعمدة غير الصحيحة: float32 يغيّر قيماً مثل 23.4 في العرض
+        exact_columns = [f for f, is_int in zip(features, integral) if not is_int]
+        X64_out = np.lib.format.open_memmap(tmp_dir / 'X64.npy', mode='w+', dtype=np.float64,
+                                            shape=(pos, len(exact_columns)))
+        start = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=exact_columns,
+                                 float_precision='round_trip'):
+            stop = start + len(chunk)
+            X64_out[start:stop] = chunk[exact_columns].to_numpy(dtype=np.float64)
+            start = stop
+
+        for arr in (X_out, y_out, meta_out, X64_out):
+            arr.flush()
+        del X_out, y_out, meta_out, X64_out
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': version,
+            'created_at': pd.Timestamp.now().isoformat(),
+            'source': {'path': csv_path.name, **_source_stamp(csv_path)},
+            'n_rows': pos,
+            'features': features,
+            'target': TARGET,
+            'integer_columns': [f for f, is_int in zip(features, integral) if is_int],
+            'category_levels': _group_levels(features),
+            'files': {
+                'X': {'file': 'X.npy', 'dtype': 'float32', 'shape': [pos, len(features)]},
+                'X64': {'file': 'X64.npy', 'dtype': 'float64', 'shape': [pos, len(exact_columns)],
+                        'columns': exact_columns},
+                'y': {'file': 'y.npy', 'dtype': 'float64', 'shape': [pos]},
+                'meta': {'file': 'meta.npy', 'dtype': [list(d) for d in META_DTYPE.descr], 'shape': [pos]},
+            },
+        }
+        (tmp_dir / 'manifest.json').write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding='utf-8')
+
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            # عامل آخر أنهى البناء نفسه أولاً - النتيجة مطابقة
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _set_current(store_dir, version)
+    logger.info(f"✅ تم بناء مخزن الميزات {version}: {pos} صف × {len(features)} ميزة")
+    return manifest
+
+
+def _set_current(store_dir: Path, version: str):
+    tmp = store_dir / f'.CURRENT.{os.getpid()}'
+    tmp.write_text(version, encoding='utf-8')
+    os.replace(tmp, store_dir / 'CURRENT')
+
+
+class FeatureStore:
+    """
+    عرض للقراءة فقط على نسخة من مخزن الميزات
+    جميع المصفوفات memmap - لا يتم تحميل البيانات إلا عند لمس الصفحات
+    """
+
+    def __init__(self, version_dir: Path):
+        self.path = Path(version_dir)
+        self.manifest = json.loads((self.path / 'manifest.json').read_text(encoding='utf-8'))
+        self.X = np.load(self.path / 'X.npy', mmap_mode='r')
+        self.y = np.load(self.path / 'y.npy', mmap_mode='r')
+        self.meta = np.load(self.path / 'meta.npy', mmap_mode='r')
+        # غير موجود في نسخ الصيغة 1 (تُعتبر قديمة ويُعاد بناؤها عند الفتح)
+        x64 = self.path / 'X64.npy'
+        self.X64 = np.load(x64, mmap_mode='r') if x64.exists() else None
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def features(self) -> List[str]:
+        return self.manifest['features']
+
+    @property
+    def n_rows(self) -> int:
+        return self.manifest['n_rows']
+
+    @property
+    def category_levels(self) -> Dict[str, List[str]]:
+        return self.manifest['category_levels']
+
+    def column(self, name: str) -> np.ndarray:
+        """عمود واحد كـ view (الهدف أو إحدى الميزات)"""
+        if name == TARGET:
+            return self.y
+        return self.X[:, self.features.index(name)]
+
+    def frame(self, with_target: bool = True, restore_dtypes: bool = False,
+              rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        DataFrame بنفس أعمدة cleaned_cars.csv مبني من المصفوفات
+
+        Args:
+            with_target: إضافة عمود selling_price في البداية
+            restore_dtypes: إرجاع أنواع CSV: الأعمدة الصحيحة (one-hot, name_le) إلى int64
+                            والباقي float64 من X64 (X بدقة float32 مخصص لمدخلات النموذج)
+            rows: أرقام صفوف مرتبة لجزء من الجدول (الفهرس = أرقام الصفوف الأصلية)؛
+                  أنواع الأعمدة تُحدد من الجدول الكامل فتتطابق بين الأجزاء
+        """
+        X = self.X if rows is None else self.X[rows]
+        df = pd.DataFrame(X, columns=self.features, index=rows, copy=False)
+        if restore_dtypes:
+            ints = self.manifest.get('integer_columns', [])
+            df = df.astype({c: 'int64' for c in ints})
+            if self.X64 is not None:
+                exact = self.X64 if rows is None else self.X64[rows]
+                for i, name in enumerate(self.manifest['files']['X64']['columns']):
+                    df[name] = exact[:, i]
+        if with_target:
+            y = self.y if rows is None else self.y[rows]
+            if restore_dtypes and np.all(self.y == np.round(self.y)):
+                y = y.astype(np.int64)
+            df.insert(0, TARGET, y)
+        return df
+
+
+def _is_stale(store: FeatureStore, csv_path: Path) -> bool:
+    """
+    مقارنة المخزن بملف المصدر: الصيغة والميزات والحجم ووقت التعديل
+    تغيّر وقت التعديل وحده يُحسم ببصمة المحتوى (نسخ الملف أو touch لا يعيد البناء)
+    """
+    features = load_feature_names()
+    if store.manifest.get('format_version') != FORMAT_VERSION or store.features != features:
+        return True
+    source = store.manifest.get('source', {})
+    stamp = _source_stamp(csv_path)
+    if source.get('size') != stamp['size']:
+        return True
+    if source.get('mtime_ns') != stamp['mtime_ns']:
+        return compute_version(csv_path, features) != store.version
+    return False
+
+
+def open_feature_store(store_dir: Path = STORE_DIR,
+                       csv_path: Path = DATA_PATH,
+                       build_if_missing: bool = False) -> Optional[FeatureStore]:
+    """
+    فتح النسخة الحالية من مخزن الميزات
+
+    Args:
+        store_dir: مجلد المخزن
+        csv_path: ملف المصدر للتحقق من أن المخزن غير قديم
+        build_if_missing: بناء المخزن إذا كان غير موجود أو قديماً
+
+    Returns:
+        FeatureStore أو None إذا لم يكن متاحاً
+    """
+    store_dir = Path(store_dir)
+    csv_path = Path(csv_path)
+    try:
+        current = store_dir / 'CURRENT'
+        if current.exists():
+            store = FeatureStore(store_dir / current.read_text(encoding='utf-8').strip())
+            stale = csv_path.exists() and _is_stale(store, csv_path)
+            if not stale:
+                return store
+            logger.info("⚠️ مخزن الميزات قديم مقارنة بملف البيانات")
+        if build_if_missing and csv_path.exists():
+            build_feature_store(csv_path, store_dir)
+            return FeatureStore(store_dir / (store_dir / 'CURRENT').read_text(encoding='utf-8').strip())
+    except Exception as e:
+        logger.error(f"❌ خطأ في فتح مخزن الميزات: {e}")
+    return None
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Build the encoded feature store')
+    parser.add_argument('--data', type=Path, default=DATA_PATH)
+    parser.add_argument('--store-dir', type=Path, default=STORE_DIR)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+    m = build_feature_store(args.data, args.store_dir, args.chunksize, args.force)
+    print(f"version={m['version']} rows={m['n_rows']} features={len(m['features'])}")
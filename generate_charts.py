@@ -1,22 +1,61 @@
 # -*- coding: utf-8 -*-
 """
 سكربت إنشاء المخططات البيانية لتحليل بيانات السيارات
+
+المخططات مبنية كرسم مهام (Task Graph):
+
+    تحميل البيانات -> الأعمدة الفئوية المشتقة (Fuel_Type, ...) -> مهمة لكل مخطط
+
+- كل مهمة تعلن الأعمدة التي تقرأها ومعاملاتها؛ بصمتها = hash(محتوى الأعمدة
+  + المعاملات + كود دالة الرسم). إذا لم تتغير البصمة والملف موجود يتم تخطيها،
+  فتحديث صغير في البيانات يعيد رسم المخططات المتأثرة فقط.
+- المهام المتبقية مستقلة وتُرسم على Process Pool (--jobs).
+- مخططات Scatter تتحول إلى hexbin فوق SCATTER_MAX_ROWS صفاً،
+  و Pairplot و 3D Scatter تعمل على عينة ثابتة.
+
+دوال الرسم (plot_*) قابلة للاستيراد دون آثار جانبية وترجع الشكل دون حفظه.
+
+الاستخدام:
+    python generate_charts.py                 # المخططات المتغيرة فقط
+    python generate_charts.py --force         # إعادة رسم الكل
+    python generate_charts.py --jobs 4 --only 'hist_*'
 """
 
-import pandas as pd
-import numpy as np
+import argparse
+import fnmatch
+import hashlib
+import inspect
+import io
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import seaborn as sns
+import pandas as pd
 import plotly.express as px
 import plotly.io as pio
-import os
-import warnings
+import seaborn as sns
 
 warnings.filterwarnings('ignore')
 
 # إعداد مسار الحفظ
 IMG_DIR = os.path.join(os.path.dirname(__file__), 'img')
-os.makedirs(IMG_DIR, exist_ok=True)
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'dataset', 'cleaned_cars.csv')
+MANIFEST_NAME = '.chart_hashes.json'
+
+# يُرفع عند تغيير الستايل أو الإعدادات المشتركة لإبطال كل البصمات
+RENDER_VERSION = 1
+
+# حدود الصفوف لمخططات النقاط
+SCATTER_MAX_ROWS = 10000
+PAIRPLOT_MAX_ROWS = 500
+SCATTER_3D_MAX_ROWS = 2000
+SAMPLE_SEED = 42
 
 # إعداد الستايل
 plt.style.use('seaborn-v0_8-whitegrid')
@@ -25,284 +64,381 @@ plt.rcParams['font.size'] = 12
 plt.rcParams['axes.titlesize'] = 14
 plt.rcParams['axes.labelsize'] = 12
 
-# تحميل البيانات
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'dataset', 'cleaned_cars.csv')
-df = pd.read_csv(DATA_PATH)
-
-print(f"تم تحميل البيانات: {df.shape[0]} صف × {df.shape[1]} عمود")
-print(f"الأعمدة: {df.columns.tolist()}")
-
-# تحديد الأعمدة الرقمية والفئوية
-num_cols = ['selling_price', 'km_driven', 'engine', 'max_power', 'seats', 'mileage', 'car_age']
-cat_cols = ['fuel_CNG', 'fuel_Diesel', 'fuel_LPG', 'fuel_Petrol', 
-            'seller_Dealer', 'seller_Individual', 'seller_Trustmark Dealer',
-            'trans_Automatic', 'trans_Manual', 
-            'owner_0', 'owner_1', 'owner_2', 'owner_3', 'owner_4+']
+TARGET = 'selling_price'
+NUM_COLS = ['selling_price', 'km_driven', 'engine', 'max_power', 'seats', 'mileage', 'car_age']
 
-# التحقق من وجود الأعمدة
-num_cols = [col for col in num_cols if col in df.columns]
-cat_cols = [col for col in cat_cols if col in df.columns]
+# العمود الفئوي المشتق -> (بادئة One-hot, عنوان, لوحة violin, لوحة bar, تدوير المحور)
+GROUPS = {
+    'Fuel_Type': ('fuel_', 'Fuel Type', 'Set2', 'viridis', True),
+    'Seller_Type': ('seller_', 'Seller Type', 'Set3', 'magma', True),
+    'Transmission': ('trans_', 'Transmission', 'Pastel1', 'plasma', False),
+    'Owner_Count': ('owner_', 'Owner Count', 'husl', 'cividis', False),
+}
 
-print(f"\nالأعمدة الرقمية: {num_cols}")
-print(f"الأعمدة الفئوية: {len(cat_cols)} عمود")
 
 # ========================================
-# 1. Histogram + KDE (للأعمدة الرقمية)
+# تحميل البيانات والأعمدة المشتقة
 # ========================================
-print("\n📊 إنشاء Histogram + KDE...")
-for col in num_cols:
-    plt.figure(figsize=(8, 4))
-    sns.histplot(df[col], kde=True, color='steelblue')
-    plt.title(f"Distribution of {col}")
-    plt.xlabel(col)
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, f'hist_{col}.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"  ✓ hist_{col}.png")
 
-# ========================================
-# 2. Boxplots (كشف الشواذ Outliers)
-# ========================================
-print("\n📦 إنشاء Boxplots...")
-for col in num_cols:
-    plt.figure(figsize=(7, 4))
-    sns.boxplot(x=df[col], color='coral')
-    plt.title(f"Boxplot of {col}")
-    plt.xlabel(col)
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, f'boxplot_{col}.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print(f"  ✓ boxplot_{col}.png")
+def load_frame() -> pd.DataFrame:
+    """تحميل البيانات (من مخزن الميزات إن وجد، وإلا من CSV)"""
+    from feature_store import open_feature_store
+    store = open_feature_store(build_if_missing=True)
+    return store.frame(restore_dtypes=True) if store is not None else pd.read_csv(DATA_PATH)
 
-# ========================================
-# 3. علاقة الأعمدة الرقمية مع السعر (Scatter)
-# ========================================
-print("\n📈 إنشاء Scatter Plots...")
-target = 'selling_price'
-for col in num_cols:
-    if col != target:
-        plt.figure(figsize=(7, 4))
-        sns.scatterplot(x=df[col], y=df[target], alpha=0.5, color='purple')
-        plt.title(f"{col} vs {target}")
-        plt.xlabel(col)
-        plt.ylabel(target)
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMG_DIR, f'scatter_{col}_vs_price.png'), dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  ✓ scatter_{col}_vs_price.png")
 
-# ========================================
-# 4. Correlation Matrix (Heatmap)
-# ========================================
-print("\n🔥 إنشاء Correlation Heatmap...")
-plt.figure(figsize=(12, 8))
-corr_matrix = df[num_cols].corr()
-sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", center=0, 
-            fmt='.2f', square=True, linewidths=0.5)
-plt.title("Correlation Heatmap")
-plt.tight_layout()
-plt.savefig(os.path.join(IMG_DIR, 'correlation_heatmap.png'), dpi=150, bbox_inches='tight')
-plt.close()
-print("  ✓ correlation_heatmap.png")
+def derive_groups(df: pd.DataFrame) -> pd.DataFrame:
+    """إنشاء أعمدة فئوية مجمعة من الأعمدة المشفرة (one-hot)"""
+    for name, (prefix, *_rest) in GROUPS.items():
+        cols = [c for c in df.columns if c.startswith(prefix)]
+        if cols:
+            df[name] = df[cols].idxmax(axis=1).str.replace(prefix, '')
+    return df
 
-# ========================================
-# 5. Correlation (Plotly Interactive)
-# ========================================
-print("\n📊 إنشاء Interactive Correlation Matrix...")
-fig = px.imshow(corr_matrix, 
-                text_auto='.2f', 
-                aspect="auto", 
-                title="Interactive Correlation Matrix",
-                color_continuous_scale='RdBu_r')
-pio.write_html(fig, os.path.join(IMG_DIR, 'correlation_interactive.html'))
-print("  ✓ correlation_interactive.html")
 
 # ========================================
-# 6. Pairplot (عينة صغيرة لتسريع العملية)
+# دوال الرسم - كل دالة ترجع الشكل دون حفظه
 # ========================================
-print("\n🔗 إنشاء Pairplot (عينة من البيانات)...")
-sample_df = df[num_cols].sample(min(500, len(df)), random_state=42)
-pairplot_fig = sns.pairplot(sample_df, diag_kind='kde', plot_kws={'alpha': 0.5})
-pairplot_fig.savefig(os.path.join(IMG_DIR, 'pairplot.png'), dpi=100, bbox_inches='tight')
-plt.close()
-print("  ✓ pairplot.png")
 
-# ========================================
-# 7. Violin Plot (توزيع السعر حسب الفئات)
-# ========================================
-print("\n🎻 إنشاء Violin Plots...")
-
-# إنشاء أعمدة فئوية مجمعة من الأعمدة المشفرة (one-hot)
-# Fuel Type
-fuel_cols = [c for c in df.columns if c.startswith('fuel_')]
-if fuel_cols:
-    df['Fuel_Type'] = df[fuel_cols].idxmax(axis=1).str.replace('fuel_', '')
-    plt.figure(figsize=(10, 5))
-    sns.violinplot(x='Fuel_Type', y=target, data=df, palette='Set2')
-    plt.title(f"Violin Plot of {target} by Fuel Type")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'violin_fuel_type.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ violin_fuel_type.png")
-
-# Seller Type
-seller_cols = [c for c in df.columns if c.startswith('seller_')]
-if seller_cols:
-    df['Seller_Type'] = df[seller_cols].idxmax(axis=1).str.replace('seller_', '')
-    plt.figure(figsize=(10, 5))
-    sns.violinplot(x='Seller_Type', y=target, data=df, palette='Set3')
-    plt.title(f"Violin Plot of {target} by Seller Type")
-    plt.xticks(rotation=45)
+def plot_hist(data: pd.DataFrame, column: str):
+    """Histogram + KDE"""
+    fig = plt.figure(figsize=(8, 4))
+    sns.histplot(data[column], kde=True, color='steelblue')
+    plt.title(f"Distribution of {column}")
+    plt.xlabel(column)
+    plt.ylabel("Frequency")
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'violin_seller_type.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ violin_seller_type.png")
-
-# Transmission
-trans_cols = [c for c in df.columns if c.startswith('trans_')]
-if trans_cols:
-    df['Transmission'] = df[trans_cols].idxmax(axis=1).str.replace('trans_', '')
-    plt.figure(figsize=(10, 5))
-    sns.violinplot(x='Transmission', y=target, data=df, palette='Pastel1')
-    plt.title(f"Violin Plot of {target} by Transmission")
+    return fig
+
+
+def plot_box(data: pd.DataFrame, column: str):
+    """Boxplot (كشف الشواذ Outliers)"""
+    fig = plt.figure(figsize=(7, 4))
+    sns.boxplot(x=data[column], color='coral')
+    plt.title(f"Boxplot of {column}")
+    plt.xlabel(column)
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'violin_transmission.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ violin_transmission.png")
-
-# Owner Count
-owner_cols = [c for c in df.columns if c.startswith('owner_')]
-if owner_cols:
-    df['Owner_Count'] = df[owner_cols].idxmax(axis=1).str.replace('owner_', '')
-    plt.figure(figsize=(10, 5))
-    sns.violinplot(x='Owner_Count', y=target, data=df, palette='husl')
-    plt.title(f"Violin Plot of {target} by Owner Count")
+    return fig
+
+
+def plot_scatter(data: pd.DataFrame, column: str, target: str = TARGET,
+                 max_rows: int = SCATTER_MAX_ROWS):
+    """علاقة عمود رقمي مع السعر؛ hexbin بدلاً من النقاط للبيانات الكبيرة"""
+    fig = plt.figure(figsize=(7, 4))
+    if len(data) > max_rows:
+        plt.hexbin(data[column], data[target], gridsize=60, cmap='Purples', mincnt=1, bins='log')
+        plt.colorbar(label='count (log)')
+    else:
+        sns.scatterplot(x=data[column], y=data[target], alpha=0.5, color='purple')
+    plt.title(f"{column} vs {target}")
+    plt.xlabel(column)
+    plt.ylabel(target)
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'violin_owner_count.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ violin_owner_count.png")
+    return fig
 
-# ========================================
-# 8. Bar Plots (متوسط السعر حسب الفئات)
-# ========================================
-print("\n📊 إنشاء Bar Plots...")
-
-# Fuel Type
-if 'Fuel_Type' in df.columns:
-    plt.figure(figsize=(10, 4))
-    order = df.groupby('Fuel_Type')[target].mean().sort_values(ascending=False).index
-    sns.barplot(x='Fuel_Type', y=target, data=df, order=order, palette='viridis', errorbar=None)
-    plt.title(f"Average {target} by Fuel Type")
-    plt.xticks(rotation=40)
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'barplot_fuel_type.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ barplot_fuel_type.png")
-
-# Seller Type
-if 'Seller_Type' in df.columns:
-    plt.figure(figsize=(10, 4))
-    order = df.groupby('Seller_Type')[target].mean().sort_values(ascending=False).index
-    sns.barplot(x='Seller_Type', y=target, data=df, order=order, palette='magma', errorbar=None)
-    plt.title(f"Average {target} by Seller Type")
-    plt.xticks(rotation=40)
+
+def plot_corr_heatmap(data: pd.DataFrame, columns: List[str]):
+    """Correlation Matrix (Heatmap)"""
+    fig = plt.figure(figsize=(12, 8))
+    sns.heatmap(data[columns].corr(), annot=True, cmap="coolwarm", center=0,
+                fmt='.2f', square=True, linewidths=0.5)
+    plt.title("Correlation Heatmap")
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'barplot_seller_type.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ barplot_seller_type.png")
-
-# Transmission
-if 'Transmission' in df.columns:
-    plt.figure(figsize=(10, 4))
-    order = df.groupby('Transmission')[target].mean().sort_values(ascending=False).index
-    sns.barplot(x='Transmission', y=target, data=df, order=order, palette='plasma', errorbar=None)
-    plt.title(f"Average {target} by Transmission")
+    return fig
+
+
+def plot_corr_interactive(data: pd.DataFrame, columns: List[str]):
+    """Correlation (Plotly Interactive)"""
+    return px.imshow(data[columns].corr(),
+                     text_auto='.2f',
+                     aspect="auto",
+                     title="Interactive Correlation Matrix",
+                     color_continuous_scale='RdBu_r')
+
+
+def plot_pairplot(data: pd.DataFrame, columns: List[str], max_rows: int = PAIRPLOT_MAX_ROWS):
+    """Pairplot على عينة ثابتة لتسريع العملية"""
+    sample = data[columns].sample(min(max_rows, len(data)), random_state=SAMPLE_SEED)
+    return sns.pairplot(sample, diag_kind='kde', plot_kws={'alpha': 0.5})
+
+
+def plot_violin(data: pd.DataFrame, group: str, target: str = TARGET):
+    """Violin Plot (توزيع السعر حسب الفئة)"""
+    _prefix, title, palette, _bar, rotate = GROUPS[group]
+    fig = plt.figure(figsize=(10, 5))
+    sns.violinplot(x=group, y=target, data=data, palette=palette)
+    plt.title(f"Violin Plot of {target} by {title}")
+    if rotate:
+        plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'barplot_transmission.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ barplot_transmission.png")
-
-# Owner Count
-if 'Owner_Count' in df.columns:
-    plt.figure(figsize=(10, 4))
-    order = df.groupby('Owner_Count')[target].mean().sort_values(ascending=False).index
-    sns.barplot(x='Owner_Count', y=target, data=df, order=order, palette='cividis', errorbar=None)
-    plt.title(f"Average {target} by Owner Count")
+    return fig
+
+
+def plot_bar(data: pd.DataFrame, group: str, target: str = TARGET):
+    """Bar Plot (متوسط السعر حسب الفئة)"""
+    _prefix, title, _violin, palette, rotate = GROUPS[group]
+    fig = plt.figure(figsize=(10, 4))
+    order = data.groupby(group)[target].mean().sort_values(ascending=False).index
+    sns.barplot(x=group, y=target, data=data, order=order, palette=palette, errorbar=None)
+    plt.title(f"Average {target} by {title}")
+    if rotate:
+        plt.xticks(rotation=40)
     plt.tight_layout()
-    plt.savefig(os.path.join(IMG_DIR, 'barplot_owner_count.png'), dpi=150, bbox_inches='tight')
-    plt.close()
-    print("  ✓ barplot_owner_count.png")
+    return fig
 
-# ========================================
-# 9. Count Plots (للأعمدة الفئوية)
-# ========================================
-print("\n📊 إنشاء Count Plots...")
 
-for cat in ['Fuel_Type', 'Seller_Type', 'Transmission', 'Owner_Count']:
-    if cat in df.columns:
-        plt.figure(figsize=(10, 4))
-        order = df[cat].value_counts().index
-        sns.countplot(x=df[cat], order=order, palette='Set2')
-        plt.xticks(rotation=45)
-        plt.title(f"Count Plot of {cat}")
-        plt.tight_layout()
-        plt.savefig(os.path.join(IMG_DIR, f'countplot_{cat.lower()}.png'), dpi=150, bbox_inches='tight')
-        plt.close()
-        print(f"  ✓ countplot_{cat.lower()}.png")
+def plot_count(data: pd.DataFrame, group: str):
+    """Count Plot للعمود الفئوي"""
+    fig = plt.figure(figsize=(10, 4))
+    order = data[group].value_counts().index
+    sns.countplot(x=data[group], order=order, palette='Set2')
+    plt.xticks(rotation=45)
+    plt.title(f"Count Plot of {group}")
+    plt.tight_layout()
+    return fig
 
-# ========================================
-# 10. 3D Scatter (Engine, Mileage, Price)
-# ========================================
-print("\n🌐 إنشاء 3D Scatter Plot...")
-if all(col in df.columns for col in ['engine', 'mileage', target]):
-    sample_3d = df.sample(min(2000, len(df)), random_state=42)
-    color_col = 'Fuel_Type' if 'Fuel_Type' in sample_3d.columns else None
-    
-    fig = px.scatter_3d(
-        sample_3d, 
-        x="engine", 
-        y="mileage", 
+
+def plot_3d_scatter(data: pd.DataFrame, target: str = TARGET, max_rows: int = SCATTER_3D_MAX_ROWS):
+    """3D Scatter (Engine, Mileage, Price) على عينة ثابتة"""
+    sample = data.sample(min(max_rows, len(data)), random_state=SAMPLE_SEED)
+    return px.scatter_3d(
+        sample,
+        x="engine",
+        y="mileage",
         z=target,
-        color=color_col,
+        color='Fuel_Type' if 'Fuel_Type' in sample.columns else None,
         title="3D View: Engine vs Mileage vs Selling Price",
         opacity=0.7
     )
-    pio.write_html(fig, os.path.join(IMG_DIR, '3d_scatter.html'))
-    print("  ✓ 3d_scatter.html")
 
-# ========================================
-# 11. Distribution Summary (All Numeric)
-# ========================================
-print("\n📈 إنشاء Distribution Summary...")
-fig, axes = plt.subplots(2, 4, figsize=(16, 8))
-axes = axes.flatten()
 
-for i, col in enumerate(num_cols[:8]):
-    sns.histplot(df[col], kde=True, ax=axes[i], color='teal')
-    axes[i].set_title(f'{col}')
-    axes[i].set_xlabel('')
-
-# إخفاء المحاور الفارغة
-for j in range(len(num_cols), 8):
-    axes[j].axis('off')
+def plot_distributions(data: pd.DataFrame, columns: List[str]):
+    """Distribution Summary (All Numeric)"""
+    fig, axes = plt.subplots(2, 4, figsize=(16, 8))
+    axes = axes.flatten()
+    for i, col in enumerate(columns[:8]):
+        sns.histplot(data[col], kde=True, ax=axes[i], color='teal')
+        axes[i].set_title(f'{col}')
+        axes[i].set_xlabel('')
+    # إخفاء المحاور الفارغة
+    for j in range(len(columns), 8):
+        axes[j].axis('off')
+    plt.suptitle('Distributions of Numerical Features', fontsize=16, y=1.02)
+    plt.tight_layout()
+    return fig
+
+
+class ChartKind(NamedTuple):
+    func: Callable
+    ext: str
+    dpi: int = 150
+
+
+# نوع المخطط -> دالة الرسم وصيغة الملف
+CHARTS: Dict[str, ChartKind] = {
+    'hist': ChartKind(plot_hist, 'png'),
+    'box': ChartKind(plot_box, 'png'),
+    'scatter': ChartKind(plot_scatter, 'png'),
+    'corr_heatmap': ChartKind(plot_corr_heatmap, 'png'),
+    'corr_interactive': ChartKind(plot_corr_interactive, 'html'),
+    'pairplot': ChartKind(plot_pairplot, 'png', dpi=100),
+    'violin': ChartKind(plot_violin, 'png'),
+    'bar': ChartKind(plot_bar, 'png'),
+    'count': ChartKind(plot_count, 'png'),
+    '3d_scatter': ChartKind(plot_3d_scatter, 'html'),
+    'distributions': ChartKind(plot_distributions, 'png'),
+}
+
+
+def save_figure(fig, path: str, dpi: int = 150):
+    """حفظ شكل matplotlib / seaborn grid / plotly ثم تحرير الذاكرة"""
+    if hasattr(fig, 'to_html'):
+        pio.write_html(fig, path)
+        return
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(getattr(fig, 'figure', fig))
+
+
+def render_bytes(kind: str, data: pd.DataFrame, params: Dict[str, Any]) -> Tuple[bytes, str]:
+    """رسم مخطط في الذاكرة (لخادم الويب)؛ يرجع (المحتوى, نوع MIME)"""
+    chart = CHARTS[kind]
+    fig = chart.func(data, **params)
+    if hasattr(fig, 'to_html'):
+        return pio.to_html(fig, include_plotlyjs='cdn').encode('utf-8'), 'text/html; charset=utf-8'
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=chart.dpi, bbox_inches='tight')
+    plt.close(getattr(fig, 'figure', fig))
+    return buf.getvalue(), 'image/png'
 
-plt.suptitle('Distributions of Numerical Features', fontsize=16, y=1.02)
-plt.tight_layout()
-plt.savefig(os.path.join(IMG_DIR, 'distributions_summary.png'), dpi=150, bbox_inches='tight')
-plt.close()
-print("  ✓ distributions_summary.png")
 
 # ========================================
-# ملخص
+# رسم المهام
 # ========================================
-print("\n" + "="*50)
-print("✅ تم إنشاء جميع المخططات بنجاح!")
-print(f"📁 المسار: {IMG_DIR}")
-
-# عرض قائمة الملفات
-files = sorted(os.listdir(IMG_DIR))
-print(f"\n📊 عدد الملفات: {len(files)}")
-for f in files:
-    print(f"   • {f}")
+
+class ChartTask(NamedTuple):
+    output: str                  # اسم الملف داخل img/
+    kind: str                    # مفتاح في CHARTS
+    columns: Tuple[str, ...]     # الأعمدة التي تقرأها المهمة (مدخلات البصمة)
+    params: Dict[str, Any]
+
+
+def build_tasks(df: pd.DataFrame) -> List[ChartTask]:
+    """بناء قائمة المهام من الأعمدة المتاحة في البيانات"""
+    num_cols = [c for c in NUM_COLS if c in df.columns]
+    groups = [g for g in GROUPS if g in df.columns]
+    tasks = []
+    for col in num_cols:
+        tasks.append(ChartTask(f'hist_{col}.png', 'hist', (col,), {'column': col}))
+    for col in num_cols:
+        tasks.append(ChartTask(f'boxplot_{col}.png', 'box', (col,), {'column': col}))
+    if TARGET in df.columns:
+        for col in num_cols:
+            if col != TARGET:
+                tasks.append(ChartTask(f'scatter_{col}_vs_price.png', 'scatter', (col, TARGET), {'column': col}))
+    tasks.append(ChartTask('correlation_heatmap.png', 'corr_heatmap', tuple(num_cols), {'columns': num_cols}))
+    tasks.append(ChartTask('correlation_interactive.html', 'corr_interactive', tuple(num_cols), {'columns': num_cols}))
+    tasks.append(ChartTask('pairplot.png', 'pairplot', tuple(num_cols), {'columns': num_cols}))
+    for group in groups:
+        name = group.lower()
+        tasks.append(ChartTask(f'violin_{name}.png', 'violin', (group, TARGET), {'group': group}))
+        tasks.append(ChartTask(f'barplot_{name}.png', 'bar', (group, TARGET), {'group': group}))
+        tasks.append(ChartTask(f'countplot_{name}.png', 'count', (group,), {'group': group}))
+    if all(c in df.columns for c in ['engine', 'mileage', TARGET]):
+        cols = ('engine', 'mileage', TARGET) + (('Fuel_Type',) if 'Fuel_Type' in df.columns else ())
+        tasks.append(ChartTask('3d_scatter.html', '3d_scatter', cols, {}))
+    tasks.append(ChartTask('distributions_summary.png', 'distributions', tuple(num_cols), {'columns': num_cols}))
+    return tasks
+
+
+_code_hashes: Dict[str, str] = {}
+
+
+def code_hash(kind: str) -> str:
+    """بصمة كود دالة الرسم (تتغير عند تعديلها)"""
+    if kind not in _code_hashes:
+        source = inspect.getsource(CHARTS[kind].func)
+        _code_hashes[kind] = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    return _code_hashes[kind]
+
+
+def task_fingerprint(task: ChartTask, data: pd.DataFrame) -> str:
+    """بصمة المهمة: محتوى أعمدتها + المعاملات + كود الرسم"""
+    h = hashlib.sha256()
+    h.update(json.dumps([RENDER_VERSION, task.kind, task.params, list(task.columns),
+                         SCATTER_MAX_ROWS, PAIRPLOT_MAX_ROWS, SCATTER_3D_MAX_ROWS],
+                        sort_keys=True, default=str).encode('utf-8'))
+    h.update(code_hash(task.kind).encode('ascii'))
+    h.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def render_task(task: ChartTask, data: pd.DataFrame, img_dir: str) -> Tuple[str, float]:
+    """رسم مهمة واحدة وحفظها (يعمل داخل عملية العامل)"""
+    start = time.perf_counter()
+    kind = CHARTS[task.kind]
+    fig = kind.func(data, **task.params)
+    path = os.path.join(img_dir, task.output)
+    tmp = f'{path}.tmp.{kind.ext}'
+    save_figure(fig, tmp, kind.dpi)
+    os.replace(tmp, path)
+    return task.output, time.perf_counter() - start
+
+
+def _load_manifest(path: str) -> Dict[str, str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate(df: pd.DataFrame, img_dir: str = IMG_DIR, jobs: int = 1,
+             force: bool = False, only: str = None) -> Dict[str, Any]:
+    """
+    تشغيل رسم المهام: تخطي المهام غير المتغيرة ورسم الباقي بالتوازي
+
+    Returns:
+        قاموس بالمخططات المرسومة والمتخطاة والأزمنة
+    """
+    os.makedirs(img_dir, exist_ok=True)
+    manifest_path = os.path.join(img_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+
+    df = derive_groups(df)
+    tasks = build_tasks(df)
+    if only:
+        tasks = [t for t in tasks if fnmatch.fnmatch(t.output, only)]
+
+    pending, skipped = [], []
+    for task in tasks:
+        data = df[list(task.columns)]
+        digest = task_fingerprint(task, data)
+        if not force and manifest.get(task.output) == digest \
+                and os.path.exists(os.path.join(img_dir, task.output)):
+            skipped.append(task.output)
+        else:
+            pending.append((task, data, digest))
+
+    rendered, failed = {}, {}
+    digests = {task.output: digest for task, _data, digest in pending}
+
+    def _done(task_output, seconds):
+        rendered[task_output] = seconds
+        manifest[task_output] = digests[task_output]
+        print(f"  ✓ {task_output} ({seconds:.2f}s)")
+
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            futures = {pool.submit(render_task, task, data, img_dir): task for task, data, _d in pending}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    _done(*future.result())
+                except Exception as e:
+                    failed[task.output] = str(e)
+                    print(f"  ✗ {task.output}: {e}")
+    else:
+        for task, data, _d in pending:
+            try:
+                _done(*render_task(task, data, img_dir))
+            except Exception as e:
+                failed[task.output] = str(e)
+                print(f"  ✗ {task.output}: {e}")
+
+    # المخططات الفاشلة لا تبقى في السجل حتى يعاد رسمها في التشغيل التالي
+    for name in failed:
+        manifest.pop(name, None)
+    tmp = f'{manifest_path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    return {'rendered': rendered, 'skipped': skipped, 'failed': failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='إنشاء المخططات البيانية')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='عدد عمليات الرسم المتوازية')
+    parser.add_argument('--force', action='store_true', help='إعادة رسم كل المخططات')
+    parser.add_argument('--only', default=None, help="نمط أسماء الملفات (مثل 'hist_*')")
+    parser.add_argument('--img-dir', default=IMG_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = load_frame()
+    print(f"تم تحميل البيانات: {df.shape[0]} صف × {df.shape[1]} عمود")
+
+    print(f"\n📊 رسم المخططات (jobs={args.jobs})...")
+    result = generate(df, img_dir=args.img_dir, jobs=args.jobs, force=args.force, only=args.only)
+    elapsed = time.perf_counter() - start
+
+    print("\n" + "=" * 50)
+    print(f"✅ مرسوم: {len(result['rendered'])} | ⏭️ بدون تغيير: {len(result['skipped'])} "
+          f"| ❌ فشل: {len(result['failed'])}")
+    print(f"⏱️ الزمن الكلي: {elapsed:.1f}s")
+    print(f"📁 المسار: {args.img_dir}")
+    if result['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+إعدادات Gunicorn الإضافية (تُحمّل تلقائياً من مجلد التشغيل)
+الإعدادات الأساسية (العمال، الخيوط، المهلة) تبقى في start.sh
+"""
+
+import os
+
+import concurrency
+import metrics
+
+_shards = []
+
+
+def on_starting(server):
+    """بداية تشغيل الـ master: حذف ملفات المقاييس من التشغيل السابق ونشر تخطيط العمال"""
+    metrics.reset_dir()
+    # سياسة الخيوط (concurrency.py) وحدود القبول تُحسب من التخطيط الفعلي
+    concurrency.publish_layout(server.cfg.workers, server.cfg.threads)
+    # الوضع المجزأ: الأجزاء تعمل مرة واحدة في الـ master وكل العمال يتصلون بها
+    shards = int(os.environ.get('DB_SHARDS', 0) or 0)
+    if shards > 1:
+        import sharded_database
+        from feature_store import open_feature_store
+        open_feature_store(build_if_missing=True)
+        _shards.extend(sharded_database.start_shards(shards))
+
+
+def on_exit(server):
+    if _shards:
+        import sharded_database
+        sharded_database.stop_shards(_shards)
+
+
+def child_exit(server, worker):
+    """عند خروج عامل: تصفير مقاييس gauge الخاصة به"""
+    metrics.mark_process_dead(worker.pid)
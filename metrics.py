@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+مقاييس الأداء - Prometheus Metrics
+عدادات ومدرجات تكرارية (Histograms) بحاويات ثابتة وخفيفة بما يكفي لتبقى مفعلة دائماً
+
+كل عامل (worker) في Gunicorn يكتب قيمه في مصفوفة memmap خاصة به داخل
+METRICS_DIR، ونقطة /metrics تجمع ملفات جميع العمال، لذلك تبقى الأرقام صحيحة
+مهما كان عدد العمال.  تحديث أي قيمة = قفل + جمع على عنصر مصفوفة (دون I/O).
+ملفات تشغيل سابق تُحذف عند بدء gunicorn (reset_dir) أو عند أول استخدام بدونه.
+
+الاستخدام:
+    REQUESTS = counter('http_requests_total', 'عدد الطلبات', ['route', 'status'])
+    REQUESTS.labels(route='predict_manual', status='200').inc()
+
+    timer = StageTimer('predict_manual')
+    ...; timer.mark('parse')
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = Path(os.environ.get('METRICS_DIR', Path(tempfile.gettempdir()) / 'car_price_metrics'))
+# العملية المالكة للتشغيل الحالي (master في gunicorn، أو أول عملية في التشغيل المباشر)
+OWNER_FILE = 'owner.pid'
+SLOT_CAPACITY = 8192
+
+# حاويات زمنية ثابتة (بالثواني) من 50µs حتى 10s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _WorkerStore:
+    """مصفوفة القيم الخاصة بالعملية الحالية + جدول المفاتيح -> الخانات"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = None
+        self.keys: Dict[str, List[int]] = {}
+        self.next_slot = 0
+
+    def _ensure(self):
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+        # أول استخدام أو بعد fork (مثلاً gunicorn --preload): ملف جديد لكل عملية
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        _claim_dir()
+        self.values = np.lib.format.open_memmap(
+            METRICS_DIR / f'metrics_{pid}.npy', mode='w+', dtype=np.float64, shape=(SLOT_CAPACITY,)
+        )
+        self.keys = {}
+        self.next_slot = 0
+        self.pid = pid
+        self._write_keys()
+
+    def _write_keys(self):
+        path = METRICS_DIR / f'metrics_{self.pid}.json'
+        tmp = path.with_suffix('.json.tmp')
+        tmp.write_text(json.dumps(self.keys), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def allocate(self, key: str, width: int) -> int:
+        """حجز خانات متتالية لمفتاح جديد (يحدث مرة واحدة لكل مجموعة labels)"""
+        with self.lock:
+            self._ensure()
+            if key in self.keys:
+                return self.keys[key][0]
+            if self.next_slot + width > SLOT_CAPACITY:
+                logger.warning(f"⚠️ امتلأت خانات المقاييس، تم تجاهل {key}")
+                return -1
+            slot = self.next_slot
+            self.next_slot += width
+            self.keys[key] = [slot, width]
+            self._write_keys()
+            return slot
+
+    def add(self, slot: int, value: float):
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            self.values[slot] += value
+
+    def add2(self, slot_a: int, value_a: float, slot_b: int, value_b: float):
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            self.values[slot_a] += value_a
+            self.values[slot_b] += value_b
+
+    def set(self, slot: int, value: float):
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            self.values[slot] = value
+
+
+_store = _WorkerStore()
+_families: Dict[str, '_Family'] = {}
+_info: Dict[str, Dict[str, str]] = {}
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class _Family:
+    kind = ''
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def width(self) -> int:
+        return 1
+
+    def labels(self, **labels):
+        values = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        child = self._children.get(values)
+        if child is None or child.pid != os.getpid():
+            with self._lock:
+                key = f'{self.name}{{{_label_str(self.labelnames, values)}}}'
+                slot = _store.allocate(key, self.width())
+                child = self._make_child(slot)
+                child.pid = os.getpid()
+                self._children[values] = child
+        return child
+
+
+class _CounterChild:
+    __slots__ = ('slot', 'pid')
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def inc(self, amount: float = 1.0):
+        if self.slot >= 0:
+            _store.add(self.slot, amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        if self.slot >= 0:
+            _store.add(self.slot, -amount)
+
+    def set(self, value: float):
+        if self.slot >= 0:
+            _store.set(self.slot, value)
+
+
+class _HistogramChild:
+    __slots__ = ('slot', 'pid', 'buckets', 'sum_slot')
+
+    def __init__(self, slot, buckets):
+        self.slot = slot
+        self.buckets = buckets
+        self.sum_slot = slot + len(buckets) + 1
+
+    def observe(self, value: float):
+        if self.slot >= 0:
+            # الخانات: [حاوية لكل حد] + [+Inf] + [sum] ; العد التراكمي يُحسب عند العرض
+            _store.add2(self.slot + bisect_left(self.buckets, value), 1.0, self.sum_slot, value)
+
+
+class Counter(_Family):
+    kind = 'counter'
+
+    def _make_child(self, slot):
+        return _CounterChild(slot)
+
+
+class Gauge(_Family):
+    """مقياس لحظي؛ عند التجميع تُجمع قيم العمال الأحياء فقط"""
+    kind = 'gauge'
+
+    def _make_child(self, slot):
+        return _GaugeChild(slot)
+
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def width(self) -> int:
+        return len(self.buckets) + 2
+
+    def _make_child(self, slot):
+        return _HistogramChild(slot, self.buckets)
+
+
+def _register(family: _Family) -> _Family:
+    existing = _families.get(family.name)
+    if existing is not None:
+        return existing
+    _families[family.name] = family
+    return family
+
+
+def counter(name: str, doc: str, labelnames: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, doc, labelnames))
+
+
+def gauge(name: str, doc: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge(name, doc, labelnames))
+
+
+def histogram(name: str, doc: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, doc, labelnames, buckets))
+
+
+def set_info(name: str, labels: Dict[str, str]):
+    """معلومات ثابتة (مثل نسخة النموذج) تُعرض كـ gauge بقيمة 1"""
+    _info[name] = {k: str(v) for k, v in labels.items()}
+
+
+# ===== STANDARD METRICS =====
+REQUESTS = counter('car_price_http_requests_total', 'HTTP requests by route and status', ['route', 'method', 'status'])
+REQUEST_LATENCY = histogram('car_price_http_request_duration_seconds', 'End-to-end request latency', ['route'])
+IN_FLIGHT = gauge('car_price_http_requests_in_flight', 'Requests currently being served', ['route'])
+STAGE_LATENCY = histogram('car_price_stage_duration_seconds', 'Per-stage handler latency', ['route', 'stage'])
+CACHE_REQUESTS = counter('car_price_cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+
+
+class StageTimer:
+    """
+    مؤقت المراحل داخل معالج الطلب
+    كل استدعاء لـ mark() يسجل الزمن منذ آخر علامة تحت اسم المرحلة
+    """
+
+    __slots__ = ('route', 'last')
+
+    def __init__(self, route: str):
+        self.route = route
+        self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        STAGE_LATENCY.labels(route=self.route, stage=stage).observe(now - self.last)
+        self.last = now
+
+
+def record_cache(cache: str, hit: bool):
+    """تسجيل نتيجة البحث في كاش (hit/miss)"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+# ===== AGGREGATION =====
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _collect() -> Dict[str, float]:
+    """جمع القيم من ملفات جميع العمال حسب المفتاح"""
+    totals: Dict[str, np.ndarray] = {}
+    gauge_names = {n for n, f in _families.items() if f.kind == 'gauge'}
+    if not METRICS_DIR.exists():
+        return totals
+    for keys_path in METRICS_DIR.glob('metrics_*.json'):
+        try:
+            pid = int(keys_path.stem.split('_')[1])
+            keys = json.loads(keys_path.read_text(encoding='utf-8'))
+            values = np.load(keys_path.with_suffix('.npy'), mmap_mode='r')
+        except (ValueError, OSError):
+            continue
+        alive = None
+        for key, (slot, width) in keys.items():
+            name = key.split('{', 1)[0]
+            if name in gauge_names:
+                if alive is None:
+                    alive = _pid_alive(pid)
+                if not alive:
+                    continue
+            chunk = np.array(values[slot:slot + width], dtype=np.float64)
+            if key in totals:
+                totals[key] += chunk
+            else:
+                totals[key] = chunk
+    return totals
+
+
+def _fmt(v: float) -> str:
+    if v == int(v) and abs(v) < 1e15:
+        return str(int(v))
+    return repr(float(v))
+
+
+def render() -> str:
+    """نص Prometheus (صيغة 0.0.4) مجمّع من كل العمال"""
+    totals = _collect()
+    by_family: Dict[str, List[Tuple[str, np.ndarray]]] = {}
+    for key, vals in totals.items():
+        name, labels = key.split('{', 1)
+        by_family.setdefault(name, []).append((labels[:-1], vals))
+
+    lines = []
+    for name, family in _families.items():
+        lines.append(f'# HELP {name} {family.doc}')
+        lines.append(f'# TYPE {name} {family.kind}')
+        for labels, vals in sorted(by_family.get(name, [])):
+            if family.kind == 'histogram':
+                cumulative = np.cumsum(vals[:len(family.buckets) + 1])
+                sep = ',' if labels else ''
+                for bound, count in zip(family.buckets, cumulative):
+                    lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {_fmt(count)}')
+                lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {_fmt(cumulative[-1])}')
+                lines.append(f'{name}_sum{{{labels}}} {_fmt(vals[-1])}')
+                lines.append(f'{name}_count{{{labels}}} {_fmt(cumulative[-1])}')
+            else:
+                lines.append(f'{name}{{{labels}}} {_fmt(vals[0])}')
+
+    for name, labels in _info.items():
+        names = tuple(labels)
+        lines.append(f'# HELP {name}_info Static process information')
+        lines.append(f'# TYPE {name}_info gauge')
+        lines.append(f'{name}_info{{{_label_str(names, tuple(labels[n] for n in names))}}} 1')
+    return '\n'.join(lines) + '\n'
+
+
+# ===== RUN OWNERSHIP =====
+def _write_owner(pid: int):
+    tmp = METRICS_DIR / f'.{OWNER_FILE}.{pid}'
+    tmp.write_text(str(pid), encoding='utf-8')
+    os.replace(tmp, METRICS_DIR / OWNER_FILE)
+
+
+def _claim_dir():
+    """
+    بدون gunicorn لا يُستدعى reset_dir: إذا كان مالك المجلد منتهياً فهذه بداية تشغيل جديد،
+    فتُحذف ملفات العمليات المنتهية (عدادات تشغيل سابق) وتصبح هذه العملية المالكة.
+    تحت gunicorn الـ master حي فتبقى ملفات العمال المنتهين للحفاظ على رتابة العدادات
+    """
+    try:
+        owner = int((METRICS_DIR / OWNER_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        owner = None
+    if owner is not None and _pid_alive(owner):
+        return
+    pruned = 0
+    for keys_path in METRICS_DIR.glob('metrics_*.json'):
+        try:
+            pid = int(keys_path.stem.split('_')[1])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            for path in (keys_path, keys_path.with_suffix('.npy')):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            pruned += 1
+    try:
+        _write_owner(os.getpid())
+    except OSError:
+        pass
+    if pruned:
+        logger.info(f"🧹 حذف ملفات مقاييس {pruned} عملية منتهية من تشغيل سابق")
+
+
+# ===== GUNICORN HOOKS =====
+def reset_dir():
+    """حذف ملفات التشغيل السابق (يُستدعى من on_starting في الـ master)"""
+    if METRICS_DIR.exists():
+        for path in METRICS_DIR.glob('metrics_*'):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    _write_owner(os.getpid())
+
+
+def mark_process_dead(pid: int):
+    """تصفير مقاييس gauge لعامل انتهى (العدادات تبقى للحفاظ على الرتابة)"""
+    keys_path = METRICS_DIR / f'metrics_{pid}.json'
+    try:
+        keys = json.loads(keys_path.read_text(encoding='utf-8'))
+        values = np.load(keys_path.with_suffix('.npy'), mmap_mode='r+')
+    except (OSError, ValueError):
+        return
+    gauge_names = {n for n, f in _families.items() if f.kind == 'gauge'}
+    for key, (slot, width) in keys.items():
+        if key.split('{', 1)[0] in gauge_names:
+            values[slot:slot + width] = 0
+    values.flush()
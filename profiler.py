@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+محلل الأداء بالعينات - On-demand Sampling Profiler
+يلتقط عينات من مكدسات الخيوط (stack samples) داخل العامل أثناء التشغيل الفعلي
+
+عند الإيقاف لا يوجد أي خيط إضافي ولا أي عمل في مسار الطلب سوى فحص متغير منطقي
+واحد.  عند التفعيل (عبر /api/admin/profile أو إشارة SIGUSR2 الاختيارية) يعمل
+خيط خلفي يقرأ sys._current_frames() كل بضع ميلي ثوان، ويوسم كل عينة باسم
+المسار (predict_manual, search_cars, ...) الذي يخدمه الخيط، ثم يكتب ملف
+collapsed-stack جاهزاً لأدوات flamegraph:
+
+    predict_manual;app:predict_manual;sklearn:predict;basic:predict 42
+"""
+
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', Path(tempfile.gettempdir()) / 'car_price_profiles'))
+DEFAULT_INTERVAL = 0.005
+DEFAULT_SECONDS = 10.0
+MAX_SECONDS = 120.0
+MAX_STACK_DEPTH = 64
+
+# يُقرأ في مسار الطلب؛ التحقق منه هو التكلفة الوحيدة عند الإيقاف
+active = False
+
+_routes: Dict[int, str] = {}
+_lock = threading.Lock()
+_session: Optional['_Session'] = None
+
+
+class _Session:
+    def __init__(self, seconds: float, requests: Optional[int], interval: float):
+        self.id = f'{os.getpid()}-{int(time.time() * 1000)}'
+        self.seconds = seconds
+        self.remaining_requests = requests
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.n_samples = 0
+        self.started = time.time()
+        self.finished = None
+        self.path = PROFILE_DIR / f'profile_{self.id}.folded'
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def _run(self):
+        global active, _session
+        deadline = time.perf_counter() + self.seconds
+        own = threading.get_ident()
+        try:
+            while not self.stop_event.is_set() and time.perf_counter() < deadline:
+                frames = sys._current_frames()
+                for tid, frame in frames.items():
+                    if tid == own:
+                        continue
+                    route = _routes.get(tid)
+                    if route is None:
+                        continue
+                    self.samples[_collapse(route, frame)] += 1
+                    self.n_samples += 1
+                del frames
+                self.stop_event.wait(self.interval)
+        finally:
+            active = False
+            _routes.clear()
+            self.finished = time.time()
+            self._save()
+            with _lock:
+                if _session is self:
+                    _session = None
+
+    def _save(self):
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            lines = [f'{stack} {count}' for stack, count in self.samples.most_common()]
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+            os.replace(tmp, self.path)
+            logger.info(f"🔬 تم حفظ ملف التحليل: {self.path} ({self.n_samples} عينة)")
+        except OSError as e:
+            logger.error(f"❌ خطأ في حفظ ملف التحليل: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'profile_id': self.id,
+            'running': self.finished is None,
+            'samples': self.n_samples,
+            'started_at': self.started,
+            'finished_at': self.finished,
+            'file': str(self.path),
+        }
+
+
+def _collapse(route: str, frame) -> str:
+    parts = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f'{Path(code.co_filename).stem}:{code.co_name}')
+        frame = frame.f_back
+    parts.append(route)
+    return ';'.join(reversed(parts))
+
+
+def start(seconds: float = DEFAULT_SECONDS, requests: Optional[int] = None,
+          interval: float = DEFAULT_INTERVAL) -> Dict[str, Any]:
+    """
+    بدء جلسة تحليل في هذا العامل
+
+    Args:
+        seconds: أقصى مدة للجلسة
+        requests: إيقاف الجلسة بعد اكتمال هذا العدد من الطلبات (اختياري)
+        interval: الفاصل بين العينات بالثواني
+
+    Returns:
+        حالة الجلسة؛ أو خطأ إذا كانت هناك جلسة قيد التشغيل
+    """
+    global active, _session
+    seconds = max(0.1, min(float(seconds), MAX_SECONDS))
+    interval = max(0.001, float(interval))
+    with _lock:
+        if _session is not None:
+            return {'error': 'already_running', **_session.status()}
+        _session = _Session(seconds, requests, interval)
+        active = True
+        _session.thread.start()
+        return _session.status()
+
+
+def stop():
+    """إيقاف الجلسة الحالية (إن وجدت) وحفظ النتائج"""
+    with _lock:
+        session = _session
+    if session is not None:
+        session.stop_event.set()
+
+
+def current_status() -> Optional[Dict[str, Any]]:
+    with _lock:
+        return _session.status() if _session is not None else None
+
+
+def read_profile(profile_id: str) -> Optional[str]:
+    """قراءة ملف collapsed-stack محفوظ (من أي عامل)"""
+    if not profile_id.replace('-', '').isdigit():
+        return None
+    path = PROFILE_DIR / f'profile_{profile_id}.folded'
+    return path.read_text(encoding='utf-8') if path.exists() else None
+
+
+# ===== REQUEST HOOKS =====
+def enter_request(route: str):
+    """يُستدعى فقط عندما يكون active=True"""
+    _routes[threading.get_ident()] = route
+
+
+def exit_request():
+    """يُستدعى فقط عندما يكون active=True"""
+    # الطلب الذي بدأ الجلسة (أو بدأ قبلها) لم يُسجَّل عند الدخول فلا يُحتسب
+    if _routes.pop(threading.get_ident(), None) is None:
+        return
+    with _lock:
+        session = _session
+        if session is None or session.remaining_requests is None:
+            return
+        session.remaining_requests -= 1
+        if session.remaining_requests <= 0:
+            session.stop_event.set()
+
+
+# ===== SIGNAL =====
+def install_signal_handler(signum=signal.SIGUSR2, seconds: float = DEFAULT_SECONDS):
+    """
+    تفعيل التحليل عبر إشارة: kill -USR2 <worker pid>
+    يجب استدعاؤها من الخيط الرئيسي، وترسل الإشارة إلى العامل وليس إلى master
+    """
+    def _handler(_signum, _frame):
+        threading.Thread(target=start, kwargs={'seconds': seconds}, daemon=True).start()
+
+    try:
+        signal.signal(signum, _handler)
+        logger.info(f"🔬 محلل الأداء جاهز على الإشارة {signal.Signals(signum).name} (pid={os.getpid()})")
+    except ValueError:
+        logger.warning("⚠️ تعذر تثبيت إشارة محلل الأداء خارج الخيط الرئيسي")
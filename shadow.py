@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+التقييم الظلي لنموذج مرشح - Shadow Scoring
+يُحمَّل نموذج مرشح (SHADOW_MODEL_PATH) بجانب النموذج الأساسي، وتُرسل عينة من
+الطلبات المشفرة مع أسعارها المُقدمة للعميل إلى طابور محدود. خيط خلفي يسحب
+دفعات من الطابور ويقيّمها بالمرشح ويجمع إحصائيات الاختلاف.
+
+- submit() لا ينتظر أبداً: عند امتلاء الطابور يُسقط العنصر ويُعد في المقاييس،
+  فزمن استجابة العميل لا يتأثر.
+- كل التحليل (فك One-hot إلى شرائح، حساب الفروق) يتم في الخيط الخلفي.
+- الإحصائيات لكل شريحة (المسار، الوقود، ناقل الحركة، البائع، المالك، فئة السعر)
+  في مدرج تكراري لوغاريثمي ثابت الحجم للفرق النسبي المطلق، فالذاكرة ثابتة
+  والنسب المئوية تقريبية بدقة حد الخانة (~12%).
+
+المتغيرات:
+    SHADOW_MODEL_PATH    مسار النموذج المرشح (.pkl) - بدونه الوضع الظلي معطل
+    SHADOW_META_PATH     meta النموذج المرشح (الافتراضي: meta النموذج الأساسي)
+    SHADOW_SAMPLE_RATE   نسبة الطلبات المرسلة (الافتراضي 1.0)
+    SHADOW_QUEUE_SIZE    سعة الطابور بالعناصر (الافتراضي 1024)
+    SHADOW_BATCH_WINDOW  نافذة تجميع الدفعات بالثواني (الافتراضي 0.05)
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+import metrics
+from encoding import CATEGORICAL_FIELDS, inverse_target
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 1.0))
+QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 1024))
+MAX_BATCH_ROWS = 4096        # أقصى صفوف لكل استدعاء predict في الخيط الخلفي
+MAX_ROWS_PER_ITEM = 256      # الطلبات الكبيرة (sweep) تُرسل عينة من صفوفها فقط
+# نافذة تجميع بعد أول عنصر: استدعاء predict واحد لعدة طلبات بدلاً من استدعاء لكل طلب
+BATCH_WINDOW_SECONDS = float(os.environ.get('SHADOW_BATCH_WINDOW', 0.05))
+
+# حدود فئات السعر (بوحدة العملة)
+PRICE_BANDS = [(200_000, '<2L'), (500_000, '2L-5L'), (1_000_000, '5L-10L'), (float('inf'), '>10L')]
+# خانات الفرق النسبي المطلق: 0 ثم لوغاريثمي من 1e-6 إلى 10
+_EDGES = np.concatenate([[0.0], np.logspace(-6, 1, 141)])
+
+SUBMITTED = metrics.counter('car_price_shadow_submitted_total', 'Requests queued for shadow scoring', ['route'])
+DROPPED = metrics.counter('car_price_shadow_dropped_total', 'Shadow requests dropped because the queue was full', ['route'])
+SCORED = metrics.counter('car_price_shadow_scored_rows_total', 'Rows re-scored by the candidate model')
+QUEUE_DEPTH = metrics.gauge('car_price_shadow_queue_depth', 'Items waiting in the shadow queue')
+ABS_PCT_DELTA = metrics.histogram('car_price_shadow_abs_pct_delta', 'Absolute relative price delta candidate vs primary',
+                                  buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+class DivergenceStats:
+    """إحصائيات اختلاف بذاكرة ثابتة (مجاميع + مدرج تكراري لوغاريثمي)"""
+
+    def __init__(self):
+        self.count = 0
+        self.sum_abs = 0.0
+        self.sum_signed = 0.0
+        self.sum_abs_pct = 0.0
+        self.max_abs_pct = 0.0
+        self.bins = np.zeros(len(_EDGES) + 1, dtype=np.int64)
+
+    def add(self, delta: np.ndarray, abs_pct: np.ndarray):
+        if len(delta) == 0:
+            return
+        self.count += len(delta)
+        self.sum_abs += float(np.abs(delta).sum())
+        self.sum_signed += float(delta.sum())
+        self.sum_abs_pct += float(abs_pct.sum())
+        self.max_abs_pct = max(self.max_abs_pct, float(abs_pct.max()))
+        np.add.at(self.bins, np.searchsorted(_EDGES, abs_pct, side='right'), 1)
+
+    def percentile(self, q: float) -> float:
+        """الحد الأعلى للخانة التي تحتوي النسبة q (تقدير متحفظ)"""
+        if self.count == 0:
+            return 0.0
+        idx = int(np.searchsorted(np.cumsum(self.bins), q * self.count, side='left'))
+        if idx >= len(_EDGES):
+            return self.max_abs_pct
+        return float(min(_EDGES[idx], self.max_abs_pct))
+
+    def summary(self) -> Dict[str, Any]:
+        n = max(self.count, 1)
+        return {
+            'count': self.count,
+            'mean_abs_delta': round(self.sum_abs / n, 2),
+            'mean_delta': round(self.sum_signed / n, 2),
+            'mean_abs_pct_delta': round(self.sum_abs_pct / n, 6),
+            'p50_abs_pct_delta': round(self.percentile(0.50), 6),
+            'p90_abs_pct_delta': round(self.percentile(0.90), 6),
+            'p99_abs_pct_delta': round(self.percentile(0.99), 6),
+            'max_abs_pct_delta': round(self.max_abs_pct, 6),
+        }
+
+
+def _price_band(price: np.ndarray) -> np.ndarray:
+    bounds = np.array([b for b, _ in PRICE_BANDS[:-1]])
+    labels = np.array([label for _, label in PRICE_BANDS], dtype=object)
+    return labels[np.searchsorted(bounds, price, side='right')]
+
+
+class ShadowScorer:
+    """طابور محدود + خيط خلفي يقيّم النموذج المرشح ويجمع الاختلاف"""
+
+    def __init__(self, candidate, feature_names: List[str], candidate_meta: Mapping[str, Any],
+                 candidate_version: str = 'unknown', encoder=None, sample_rate: float = SAMPLE_RATE,
+                 queue_size: int = QUEUE_SIZE):
+        self.candidate = candidate
+        self.encoder = encoder
+        self.candidate_meta = candidate_meta
+        self.candidate_version = candidate_version
+        self.num_iteration = getattr(candidate, 'best_iteration_', None) or candidate_meta.get('best_iteration')
+        self.feature_names = list(feature_names)
+        self.sample_rate = sample_rate
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, DivergenceStats]] = {}
+        self._overall = DivergenceStats()
+        self._submitted = 0
+        self._dropped = 0
+        self._errors = 0
+        self._started_at = time.time()
+        # أعمدة One-hot لكل حقل فئوي (لفك الشرائح في الخيط الخلفي)
+        self._groups = {}
+        for field, prefix in CATEGORICAL_FIELDS.items():
+            cols = [(i, f[len(prefix):]) for i, f in enumerate(self.feature_names) if f.startswith(prefix)]
+            if cols:
+                self._groups[field] = (np.array([i for i, _ in cols]), np.array([lvl for _, lvl in cols] + ['unknown'], dtype=object))
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+
+    # ----- مسار الطلب -----
+
+    def submit(self, route: str, X: np.ndarray, served_prices: np.ndarray) -> bool:
+        """
+        إرسال صفوف مع الأسعار المقدمة للعميل (لا ينتظر أبداً)
+        X مصفوفة/DataFrame مشفرة، أو قاموس إدخال خام (يُشفر في الخيط الخلفي)
+
+        Returns:
+            True إذا دخلت الطابور
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if isinstance(X, np.ndarray) and len(X) > MAX_ROWS_PER_ITEM:
+            idx = np.random.default_rng().choice(len(X), MAX_ROWS_PER_ITEM, replace=False)
+            X, served_prices = X[idx], np.asarray(served_prices)[idx]
+        try:
+            self._queue.put_nowait((route, X, served_prices))
+        except queue.Full:
+            DROPPED.labels(route=route).inc()
+            with self._count_lock:
+                self._dropped += 1
+            return False
+        SUBMITTED.labels(route=route).inc()
+        with self._count_lock:
+            self._submitted += 1
+        return True
+
+    # ----- الخيط الخلفي -----
+
+    def _drain(self) -> list:
+        """سحب عنصر واحد (انتظار) ثم كل ما يتوفر بعد نافذة التجميع حتى MAX_BATCH_ROWS"""
+        items = [self._queue.get()]
+        if BATCH_WINDOW_SECONDS > 0:
+            time.sleep(BATCH_WINDOW_SECONDS)
+        rows = self._rows(items[0][1])
+        while rows < MAX_BATCH_ROWS:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += self._rows(item[1])
+        QUEUE_DEPTH.labels().set(self._queue.qsize())
+        return items
+
+    @staticmethod
+    def _rows(X) -> int:
+        return 1 if isinstance(X, Mapping) else len(X)
+
+    def _encode(self, X) -> np.ndarray:
+        if isinstance(X, Mapping):
+            return self.encoder.encode_one(X)
+        return np.asarray(X, dtype=np.float64).reshape(-1, len(self.feature_names))
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            try:
+                self._score(items)
+            except Exception as e:
+                self._errors += 1
+                logger.warning(f"⚠️ فشل التقييم الظلي: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _score(self, items):
+        blocks = [self._encode(x) for _, x, _ in items]
+        X = np.vstack(blocks)
+        served = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1) for _, _, p in items])
+        routes = np.concatenate([np.full(len(b), r, dtype=object) for (r, _, _), b in zip(items, blocks)])
+        # خيط واحد: المرشح لا ينافس مسار الطلب على كل الأنوية
+        kwargs = {'num_threads': 1}  # خيط خلفي منخفض الأولوية: لا يأخذ من حصة الطلبات
+        if self.num_iteration:
+            kwargs['num_iteration'] = self.num_iteration
+        # Booster مباشرة: بدون تحقق sklearn من أسماء الأعمدة لكل دفعة
+        booster = getattr(self.candidate, 'booster_', self.candidate)
+        candidate = inverse_target(booster.predict(X, **kwargs), self.candidate_meta)
+
+        delta = candidate - served
+        abs_pct = np.abs(delta) / np.maximum(np.abs(served), 1.0)
+        slices = {'route': routes, 'price_band': _price_band(served)}
+        for field, (cols, levels) in self._groups.items():
+            block = X[:, cols]
+            # صف بدون أي عمود = 1 يعني قيمة غير معروفة
+            idx = np.where(block.max(axis=1) > 0.5, block.argmax(axis=1), len(cols))
+            slices[field] = levels[idx]
+
+        with self._lock:
+            self._overall.add(delta, abs_pct)
+            for dim, values in slices.items():
+                dim_stats = self._stats.setdefault(dim, {})
+                for value in np.unique(values):
+                    mask = values == value
+                    dim_stats.setdefault(str(value), DivergenceStats()).add(delta[mask], abs_pct[mask])
+        SCORED.labels().inc(len(X))
+        for v in abs_pct:
+            ABS_PCT_DELTA.labels().observe(float(v))
+
+    # ----- التقارير -----
+
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """انتظار فراغ الطابور (للسكربتات والاختبارات)"""
+        deadline = time.perf_counter() + timeout
+        while self._queue.unfinished_tasks and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'candidate_version': self.candidate_version,
+                'pid': os.getpid(),
+                'since': self._started_at,
+                'sample_rate': self.sample_rate,
+                'queue': {'depth': self._queue.qsize(), 'capacity': self._queue.maxsize},
+                'submitted': self._submitted,
+                'dropped': self._dropped,
+                'errors': self._errors,
+                'overall': self._overall.summary(),
+                'slices': {dim: {k: s.summary() for k, s in sorted(vals.items())}
+                           for dim, vals in sorted(self._stats.items())},
+            }
+
+
+def open_shadow(feature_names: List[str], primary_meta: Mapping[str, Any],
+                encoder=None, version_fn=None) -> Optional[ShadowScorer]:
+    """تحميل النموذج المرشح من SHADOW_MODEL_PATH (أو None إن لم يُضبط)"""
+    path = os.environ.get('SHADOW_MODEL_PATH')
+    if not path:
+        return None
+    try:
+        import joblib
+        candidate = joblib.load(path)
+        # LightGBM يستبدل المسافات في أسماء الميزات بـ _
+        names = [n.replace(' ', '_') for n in (getattr(candidate, 'feature_name_', None) or feature_names)]
+        if names != [n.replace(' ', '_') for n in feature_names]:
+            logger.error("❌ ميزات النموذج المرشح لا تطابق lgbm_features.txt - الوضع الظلي معطل")
+            return None
+        meta_path = os.environ.get('SHADOW_META_PATH')
+        candidate_meta = json.loads(Path(meta_path).read_text(encoding='utf-8')) if meta_path else primary_meta
+        version = version_fn(Path(path)) if version_fn else 'unknown'
+        logger.info(f"🌓 الوضع الظلي مفعل: النموذج المرشح {version}")
+        return ShadowScorer(candidate, feature_names, candidate_meta, candidate_version=version, encoder=encoder)
+    except Exception as e:
+        logger.error(f"❌ تعذر تحميل النموذج المرشح: {e}")
+        return None
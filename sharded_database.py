@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+"""
+قاعدة بيانات مجزأة - Sharded Car Database
+الصفوف موزعة على N عملية shard محلية، والمنسق (داخل عامل الويب) يرسل كل
+استعلام لكل الأجزاء معاً عبر Unix sockets ثم يدمج النتائج الجزئية.
+
+    المنسق (ShardedCarDatabase)          shard i (serve_shard)
+        send(op) لكل الأجزاء  ───────▶   جزء الجدول + أرقام صفوفه الأصلية
+        recv من كل جزء        ◀───────   نتيجة جزئية صغيرة
+        دمج
+
+التوزيع (DB_SHARD_MODE):
+    hash   حسب بصمة name_le: كل صفوف الموديل نفسه في جزء واحد
+    range  كتل متصلة من الصفوف
+
+الدمج:
+    الصفحات والبحث   كل جزء يرجع أول offset+limit نتيجة مع أرقام صفوفها،
+                     والمنسق يرتب حسب رقم الصف ويقص الصفحة (نفس ترتيب الجدول الكامل)
+    العدد            مجموع أعداد الأجزاء
+    top-k            أفضل k من كل جزء ثم أفضل k من الاتحاد (التعادل بترتيب الصفوف)
+    المتوسط/الانحراف (n, mean, M2) من كل جزء تُدمج بصيغة Chan
+    الوسيط           دقيق بثلاث جولات: min/max، ثم مدرج تكراري بحدود مشتركة
+                     يحدد الخانة التي فيها الوسيط، ثم قيم تلك الخانة فقط
+
+المنسق يحتفظ بمخزن الميزات (memmap) وجدول "مالك كل صف" فقط؛ الجدول الكامل
+(df) يُبنى عند أول استخدام للمستهلكين الذين يحتاجونه (الرسوم البيانية).
+
+تشغيل الأجزاء:
+- مع Gunicorn: gunicorn.conf.py يشغلها في الـ master والعمال يتصلون بها.
+- بدون ذلك: أول منسق لا يجد الأجزاء يشغلها بنفسه ويوقفها عند خروجه.
+- كل shard يخرج إذا ماتت العملية التي شغلته.
+
+المتغيرات:
+    DB_SHARDS              عدد الأجزاء (> 1 يفعّل هذا الوضع، انظر database.get_database)
+    DB_SHARD_MODE          hash أو range (الافتراضي hash)
+    DB_SHARD_DIR           مجلد الـ sockets (الافتراضي /tmp/car-shards-<uid>)
+    DB_SHARD_TIMEOUT       مهلة رد الجزء بالثواني (الافتراضي 30)
+
+الاستخدام (تشغيل الأجزاء يدوياً):
+    python sharded_database.py --shards 4 --mode hash
+"""
+
+import argparse
+import atexit
+import logging
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from database import CarDatabase
+from feature_store import STORE_DIR, open_feature_store
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+MODES = ('hash', 'range')
+DEFAULT_MODE = os.environ.get('DB_SHARD_MODE', 'hash')
+SOCKET_DIR = Path(os.environ.get('DB_SHARD_DIR', Path(tempfile.gettempdir()) / f'car-shards-{os.getuid()}'))
+REPLY_TIMEOUT = float(os.environ.get('DB_SHARD_TIMEOUT', 30))
+START_TIMEOUT = 120
+MEDIAN_BINS = 4096
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+QUERY_SECONDS = metrics.histogram('car_price_shard_query_seconds', 'Scatter-gather round trip per shard operation',
+                                  ['op'])
+
+
+def partition(store, count: int, mode: str = 'hash') -> np.ndarray:
+    """رقم الجزء المالك لكل صف (نفس النتيجة في المنسق وكل shard)"""
+    n = store.n_rows
+    if mode == 'hash' and 'name_le' in store.features:
+        keys = np.asarray(store.column('name_le')).astype(np.int64).astype(np.uint64)
+        return ((keys * _HASH_MULTIPLIER) >> np.uint64(32)) % np.uint64(count)
+    return (np.arange(n, dtype=np.uint64) * np.uint64(count)) // np.uint64(max(n, 1))
+
+
+def socket_path(index: int, count: int, mode: str, socket_dir: Path = SOCKET_DIR) -> str:
+    return str(Path(socket_dir) / f'shard-{mode}-{index}-of-{count}.sock')
+
+
+def _authkey() -> bytes:
+    """مفتاح مشترك للـ sockets؛ من يشغل الأجزاء ينشئه والعمليات الأبناء ترثه من البيئة"""
+    return os.environ.setdefault('DB_SHARD_AUTHKEY', secrets.token_hex(16)).encode()
+
+
+# ===== SHARD =====
+class Shard:
+    """جزء واحد من الجدول داخل عملية shard؛ كل op_* عملية يطلبها المنسق"""
+
+    def __init__(self, index: int, count: int, mode: str, csv_path: Path, store_dir: Path):
+        self.index, self.count, self.mode = index, count, mode
+        self.csv_path, self.store_dir = Path(csv_path), Path(store_dir)
+        self.op_reload()
+
+    def op_reload(self) -> Dict[str, Any]:
+        # المنسق بنى المخزن قبل تشغيل الأجزاء؛ الأجزاء تقرأ فقط
+        store = open_feature_store(self.store_dir, csv_path=self.csv_path)
+        if store is None:
+            raise RuntimeError('مخزن الميزات غير متاح')
+        rows = np.flatnonzero(partition(store, self.count, self.mode) == self.index)
+        self.df = store.frame(restore_dtypes=True, rows=rows)
+        self.rows = rows
+        self.version = store.version
+        self._numeric = {}
+        return self.op_hello()
+
+    def op_hello(self) -> Dict[str, Any]:
+        return {'index': self.index, 'count': self.count, 'mode': self.mode, 'version': self.version,
+                'n_rows': len(self.rows), 'pid': os.getpid()}
+
+    def _values(self, column: str) -> Optional[np.ndarray]:
+        """قيم العمود الرقمية مرتبة بدون NaN (تُرتب مرة واحدة لكل عمود)"""
+        if column not in self.df.columns:
+            return None
+        values = self._numeric.get(column)
+        if values is None:
+            values = pd.to_numeric(self.df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            values = np.sort(values[~np.isnan(values)])
+            self._numeric[column] = values
+        return values
+
+    def _records(self, positions) -> List[Dict[str, Any]]:
+        return self.df.iloc[positions].to_dict('records')
+
+    def op_page(self, start: int, stop: int):
+        lo, hi = np.searchsorted(self.rows, [start, stop])
+        return self.rows[lo:hi], self._records(slice(lo, hi))
+
+    def op_row(self, index: int):
+        pos = int(np.searchsorted(self.rows, index))
+        if pos < len(self.rows) and self.rows[pos] == index:
+            return self.df.iloc[pos].to_dict()
+        return None
+
+    def op_search(self, query: str, column: str, k: Optional[int]):
+        if column not in self.df.columns:
+            return None
+        mask = self.df[column].astype(str).str.contains(query, case=False, na=False).to_numpy()
+        positions = np.flatnonzero(mask)
+        head = positions if k is None else positions[:k]
+        return self.rows[head], self._records(head), len(positions)
+
+    def op_top(self, column: str, k: int, largest: bool):
+        if column not in self.df.columns:
+            return None
+        values = pd.to_numeric(self.df[column], errors='coerce')
+        top = values.nlargest(k) if largest else values.nsmallest(k)
+        return top.to_numpy(dtype=np.float64), top.index.to_numpy(), self.df.loc[top.index].to_dict('records')
+
+    def op_moments(self, column: str):
+        values = self._values(column)
+        if values is None:
+            return None
+        if len(values) == 0:
+            return 0, np.inf, -np.inf, 0.0, 0.0
+        mean = float(values.mean())
+        return len(values), float(values[0]), float(values[-1]), mean, float(((values - mean) ** 2).sum())
+
+    def _bin_bounds(self, values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """حدود كل خانة [edges[b], edges[b+1]) داخل القيم المرتبة (الخانة الأخيرة تشمل الحد الأعلى)"""
+        bounds = np.searchsorted(values, edges, side='left')
+        bounds[0], bounds[-1] = 0, len(values)
+        return bounds
+
+    def op_histogram(self, column: str, edges: np.ndarray):
+        return np.diff(self._bin_bounds(self._values(column), edges))
+
+    def op_bin_values(self, column: str, edges: np.ndarray, bins: List[int]):
+        values = self._values(column)
+        bounds = self._bin_bounds(values, edges)
+        return {b: np.unique(values[bounds[b]:bounds[b + 1]], return_counts=True) for b in bins}
+
+    def op_stats(self):
+        return {
+            'rows': len(self.df),
+            'columns': list(self.df.columns),
+            'numeric_columns': self.df.select_dtypes(include=['number']).columns.tolist(),
+            'categorical_columns': self.df.select_dtypes(include=['object']).columns.tolist(),
+            'memory_usage': int(self.df.memory_usage(deep=True).sum()),
+        }
+
+
+def _handle(shard: Shard, conn):
+    """اتصال واحد من المنسق: طلب ← رد حتى يغلق"""
+    with conn:
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(('ok', getattr(shard, f'op_{op}')(*args)))
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+def _watch_parent(parent: int):
+    while os.getppid() == parent:
+        time.sleep(1.0)
+    os._exit(0)
+
+
+def serve_shard(index: int, count: int, mode: str, socket_dir: Path, csv_path: Path, store_dir: Path,
+                parent: Optional[int] = None):
+    """عملية shard: تحميل الجزء ثم خدمة الاتصالات (خيط لكل اتصال)"""
+    shard = Shard(index, count, mode, csv_path, store_dir)
+    address = socket_path(index, count, mode, socket_dir)
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family='AF_UNIX', authkey=_authkey())
+    if parent:
+        threading.Thread(target=_watch_parent, args=(parent,), daemon=True).start()
+    logger.info(f"🧩 shard {index}/{count} ({mode}): {len(shard.rows)} صف على {address}")
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:  # فشل المصادقة مثلاً: الـ listener يبقى يعمل
+            logger.warning(f"⚠️ shard {index}: اتصال مرفوض: {e}")
+            continue
+        threading.Thread(target=_handle, args=(shard, conn), daemon=True).start()
+
+
+# ===== LIFECYCLE =====
+def _hello(address: str):
+    conn = Client(address, family='AF_UNIX', authkey=_authkey())
+    try:
+        conn.send(('hello', ()))
+        status, value = conn.recv()
+    finally:
+        conn.close()
+    if status != 'ok':
+        raise RuntimeError(value)
+    return value
+
+
+def start_shards(count: int, mode: str = DEFAULT_MODE, indices: Optional[List[int]] = None,
+                 socket_dir: Path = SOCKET_DIR, csv_path: Optional[Path] = None,
+                 store_dir: Path = STORE_DIR) -> List[subprocess.Popen]:
+    """
+    تشغيل عمليات shard والانتظار حتى يرد كل منها
+
+    Returns:
+        العمليات (مسؤولية الإيقاف على من شغلها، انظر stop_shards)
+    """
+    if mode not in MODES:
+        raise ValueError(f'DB_SHARD_MODE غير صحيح ({", ".join(MODES)})')
+    csv_path = Path(csv_path or BASE_DIR / 'dataset' / 'cleaned_cars.csv')
+    Path(socket_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+    _authkey()
+    procs = {}
+    for i in (range(count) if indices is None else indices):
+        procs[i] = subprocess.Popen([
+            sys.executable, str(Path(__file__).resolve()), '--serve', str(i), '--shards', str(count),
+            '--mode', mode, '--dir', str(socket_dir), '--csv', str(csv_path), '--store-dir', str(store_dir),
+            '--parent', str(os.getpid()),
+        ])
+    deadline = time.monotonic() + START_TIMEOUT
+    for i, proc in procs.items():
+        while True:
+            try:
+                _hello(socket_path(i, count, mode, socket_dir))
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    stop_shards(list(procs.values()))
+                    raise RuntimeError(f'تعذر تشغيل shard {i} (exit={proc.poll()})')
+                time.sleep(0.05)
+    logger.info(f"✅ تم تشغيل {len(procs)} shard ({mode}) في {socket_dir}")
+    return list(procs.values())
+
+
+def stop_shards(procs: List[subprocess.Popen]):
+    for proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ===== COORDINATOR =====
+class ShardedCarDatabase(CarDatabase):
+    """
+    نفس واجهة CarDatabase لكن الاستعلامات الثقيلة (القوائم، البحث، النطاقات،
+    top-k، الإحصائيات) تُنفذ في عمليات shard وتُدمج هنا
+    """
+
+    def __init__(self, csv_path: str, shards: int, mode: str = DEFAULT_MODE,
+                 store_dir: Path = STORE_DIR, socket_dir: Path = SOCKET_DIR):
+        if mode not in MODES:
+            raise ValueError(f'DB_SHARD_MODE غير صحيح ({", ".join(MODES)})')
+        self.shards, self.mode = int(shards), mode
+        self.socket_dir = Path(socket_dir)
+        self._addresses = [socket_path(i, self.shards, mode, socket_dir) for i in range(self.shards)]
+        self._pools = [queue.SimpleQueue() for _ in range(self.shards)]
+        self._owned: List[subprocess.Popen] = []
+        self._owner_pid = os.getpid()
+        self._df = None
+        super().__init__(csv_path, store_dir)
+
+    # --- التحميل ---
+    def load_data(self):
+        """فتح المخزن وحساب مالك كل صف ثم الاتصال بالأجزاء (أو تشغيلها)"""
+        self.store = open_feature_store(self.store_dir, csv_path=self.csv_path, build_if_missing=True)
+        if self.store is None:
+            raise RuntimeError('الوضع المجزأ يحتاج مخزن الميزات')
+        self._owner = partition(self.store, self.shards, self.mode).astype(np.uint16)
+        self._df = None
+        missing = []
+        for i, address in enumerate(self._addresses):
+            try:
+                hello = _hello(address)
+            except (FileNotFoundError, ConnectionRefusedError):
+                missing.append(i)
+                continue
+            if hello['version'] != self.store.version:
+                self._call(i, 'reload')
+        if missing:
+            if not self._owned:
+                atexit.register(self.close)
+            self._owned += start_shards(self.shards, self.mode, missing, self.socket_dir,
+                                        self.csv_path, self.store_dir)
+        logger.info(f"✅ قاعدة بيانات مجزأة: {self.store.n_rows} صف على {self.shards} shard ({self.mode})")
+
+    def close(self):
+        """إغلاق الاتصالات وإيقاف الأجزاء التي شغلها هذا المنسق (الأجزاء المشتركة تبقى)"""
+        for pool in self._pools:
+            while not pool.empty():
+                pool.get_nowait().close()
+        if os.getpid() == self._owner_pid:
+            stop_shards(self._owned)
+            self._owned = []
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """الجدول الكامل لمن يحتاجه (الرسوم البيانية، بديل predict-row) - يُبنى عند أول استخدام"""
+        if self._df is None:
+            self._df = self.store.frame(restore_dtypes=True)
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+
+    def refresh(self):
+        """إعادة تحميل المخزن في المنسق وكل الأجزاء"""
+        self.load_data()  # الأجزاء ذات النسخة القديمة تُعاد تحميلها هناك
+        logger.info("✅ تم تحديث البيانات")
+
+    # --- النقل ---
+    def _acquire(self, i: int):
+        try:
+            return self._pools[i].get_nowait()
+        except queue.Empty:
+            return Client(self._addresses[i], family='AF_UNIX', authkey=_authkey())
+
+    def _scatter(self, op: str, *args, shards=None) -> List[Any]:
+        """إرسال op لكل الأجزاء أولاً ثم جمع الردود بالترتيب (تعمل الأجزاء بالتوازي)"""
+        targets = list(range(self.shards)) if shards is None else list(shards)
+        start = time.perf_counter()
+        conns, results = {}, []
+        try:
+            for i in targets:
+                conns[i] = self._acquire(i)
+                conns[i].send((op, args))
+            for i in targets:
+                if not conns[i].poll(REPLY_TIMEOUT):
+                    raise TimeoutError(f'shard {i}: لا رد على {op} خلال {REPLY_TIMEOUT}s')
+                status, value = conns[i].recv()
+                if status != 'ok':
+                    raise RuntimeError(f'shard {i}: {value}')
+                results.append(value)
+        except Exception:
+            for conn in conns.values():  # حالة البروتوكول غير معروفة: لا تُعاد للمجمع
+                conn.close()
+            raise
+        for i, conn in conns.items():
+            self._pools[i].put(conn)
+        QUERY_SECONDS.labels(op=op).observe(time.perf_counter() - start)
+        return results
+
+    def _call(self, i: int, op: str, *args):
+        return self._scatter(op, *args, shards=[i])[0]
+
+    @staticmethod
+    def _merge_rows(parts, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """دمج (أرقام صفوف، سجلات) من الأجزاء بترتيب الجدول ثم قص [start:stop]"""
+        rows = np.concatenate([p[0] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+        records = [r for p in parts for r in p[1]]
+        order = np.argsort(rows, kind='stable')[start:stop]
+        return [records[k] for k in order]
+
+    # --- الاستعلامات ---
+    def get_all_cars(self, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+        try:
+            # نفس دلالات iloc[offset:offset+limit] في الجدول الكامل
+            start, stop, _ = slice(offset, offset + limit if limit else None).indices(self.get_row_count())
+            if start >= stop:
+                return []
+            return self._merge_rows(self._scatter('page', start, stop))
+        except Exception as e:
+            logger.error(f"خطأ في get_all_cars: {e}")
+            return []
+
+    def get_car_by_index(self, index: int) -> Optional[Dict[str, Any]]:
+        try:
+            if 0 <= index < self.get_row_count():
+                return self._call(int(self._owner[index]), 'row', int(index))
+            return None
+        except Exception as e:
+            logger.error(f"خطأ في get_car_by_index: {e}")
+            return None
+
+    def get_row_count(self) -> int:
+        return self.store.n_rows if self.store is not None else 0
+
+    def search_page(self, query: str, column: str = 'name_le', limit: int = None,
+                    offset: int = 0) -> Dict[str, Any]:
+        try:
+            k = offset + limit if limit else None
+            parts = [p for p in self._scatter('search', query, column, k) if p is not None]
+            if not parts:
+                return {'results': [], 'total': 0}
+            return {'results': self._merge_rows(parts, offset, k), 'total': sum(p[2] for p in parts)}
+        except Exception as e:
+            logger.error(f"خطأ في search_cars: {e}")
+            return {'results': [], 'total': 0}
+
+    def get_top_cars(self, column: str, k: int = 10, largest: bool = True) -> List[Dict[str, Any]]:
+        try:
+            parts = [p for p in self._scatter('top', column, int(k), bool(largest)) if p is not None]
+            if not parts:
+                return []
+            values = np.concatenate([p[0] for p in parts])
+            rows = np.concatenate([p[1] for p in parts])
+            records = [r for p in parts for r in p[2]]
+            order = np.lexsort((rows, -values if largest else values))[:k]
+            cars = [records[j] for j in order]
+            for car, j in zip(cars, order):
+                car['row_index'] = int(rows[j])
+            return cars
+        except Exception as e:
+            logger.error(f"خطأ في get_top_cars: {e}")
+            return []
+
+    def get_statistics(self) -> Dict[str, Any]:
+        try:
+            parts = self._scatter('stats')
+            return {
+                'total_cars': sum(p['rows'] for p in parts),
+                'columns': parts[0]['columns'],
+                'numeric_columns': parts[0]['numeric_columns'],
+                'categorical_columns': parts[0]['categorical_columns'],
+                'memory_usage': str(sum(p['memory_usage'] for p in parts)),
+                'shards': self.shards,
+                'shard_mode': self.mode,
+            }
+        except Exception as e:
+            logger.error(f"خطأ في get_statistics: {e}")
+            return {}
+
+    def get_data_range(self, column: str) -> Dict[str, Any]:
+        try:
+            parts = self._scatter('moments', column)
+            if any(p is None for p in parts):
+                return {}
+            n, mean, m2 = 0, 0.0, 0.0
+            for pn, _, _, pmean, pm2 in parts:
+                if pn == 0:
+                    continue
+                total = n + pn
+                delta = pmean - mean
+                mean += delta * pn / total
+                m2 += pm2 + delta * delta * n * pn / total
+                n = total
+            if n == 0:
+                return {key: float('nan') for key in ('min', 'max', 'mean', 'median', 'std')}
+            lo, hi = min(p[1] for p in parts), max(p[2] for p in parts)
+            return {
+                'min': float(lo),
+                'max': float(hi),
+                'mean': float(mean),
+                'median': self._median(column, n, lo, hi),
+                'std': float(np.sqrt(m2 / (n - 1))) if n > 1 else float('nan'),
+            }
+        except Exception as e:
+            logger.error(f"خطأ في get_data_range: {e}")
+            return {}
+
+    def _median(self, column: str, n: int, lo: float, hi: float) -> float:
+        """وسيط دقيق: مدرج تكراري مشترك يحدد الخانات، ثم القيم المميزة داخلها فقط"""
+        if lo == hi:
+            return float(lo)
+        edges = np.linspace(lo, hi, MEDIAN_BINS + 1)
+        cumulative = np.cumsum(np.sum(self._scatter('histogram', column, edges), axis=0))
+        ranks = ((n - 1) // 2, n // 2)
+        bins = [int(np.searchsorted(cumulative, r, side='right')) for r in ranks]
+        parts = self._scatter('bin_values', column, edges, sorted(set(bins)))
+        picked = []
+        for rank, b in zip(ranks, bins):
+            values = np.concatenate([p[b][0] for p in parts])
+            counts = np.concatenate([p[b][1] for p in parts])
+            order = np.argsort(values, kind='stable')
+            position = rank - (int(cumulative[b - 1]) if b else 0)
+            picked.append(values[order][np.searchsorted(np.cumsum(counts[order]), position, side='right')])
+        return float((picked[0] + picked[1]) / 2)
+
+    def status(self) -> Dict[str, Any]:
+        return {'shards': self._scatter('hello'), 'mode': self.mode, 'socket_dir': str(self.socket_dir),
+                'owned': [p.pid for p in self._owned]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run local car-database shard processes')
+    parser.add_argument('--shards', type=int, required=True, help='number of shards')
+    parser.add_argument('--mode', choices=MODES, default=DEFAULT_MODE)
+    parser.add_argument('--dir', default=str(SOCKET_DIR), help='socket directory')
+    parser.add_argument('--csv', default=str(BASE_DIR / 'dataset' / 'cleaned_cars.csv'))
+    parser.add_argument('--store-dir', default=str(STORE_DIR))
+    parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--parent', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.serve is not None:
+        serve_shard(args.serve, args.shards, args.mode, Path(args.dir), Path(args.csv), Path(args.store_dir),
+                    args.parent)
+        return
+    # تشغيل كل الأجزاء من هذه العملية وإبقاؤها حتى Ctrl+C
+    open_feature_store(Path(args.store_dir), csv_path=Path(args.csv), build_if_missing=True)
+    procs = start_shards(args.shards, args.mode, socket_dir=Path(args.dir), csv_path=Path(args.csv),
+                         store_dir=Path(args.store_dir))
+    print(f"🧩 {args.shards} shard تعمل - DB_SHARD_AUTHKEY={os.environ['DB_SHARD_AUTHKEY']}")
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_shards(procs)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,4 +2,10 @@
 set -e
 
 # تشغيل التطبيق مع Gunicorn
-exec gunicorn --bind 0.0.0.0:$PORT --workers 1 --timeout 120 --access-logfile - --error-logfile - wsgi:app
+# الإعدادات قابلة للتعديل عبر متغيرات البيئة (راجع benchmarks/load_test.py لاختيار القيم)
+exec gunicorn --bind 0.0.0.0:$PORT \
+    --workers ${WEB_CONCURRENCY:-1} \
+    --threads ${GUNICORN_THREADS:-1} \
+    --worker-class ${GUNICORN_WORKER_CLASS:-sync} \
+    --timeout ${GUNICORN_TIMEOUT:-120} \
+    --access-logfile - --error-logfile - wsgi:app
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""إعداد مشترك للاختبارات: تشغيل من جذر المستودع ومقاييس في مجلد مؤقت"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='car-price-test-metrics-'))
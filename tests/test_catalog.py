@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""فروق الكتالوج: الفرق المركب منذ أي نسخة يساوي الفرق المباشر بين اللقطتين"""
+
+import copy
+
+import pytest
+
+from catalog import Catalog, compose_diffs, diff_snapshots, publish
+
+BASE = {
+    'names': ['a', 'b', 'c'],
+    'fuel_types': ['Diesel', 'Petrol'],
+    'seller_types': ['Dealer', 'Individual'],
+    'transmissions': ['Automatic', 'Manual'],
+    'owner_counts': ['1', '2'],
+    'ranges': {'km': {'min': 1, 'max': 10}, 'seats': {'min': 2, 'max': 9}},
+}
+
+
+def _edit(snapshot, names=None, ranges=None):
+    out = copy.deepcopy(snapshot)
+    if names is not None:
+        out['names'] = sorted(names)
+    for key, value in (ranges or {}).items():
+        if value is None:
+            out['ranges'].pop(key, None)
+        else:
+            out['ranges'][key] = value
+    return out
+
+
+def _apply(snapshot, changes):
+    """تطبيق فرق كما يفعل العميل"""
+    out = copy.deepcopy(snapshot)
+    for section, change in changes.items():
+        if isinstance(out.get(section), dict):
+            for key in change['removed']:
+                out[section].pop(key, None)
+            out[section].update(change['added'])
+        else:
+            out[section] = sorted((set(out.get(section, [])) - set(change['removed'])) | set(change['added']))
+    return out
+
+
+SEQUENCES = {
+    'change_then_delete_range': [_edit(BASE, ranges={'seats': {'min': 2, 'max': 10}}),
+                                 _edit(BASE, ranges={'seats': None})],
+    'remove_readd_remove': [_edit(BASE, names=['b', 'c']), BASE, _edit(BASE, names=['b', 'c'])],
+    'add_then_remove': [_edit(BASE, names=['a', 'b', 'c', 'd']), BASE],
+    'remove_then_readd': [_edit(BASE, names=['a', 'b']), BASE],
+    'add_range_then_delete': [_edit(BASE, ranges={'power': {'min': 30, 'max': 400}}), BASE],
+}
+
+
+@pytest.mark.parametrize('name', sorted(SEQUENCES))
+def test_compose_matches_direct_diff(name):
+    snapshots = [BASE] + SEQUENCES[name]
+    diffs = [diff_snapshots(a, b) for a, b in zip(snapshots, snapshots[1:])]
+    composed = compose_diffs(diffs)
+    assert _apply(BASE, composed) == snapshots[-1]
+    # لا إضافات زائفة: كل مضاف يختلف فعلاً عن البداية
+    direct = diff_snapshots(BASE, snapshots[-1])
+    for section, change in composed.items():
+        assert set(change['added']) == set(direct.get(section, {}).get('added', []))
+
+
+def test_catalog_delta_keeps_removals(tmp_path):
+    publish(BASE, tmp_path)
+    publish(_edit(BASE, ranges={'seats': {'min': 2, 'max': 10}}), tmp_path)
+    publish(_edit(BASE, names=['b', 'c'], ranges={'seats': None}), tmp_path)
+    publish(_edit(BASE, ranges={'seats': None}), tmp_path)
+    publish(_edit(BASE, names=['b', 'c'], ranges={'seats': None}), tmp_path)
+    delta = Catalog(tmp_path).delta(1)
+    assert not delta['full']
+    assert delta['changes'] == {'names': {'added': [], 'removed': ['a']},
+                                'ranges': {'added': {}, 'removed': ['seats']}}
+
+
+def test_unknown_versions_are_not_cached(tmp_path):
+    publish(BASE, tmp_path)
+    publish(_edit(BASE, names=['b', 'c']), tmp_path)
+    catalog = Catalog(tmp_path)
+    for since in (0, 3, 2 ** 63 - 1):
+        delta = catalog.delta(since)
+        assert delta['full'] and delta['changes'] is catalog.full()
+    catalog.delta(1)
+    assert set(catalog._deltas) == {1}
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""النموذج المضغوط: نفس اتجاه التقسيم الذي يأخذه LightGBM عند العتبات"""
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+import compact_model
+
+
+@pytest.fixture(scope='module')
+def booster():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 3))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=2000)
+    return lgb.train({'objective': 'regression', 'num_leaves': 15, 'verbose': -1},
+                     lgb.Dataset(X, y), num_boost_round=20)
+
+
+def _split_thresholds(node, out):
+    if 'split_index' in node:
+        out.append((node['split_feature'], node['threshold']))
+        _split_thresholds(node['left_child'], out)
+        _split_thresholds(node['right_child'], out)
+    return out
+
+
+def test_values_at_float32_rounded_threshold(booster, tmp_path):
+    path = tmp_path / 'model.compact'
+    compact_model.write_compact(compact_model.compact(booster, None, ['a', 'b', 'c'], 'test'), path)
+    model = compact_model.load(path)
+
+    splits = []
+    for tree in booster.dump_model()['tree_info']:
+        _split_thresholds(tree['tree_structure'], splits)
+    rows = []
+    for feature, t in splits:
+        t32 = np.float32(t)
+        if float(t32) < t:
+            t32 = np.nextafter(t32, np.float32(np.inf))
+        if float(t32) == t:
+            continue
+        # قيمة float32 من مخزن الميزات تساوي العتبة المقربة تماماً: LightGBM يذهب يميناً
+        row = np.zeros(3)
+        row[feature] = float(t32)
+        rows.append(row)
+    assert rows
+    X = np.asarray(rows)
+    np.testing.assert_allclose(model.predict(X), booster.predict(X), rtol=0, atol=1e-5)
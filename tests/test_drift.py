@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""مراقبة الانحراف: إعادة إدخال صفوف التدريب يجب ألا تُظهر انحرافاً"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import BASE_DIR
+from drift import DriftMonitor
+from encoding import listing_columns
+from feature_store import open_feature_store
+
+REPLAY_ROWS = 3000
+
+
+@pytest.fixture(scope='module')
+def monitor():
+    store = open_feature_store(build_if_missing=True)
+    if store is None:
+        pytest.skip('مخزن الميزات غير متاح')
+    scaler = json.loads((BASE_DIR / 'scaler_params.json').read_text(encoding='utf-8'))
+    name_le = json.loads((BASE_DIR / 'name_le_mapping.json').read_text(encoding='utf-8'))
+    return DriftMonitor(np.asarray(store.X), store.features, scaler, name_le, window_seconds=3600)
+
+
+def _training_records(n):
+    frame = pd.read_csv(BASE_DIR / 'dataset' / 'cardekho.csv').dropna().head(n)
+    columns = listing_columns(frame)
+    return [{field: values[i] for field, values in columns.items()} for i in range(len(frame))]
+
+
+def test_replayed_training_records_are_stable(monitor):
+    for record in _training_records(REPLAY_ROWS):
+        monitor.observe_record('test', record)
+    status = monitor.status()
+    worst = {name: entry['psi'] for name, entry in status['features'].items() if entry['psi'] > 0.1}
+    assert status['status'] == 'stable', worst
+
+
+def test_record_value_matches_store_precision(monitor):
+    # seats=5 يجب أن يساوي تماماً قيمته المرمّزة في مخزن الميزات (float32)
+    seats = np.asarray(open_feature_store().column('seats'))
+    values, counts = np.unique(seats, return_counts=True)
+    assert monitor._record_value('seats', {'seats': 5}) == float(values[counts.argmax()])
+
+
+def test_missing_values_are_counted_separately(monitor):
+    fresh = DriftMonitor(np.asarray(open_feature_store().X), monitor.feature_names,
+                         {'means': monitor._means, 'scales': monitor._scales}, monitor.name_le_map)
+    X = np.asarray(open_feature_store().X[:500], dtype=np.float64).copy()
+    col = fresh.numeric.index('mileage')
+    X[:100, fresh.feature_names.index('mileage')] = np.nan
+    fresh.observe('test', X)
+    fresh.observe_record('test', {'mileage': float('nan'), 'year': float('nan')})
+    entry = fresh.status()['features']['mileage']
+    assert entry['missing'] == 101
+    assert entry['rows'] == 400
+    assert entry['below_range'] == 0
+    # بقية الميزات لم تتأثر بخانة المفقود
+    assert fresh.status()['features'][fresh.numeric[(col + 1) % len(fresh.numeric)]]['missing'] == 0
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""مخزن الميزات: اكتشاف المصدر المتغير وقيم العرض بدقة CSV"""
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from feature_store import DATA_PATH, open_feature_store
+
+
+@pytest.fixture
+def source(tmp_path):
+    csv_path = tmp_path / 'cleaned_cars.csv'
+    shutil.copy(DATA_PATH, csv_path)
+    return csv_path
+
+
+def test_same_size_edit_is_stale(source, tmp_path):
+    store_dir = tmp_path / 'store'
+    version = open_feature_store(store_dir, source, build_if_missing=True).version
+    lines = source.read_text(encoding='utf-8').split('\n')
+    price = lines[1].split(',', 1)[0]
+    lines[1] = lines[1].replace(price, price[:-1] + str((int(price[-1]) + 1) % 10), 1)
+    source.write_text('\n'.join(lines), encoding='utf-8')
+    assert open_feature_store(store_dir, source) is None
+    assert open_feature_store(store_dir, source, build_if_missing=True).version != version
+
+
+def test_touch_keeps_store(source, tmp_path):
+    store_dir = tmp_path / 'store'
+    version = open_feature_store(store_dir, source, build_if_missing=True).version
+    os.utime(source, ns=(0, 0))
+    assert open_feature_store(store_dir, source).version == version
+
+
+def test_restored_frame_matches_csv(source, tmp_path):
+    store = open_feature_store(tmp_path / 'store', source, build_if_missing=True)
+    expected = pd.read_csv(source, float_precision='round_trip')
+    frame = store.frame(restore_dtypes=True)[expected.columns]
+    pd.testing.assert_frame_equal(frame.reset_index(drop=True), expected)
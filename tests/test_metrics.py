@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""المقاييس: تشغيل جديد بدون gunicorn لا يرث عدادات عمليات منتهية"""
+
+import os
+import subprocess
+import sys
+
+from conftest import BASE_DIR
+
+SCRIPT = f'''
+import sys
+sys.path.insert(0, {str(BASE_DIR)!r})
+import metrics
+metrics.counter('runs_total', 'runs').labels().inc()
+print([line for line in metrics.render().splitlines() if line.startswith('runs_total')][0])
+'''
+
+
+def _run(metrics_dir):
+    env = dict(os.environ, METRICS_DIR=str(metrics_dir))
+    out = subprocess.run([sys.executable, '-c', SCRIPT], env=env, capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+def test_standalone_run_prunes_dead_processes(tmp_path):
+    assert _run(tmp_path) == 'runs_total{} 1'
+    assert _run(tmp_path) == 'runs_total{} 1'
+
+
+def test_live_owner_keeps_dead_worker_counters(tmp_path):
+    # مالك حي (مثل master في gunicorn): عدادات العمال المنتهين تبقى
+    (tmp_path / 'owner.pid').write_text(str(os.getpid()), encoding='utf-8')
+    assert _run(tmp_path) == 'runs_total{} 1'
+    assert _run(tmp_path) == 'runs_total{} 2'
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""الوضع المجزأ: نتائج الدمج من عمليات shard تطابق CarDatabase على نفس المخزن"""
+
+import math
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from database import CarDatabase
+from feature_store import DATA_PATH, build_feature_store
+from sharded_database import ShardedCarDatabase
+
+NUMERIC = ['selling_price', 'km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age']
+
+
+def _same(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    work = tmp_path_factory.mktemp('shards')
+    csv_path = work / 'cleaned_cars.csv'
+    shutil.copy(DATA_PATH, csv_path)
+    build_feature_store(csv_path, work / 'store')
+    return csv_path, work / 'store'
+
+
+@pytest.fixture(scope='module')
+def single(store):
+    return CarDatabase(str(store[0]), store[1])
+
+
+@pytest.fixture(scope='module', params=[('hash', 2), ('range', 3)], ids=['hash-2', 'range-3'])
+def sharded(request, store):
+    mode, count = request.param
+    # مسار socket قصير (حد AF_UNIX ~108 حرفاً)
+    socket_dir = Path(tempfile.mkdtemp(prefix='shards-'))
+    db = ShardedCarDatabase(str(store[0]), shards=count, mode=mode, store_dir=store[1], socket_dir=socket_dir)
+    yield db
+    db.close()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def test_pages_follow_global_row_order(single, sharded):
+    n = single.get_row_count()
+    assert sharded.get_row_count() == n
+    for offset, limit in ((0, 50), (n // 2, 100), (n - 7, 50), (n, 10)):
+        assert _same(sharded.get_all_cars(limit=limit, offset=offset), single.get_all_cars(limit=limit, offset=offset))
+
+
+def test_row_lookup(single, sharded):
+    n = single.get_row_count()
+    for index in (0, 1, n // 3, n - 1):
+        assert _same(sharded.get_car_by_index(index), single.get_car_by_index(index))
+    assert sharded.get_car_by_index(n) is None
+
+
+@pytest.mark.parametrize('query,column', [('1', 'km_driven'), ('1305', 'name_le'), ('no-such-value', 'name_le')])
+def test_search_page_and_total(single, sharded, query, column):
+    for offset, limit in ((0, 20), (15, 40), (0, None)):
+        assert _same(sharded.search_page(query, column, limit=limit, offset=offset),
+                     single.search_page(query, column, limit=limit, offset=offset))
+
+
+@pytest.mark.parametrize('column', ['selling_price', 'seats', 'car_age'])
+@pytest.mark.parametrize('largest', [True, False])
+def test_top_k_with_ties(single, sharded, column, largest):
+    # seats مليء بالقيم المتساوية: الترتيب يُحسم برقم الصف كما في الإطار الواحد
+    assert _same(sharded.get_top_cars(column, 25, largest), single.get_top_cars(column, 25, largest))
+
+
+@pytest.mark.parametrize('column', NUMERIC)
+def test_data_range_moments_and_exact_median(single, sharded, column):
+    assert _same(sharded.get_data_range(column), single.get_data_range(column))
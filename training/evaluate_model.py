@@ -1,200 +1,491 @@
 """
-📊 Model Evaluation and Visualization
-تقييم وتصور أداء النموذج
+📊 Model Evaluation Harness
+تقييم أداء النموذج: مقاييس عامة ومقسّمة + فترات ثقة Bootstrap + مقارنة مع خط الأساس
+
+Scores a model on the shared feature store, computes RMSE / MAE / MAPE
+globally and per slice (fuel, transmission, seller, owner, age bucket, price
+decile) in a single vectorized pass, adds bootstrap confidence intervals, writes
+a JSON report and compares it against a stored baseline.
+
+Usage (from the ``training`` directory):
+    python evaluate_model.py                          # evaluate ../lgbm_model.pkl on the held-out split
+    python evaluate_model.py --model cand.pkl --bootstrap 2000
+    python evaluate_model.py --split all              # every row (includes training rows)
+    python evaluate_model.py --write-baseline         # accept current report as baseline
+    python evaluate_model.py --plot                   # also render model_evaluation.png
+    python evaluate_model.py --tiers --write-tiers    # speed/accuracy curve + fast-tier cutoff
 """
 
-import pandas as pd
-import numpy as np
+import argparse
+import hashlib
 import json
 import joblib
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error, mean_absolute_percentage_error
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# ===== CONFIGURATION =====
-plt.style.use('seaborn-v0_8-darkgrid')
-sns.set_palette("husl")
-
-# ===== PATHS =====
-DATA_PATH = Path('../dataset/cleaned_cars.csv')
-MODEL_PATH = Path('../lgbm_model.pkl')
-FEATURES_PATH = Path('../lgbm_features.txt')
-META_PATH = Path('../lgbm_meta.json')
-SCALER_PATH = Path('../scaler_params.json')
-NAME_MAPPING_PATH = Path('../name_le_mapping.json')
-
-print("=" * 60)
-print("📊 Model Evaluation")
-print("=" * 60)
 
-# ===== 1. LOAD DATA =====
-print("\n📂 Loading data...")
-df = pd.read_csv(DATA_PATH)
-model = joblib.load(MODEL_PATH)
-
-with open(FEATURES_PATH, 'r') as f:
-    feature_names = [line.strip() for line in f if line.strip()]
-
-with open(META_PATH, 'r') as f:
-    meta = json.load(f)
+import numpy as np
+from sklearn.model_selection import train_test_split
 
-with open(SCALER_PATH, 'r') as f:
-    scaler_params = json.load(f)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import concurrency
+from feature_store import open_feature_store
 
-with open(NAME_MAPPING_PATH, 'r') as f:
-    name_mapping = json.load(f)
-
-print(f"✅ Data loaded: {df.shape[0]} rows")
-print(f"✅ Model loaded with {len(feature_names)} features")
+# ===== CONFIGURATION =====
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+DEFAULT_BOOTSTRAP = 1000
+BOOTSTRAP_BLOCK = 250          # resamples per matrix block (bounds memory)
+CI_LEVEL = 0.95
+REGRESSION_TOLERANCE = 0.02    # relative worsening allowed before flagging
+MIN_SLICE_ROWS = 30            # smaller slices are reported but never flagged
+AGE_BUCKETS = [0, 4, 7, 10, 15, np.inf]
+METRICS = ('rmse', 'mae', 'mape')
+TIER_CUTOFFS = (25, 50, 75, 100, 150, 200, 300, 400, 500)
+DEFAULT_TIER_BUDGET = 0.03     # p95 relative deviation from the full model allowed for tier=fast
+TIER_LATENCY_ROWS = 200
 
-# ===== 2. PREPARE DATA =====
-print("\n🔧 Preparing data...")
-
-df['car_age'] = 2025 - df['year']
-X = df.drop(columns=['selling_price'])
-y = df['selling_price']
-
-# Encode
-name_le = LabelEncoder()
-name_le.fit(X['name'])
-X['name_le'] = name_le.transform(X['name'])
-X = X.drop(columns=['name'])
-
-# One-hot encode
-categorical_cols = ['fuel', 'seller_type', 'transmission', 'owner']
-X_encoded = pd.get_dummies(X, columns=categorical_cols, drop_first=False)
-
-# Scale
-numerical_cols = ['km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age']
-scaler = StandardScaler()
-X_scaled = X_encoded.copy()
-X_scaled[numerical_cols] = scaler.fit_transform(X_encoded[numerical_cols])
-
-# Align with training features
-X_scaled = X_scaled.reindex(columns=feature_names, fill_value=0)
-
-# Transform target
-y_transformed = np.log1p(y)
-
-print(f"✅ Data prepared: {X_scaled.shape}")
-
-# ===== 3. PREDICTIONS =====
-print("\n🤖 Making predictions...")
-
-y_pred_transformed = model.predict(X_scaled)
-y_pred = np.expm1(y_pred_transformed)
-
-print(f"✅ Predictions made for {len(y_pred)} samples")
-
-# ===== 4. METRICS =====
-print("\n📈 Model Metrics:")
-
-rmse = np.sqrt(mean_squared_error(y, y_pred))
-mae = mean_absolute_error(y, y_pred)
-r2 = r2_score(y_transformed, y_pred_transformed)
-mape = mean_absolute_percentage_error(y, y_pred)
-
-print(f"  - RMSE: ₹{rmse:.2f}")
-print(f"  - MAE: ₹{mae:.2f}")
-print(f"  - MAPE: {mape:.2f}%")
-print(f"  - R² Score: {r2:.4f}")
-
-# ===== 5. RESIDUALS ANALYSIS =====
-print("\n📊 Residuals Analysis:")
-
-residuals = y - y_pred
-residuals_pct = (residuals / y) * 100
-
-print(f"  - Mean residual: ₹{residuals.mean():.2f}")
-print(f"  - Std residual: ₹{residuals.std():.2f}")
-print(f"  - Min residual: ₹{residuals.min():.2f}")
-print(f"  - Max residual: ₹{residuals.max():.2f}")
-print(f"  - Mean % error: {residuals_pct.mean():.2f}%")
-
-# ===== 6. FEATURE IMPORTANCE =====
-print("\n🎯 Top 15 Important Features:")
-
-feature_importance = pd.DataFrame({
-    'feature': feature_names,
-    'importance': model.feature_importance()
-}).sort_values('importance', ascending=False)
-
-for idx, (_, row) in enumerate(feature_importance.head(15).iterrows(), 1):
-    print(f"  {idx:2d}. {row['feature']:30s} {row['importance']:8.4f}")
-
-# ===== 7. VISUALIZATION =====
-print("\n📊 Creating visualizations...")
-
-fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-fig.suptitle('🚗 Car Price Prediction Model Evaluation', fontsize=16, fontweight='bold')
-
-# Plot 1: Actual vs Predicted
-ax1 = axes[0, 0]
-ax1.scatter(y, y_pred, alpha=0.5, s=20)
-ax1.plot([y.min(), y.max()], [y.min(), y.max()], 'r--', lw=2)
-ax1.set_xlabel('Actual Price (₹)')
-ax1.set_ylabel('Predicted Price (₹)')
-ax1.set_title(f'Actual vs Predicted (R² = {r2:.4f})')
-ax1.grid(True, alpha=0.3)
-
-# Plot 2: Residuals
-ax2 = axes[0, 1]
-ax2.scatter(y_pred, residuals, alpha=0.5, s=20)
-ax2.axhline(y=0, color='r', linestyle='--', lw=2)
-ax2.set_xlabel('Predicted Price (₹)')
-ax2.set_ylabel('Residuals (₹)')
-ax2.set_title('Residual Plot')
-ax2.grid(True, alpha=0.3)
-
-# Plot 3: Feature Importance
-ax3 = axes[1, 0]
-top_features = feature_importance.head(10)
-ax3.barh(range(len(top_features)), top_features['importance'].values)
-ax3.set_yticks(range(len(top_features)))
-ax3.set_yticklabels(top_features['feature'].values)
-ax3.set_xlabel('Importance')
-ax3.set_title('Top 10 Feature Importance')
-ax3.invert_yaxis()
-
-# Plot 4: Error Distribution
-ax4 = axes[1, 1]
-ax4.hist(residuals_pct, bins=50, edgecolor='black', alpha=0.7)
-ax4.axvline(x=residuals_pct.mean(), color='r', linestyle='--', lw=2, label=f'Mean: {residuals_pct.mean():.2f}%')
-ax4.set_xlabel('Percentage Error (%)')
-ax4.set_ylabel('Frequency')
-ax4.set_title('Error Distribution')
-ax4.legend()
-ax4.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('../model_evaluation.png', dpi=300, bbox_inches='tight')
-print("✅ Visualization saved: model_evaluation.png")
-
-# ===== 8. SAMPLE PREDICTIONS =====
-print("\n🎯 Sample Predictions:")
-print("-" * 80)
-print(f"{'Car':<20} {'Actual Price':<15} {'Predicted':<15} {'Error %':<10}")
-print("-" * 80)
-
-sample_indices = np.random.choice(len(df), min(10, len(df)), replace=False)
-for idx in sample_indices:
-    car_name = df.iloc[idx]['name']
-    actual = y.iloc[idx]
-    predicted = y_pred.iloc[idx]
-    error_pct = ((predicted - actual) / actual) * 100
-    print(f"{car_name:<20} ₹{actual:<14,.0f} ₹{predicted:<14,.0f} {error_pct:>8.2f}%")
-
-print("-" * 80)
-
-# ===== 9. SUMMARY =====
-print("\n" + "=" * 60)
-print("✅ Evaluation completed!")
-print("=" * 60)
-print(f"\n📊 Summary:")
-print(f"  - RMSE: ₹{rmse:.2f}")
-print(f"  - MAE: ₹{mae:.2f}")
-print(f"  - R² Score: {r2:.4f}")
-print(f"  - Mean Error: {residuals_pct.mean():.2f}%")
-print(f"\n📈 Visualization saved: model_evaluation.png")
+# ===== PATHS =====
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / 'lgbm_model.pkl'
+FEATURES_PATH = BASE_DIR / 'lgbm_features.txt'
+META_PATH = BASE_DIR / 'lgbm_meta.json'
+REPORT_PATH = BASE_DIR / 'training' / 'reports' / 'eval_report.json'
+BASELINE_PATH = BASE_DIR / 'training' / 'eval_baseline.json'
+FIGURE_PATH = BASE_DIR / 'model_evaluation.png'
+
+
+# ===== 1. LOAD =====
+def load_inputs(model_path):
+    """Open the feature store and the model to evaluate."""
+    store = open_feature_store(build_if_missing=True)
+    if store is None:
+        print("❌ Error: feature store unavailable (run feature_store.py)")
+        raise SystemExit(1)
+    model = joblib.load(model_path)
+    feature_names = [f for f in FEATURES_PATH.read_text(encoding='utf-8').splitlines() if f]
+    meta = json.loads(META_PATH.read_text(encoding='utf-8')) if META_PATH.exists() else {}
+    return store, model, feature_names, meta
+
+
+def select_rows(n_rows, split):
+    """Row indices to evaluate: all rows or the train_model.py test split."""
+    if split == 'all':
+        return np.arange(n_rows)
+    _, test_idx = train_test_split(np.arange(n_rows), test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    return np.sort(test_idx)
+
+
+# ===== 2. PREDICT =====
+def predict_prices(model, store, feature_names, rows, meta, num_iteration=None):
+    """Vectorized prediction in price units for the selected rows."""
+    if store.features == feature_names:
+        X = store.X[rows]
+    else:
+        X = store.frame(with_target=False).reindex(columns=feature_names, fill_value=0).to_numpy()[rows]
+    if num_iteration is None:
+        num_iteration = getattr(model, 'best_iteration_', None) or meta.get('best_iteration')
+    raw = model.predict(X, num_iteration=num_iteration, num_threads=concurrency.offline_threads())
+    if meta.get('target_transform', 'log1p') == 'log1p':
+        raw = np.expm1(raw)
+    return np.clip(raw, 0.0, None)
+
+
+# ===== 3. SLICES =====
+def build_slices(store, rows, y_true):
+    """
+    Integer slice codes per dimension, stacked into one global code space.
+
+    Returns (codes, labels): ``codes`` is (n_dims, n_rows) with a global slice
+    id per row and dimension; ``labels[k]`` is ``(dimension, level)``.
+    """
+    meta = store.meta[rows]
+    levels = store.category_levels
+    dims = {
+        'fuel': (meta['fuel'].astype(np.int64), levels.get('fuel', [])),
+        'transmission': (meta['trans'].astype(np.int64), levels.get('trans', [])),
+        'seller': (meta['seller'].astype(np.int64), levels.get('seller', [])),
+        'owner': (meta['owner'].astype(np.int64), levels.get('owner', [])),
+    }
+
+    age_codes = np.searchsorted(AGE_BUCKETS, meta['car_age'], side='right') - 1
+    age_labels = [
+        f"{int(lo)}-{int(hi) - 1}y" if np.isfinite(hi) else f"{int(lo)}y+"
+        for lo, hi in zip(AGE_BUCKETS[:-1], AGE_BUCKETS[1:])
+    ]
+    dims['age_bucket'] = (np.clip(age_codes, 0, len(age_labels) - 1), age_labels)
+
+    edges = np.quantile(y_true, np.linspace(0, 1, 11)[1:-1])
+    dims['price_decile'] = (np.searchsorted(edges, y_true, side='right'), [f"D{i + 1}" for i in range(10)])
+
+    codes, labels, offset = [], [], 0
+    for dim, (dim_codes, dim_levels) in dims.items():
+        names = list(dim_levels) + ['unknown']
+        local = np.where(dim_codes < 0, len(names) - 1, dim_codes)
+        codes.append(local + offset)
+        labels.extend((dim, name) for name in names)
+        offset += len(names)
+    return np.vstack(codes), labels
+
+
+def error_terms(y_true, y_pred):
+    """Per-row squared error, absolute error and absolute percentage error."""
+    err = y_pred - y_true
+    ape = np.abs(err) / np.where(y_true == 0, np.nan, y_true)
+    return np.stack([err ** 2, np.abs(err), np.nan_to_num(ape)])
+
+
+def sliced_metrics(terms, codes, n_slices):
+    """RMSE / MAE / MAPE for every slice with one bincount per statistic."""
+    flat = codes.ravel()
+    reps = codes.shape[0]
+    n = np.bincount(flat, minlength=n_slices)
+    sums = [np.bincount(flat, weights=np.tile(t, reps), minlength=n_slices) for t in terms]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n, np.sqrt(sums[0] / n), sums[1] / n, sums[2] / n
+
+
+# ===== 4. BOOTSTRAP =====
+def _bootstrap_block(args):
+    """
+    One block of Poisson-bootstrap resamples as a single matrix product.
+
+    Weights W (B, n) ~ Poisson(1) replace explicit index resampling; slice sums
+    for every resample are W @ [indicator * term] in one BLAS call.
+    """
+    design, seed, size = args
+    rng = np.random.default_rng(seed)
+    W = rng.poisson(1.0, size=(size, design.shape[0])).astype(np.float32)
+    return W @ design
+
+
+def bootstrap_intervals(terms, codes, n_slices, n_boot, jobs=1, seed=RANDOM_STATE):
+    """
+    Confidence intervals for global and per-slice metrics.
+
+    Returns dict metric -> (lo, hi) arrays of length ``n_slices + 1`` (the last
+    entry is the global metric).
+    """
+    n_rows = terms.shape[1]
+    # design matrix: [count | sq | abs | ape] per slice, plus a global column
+    ind = np.zeros((n_rows, n_slices + 1), dtype=np.float32)
+    for dim_codes in codes:
+        ind[np.arange(n_rows), dim_codes] = 1.0
+    ind[:, -1] = 1.0
+    design = np.hstack([ind] + [ind * t[:, None].astype(np.float32) for t in terms])
+
+    blocks = []
+    seeds = np.random.SeedSequence(seed).spawn((n_boot + BOOTSTRAP_BLOCK - 1) // BOOTSTRAP_BLOCK)
+    tasks = []
+    remaining = n_boot
+    for s in seeds:
+        size = min(BOOTSTRAP_BLOCK, remaining)
+        tasks.append((design, s, size))
+        remaining -= size
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            blocks = list(pool.map(_bootstrap_block, tasks))
+    else:
+        blocks = [_bootstrap_block(t) for t in tasks]
+    sums = np.vstack(blocks).astype(np.float64)
+
+    k = n_slices + 1
+    cnt = sums[:, :k]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        samples = {
+            'rmse': np.sqrt(sums[:, k:2 * k] / cnt),
+            'mae': sums[:, 2 * k:3 * k] / cnt,
+            'mape': sums[:, 3 * k:4 * k] / cnt,
+        }
+    alpha = (1.0 - CI_LEVEL) / 2
+    with warnings.catch_warnings():
+        # empty slices (e.g. no 'unknown' rows) have all-NaN columns
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            m: (np.nanquantile(v, alpha, axis=0), np.nanquantile(v, 1 - alpha, axis=0))
+            for m, v in samples.items()
+        }
+
+
+# ===== 4b. ACCURACY TIERS =====
+def _single_row_latency_us(model, X, num_iteration):
+    # زمن صف واحد كما يُخدم: خيط واحد (concurrency.predict_threads)
+    model.predict(X[:1], num_iteration=num_iteration, num_threads=1)
+    samples = np.empty(min(TIER_LATENCY_ROWS, len(X)))
+    for i in range(len(samples)):
+        t0 = time.perf_counter()
+        model.predict(X[i:i + 1], num_iteration=num_iteration, num_threads=1)
+        samples[i] = time.perf_counter() - t0
+    return float(np.median(samples)) * 1e6
+
+
+def tier_curve(model, store, feature_names, rows, meta, y_true, budget=DEFAULT_TIER_BUDGET):
+    """
+    Speed/accuracy curve over truncated ensembles and the fast-tier cutoff.
+
+    For each cutoff: accuracy against the truth, deviation from the full model
+    (what a caller of tier=fast gives up) and latency. The fast tier is the
+    smallest cutoff whose p95 relative deviation stays within ``budget``.
+    """
+    full = getattr(model, 'best_iteration_', None) or meta.get('best_iteration')
+    X = store.X[rows] if store.features == feature_names else None
+    if X is None:
+        X = store.frame(with_target=False).reindex(columns=feature_names, fill_value=0).to_numpy()[rows]
+    X = np.asarray(X, dtype=np.float64)
+
+    cutoffs = sorted({k for k in TIER_CUTOFFS if k < full} | {full})
+    y_full = predict_prices(model, store, feature_names, rows, meta, num_iteration=full)
+    curve = []
+    for k in cutoffs:
+        t0 = time.perf_counter()
+        y_k = predict_prices(model, store, feature_names, rows, meta, num_iteration=k)
+        batch_s = time.perf_counter() - t0
+        terms = error_terms(y_true, y_k)
+        dev = np.abs(y_k - y_full) / np.maximum(y_full, 1.0)
+        curve.append({
+            'iterations': int(k),
+            'mae': _num(terms[1].mean()),
+            'mape': _num(terms[2].mean()),
+            'deviation_p50': _num(np.percentile(dev, 50)),
+            'deviation_p95': _num(np.percentile(dev, 95)),
+            'deviation_max': _num(dev.max()),
+            'single_row_us': round(_single_row_latency_us(model, X, k), 2),
+            'batch_rows_per_s': round(len(rows) / batch_s, 1),
+        })
+
+    fast = next((c['iterations'] for c in curve if c['deviation_p95'] <= budget), full)
+    return {
+        'budget': {'metric': 'deviation_p95', 'value': budget},
+        'cutoffs': {'fast': int(fast), 'full': int(full)},
+        'curve': curve,
+    }
+
+
+def write_tiers(tiers, meta_path=META_PATH):
+    """Store the chosen cutoffs in lgbm_meta.json for the server."""
+    meta = json.loads(meta_path.read_text(encoding='utf-8')) if meta_path.exists() else {}
+    meta['tiers'] = {**tiers['cutoffs'], 'budget': tiers['budget']}
+    meta_path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+def print_tiers(tiers):
+    print(f"\n⚡ Accuracy tiers (budget: {tiers['budget']['metric']} ≤ {tiers['budget']['value']:.1%}):")
+    print(f"  {'iters':>6} {'MAPE':>7} {'dev p50':>8} {'dev p95':>8} {'dev max':>8} {'1-row µs':>9} {'rows/s':>10}")
+    for c in tiers['curve']:
+        mark = ' ← fast' if c['iterations'] == tiers['cutoffs']['fast'] else ''
+        mark = ' ← full' if c['iterations'] == tiers['cutoffs']['full'] else mark
+        print(f"  {c['iterations']:>6} {100 * c['mape']:>6.2f}% {100 * c['deviation_p50']:>7.2f}% "
+              f"{100 * c['deviation_p95']:>7.2f}% {100 * c['deviation_max']:>7.2f}% "
+              f"{c['single_row_us']:>9.1f} {c['batch_rows_per_s']:>10,.0f}{mark}")
+
+
+# ===== 5. REPORT =====
+def _num(x):
+    x = float(x)
+    return None if not np.isfinite(x) else round(x, 6)
+
+
+def build_report(model_path, store, rows, split, y_true, y_pred, n_boot, jobs, elapsed_predict):
+    t0 = time.perf_counter()
+    terms = error_terms(y_true, y_pred)
+    codes, labels = build_slices(store, rows, y_true)
+    n_slices = len(labels)
+    n, rmse, mae, mape = sliced_metrics(terms, codes, n_slices)
+    ci = bootstrap_intervals(terms, codes, n_slices, n_boot, jobs) if n_boot > 0 else None
+
+    y_log, p_log = np.log1p(y_true), np.log1p(y_pred)
+    ss_tot = float(np.sum((y_log - y_log.mean()) ** 2))
+    r2 = 1.0 - float(np.sum((y_log - p_log) ** 2)) / ss_tot if ss_tot else 0.0
+
+    overall = {
+        'rmse': _num(np.sqrt(terms[0].mean())),
+        'mae': _num(terms[1].mean()),
+        'mape': _num(terms[2].mean()),
+        'r2_log': _num(r2),
+    }
+    if ci is not None:
+        overall['ci'] = {m: [_num(ci[m][0][-1]), _num(ci[m][1][-1])] for m in METRICS}
+
+    slices = {}
+    for k, (dim, level) in enumerate(labels):
+        if n[k] == 0:
+            continue
+        entry = {'n': int(n[k]), 'rmse': _num(rmse[k]), 'mae': _num(mae[k]), 'mape': _num(mape[k])}
+        if ci is not None:
+            entry['ci'] = {m: [_num(ci[m][0][k]), _num(ci[m][1][k])] for m in METRICS}
+        slices.setdefault(dim, {})[level] = entry
+
+    model_bytes = Path(model_path).read_bytes()
+    return {
+        'model': {'path': str(Path(model_path).name), 'sha256': hashlib.sha256(model_bytes).hexdigest()[:16]},
+        'feature_store_version': store.version,
+        'split': split,
+        'n_rows': int(len(rows)),
+        'bootstrap': {'resamples': n_boot, 'method': 'poisson', 'ci_level': CI_LEVEL},
+        'overall': overall,
+        'slices': slices,
+        'timing_s': {'predict': round(elapsed_predict, 4), 'metrics': round(time.perf_counter() - t0, 4)},
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List metrics that got worse than the baseline by more than ``tolerance``."""
+    regressions = []
+
+    def check(scope, cur, base, n=None):
+        if n is not None and n < MIN_SLICE_ROWS:
+            return
+        for m in METRICS:
+            c, b = cur.get(m), base.get(m)
+            if c is None or b is None or b == 0:
+                continue
+            change = (c - b) / abs(b)
+            if change > tolerance:
+                regressions.append({'scope': scope, 'metric': m, 'baseline': b, 'current': c,
+                                    'change_pct': round(100 * change, 2)})
+
+    check('overall', report['overall'], baseline.get('overall', {}))
+    for dim, levels in report['slices'].items():
+        for level, cur in levels.items():
+            base = baseline.get('slices', {}).get(dim, {}).get(level)
+            if base:
+                check(f'{dim}={level}', cur, base, min(cur['n'], base.get('n', cur['n'])))
+    return regressions
+
+
+# ===== 6. VISUALIZATION =====
+def render_figure(y_true, y_pred, model, feature_names, path, dpi=100):
+    """Optional diagnostic figure (actual vs predicted, residuals, importance)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    residuals = y_true - y_pred
+    residuals_pct = residuals / y_true * 100
+    importance = getattr(model, 'booster_', model).feature_importance()
+    order = np.argsort(importance)[::-1][:10]
+
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    fig.suptitle('Car Price Prediction Model Evaluation', fontsize=16, fontweight='bold')
+    axes[0, 0].scatter(y_true, y_pred, alpha=0.5, s=10)
+    axes[0, 0].plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()], 'r--', lw=2)
+    axes[0, 0].set_title('Actual vs Predicted')
+    axes[0, 1].scatter(y_pred, residuals, alpha=0.5, s=10)
+    axes[0, 1].axhline(y=0, color='r', linestyle='--', lw=2)
+    axes[0, 1].set_title('Residual Plot')
+    axes[1, 0].barh(range(len(order)), importance[order])
+    axes[1, 0].set_yticks(range(len(order)))
+    axes[1, 0].set_yticklabels([feature_names[i] for i in order])
+    axes[1, 0].invert_yaxis()
+    axes[1, 0].set_title('Top 10 Feature Importance')
+    axes[1, 1].hist(residuals_pct, bins=50, edgecolor='black', alpha=0.7)
+    axes[1, 1].set_title('Error Distribution (%)')
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+def print_summary(report, regressions):
+    o = report['overall']
+    print(f"  - RMSE: ₹{o['rmse']:,.2f}")
+    print(f"  - MAE: ₹{o['mae']:,.2f}")
+    print(f"  - MAPE: {100 * o['mape']:.2f}%")
+    print(f"  - R² (log): {o['r2_log']:.4f}")
+    if 'ci' in o:
+        lo, hi = o['ci']['mae']
+        print(f"  - MAE {int(100 * CI_LEVEL)}% CI: ₹{lo:,.0f} – ₹{hi:,.0f}")
+
+    print("\n🧩 Slices (MAPE):")
+    for dim, levels in report['slices'].items():
+        parts = [f"{lvl}={100 * v['mape']:.1f}% (n={v['n']})" for lvl, v in levels.items()]
+        print(f"  {dim:<13} " + ', '.join(parts))
+
+    if regressions is None:
+        return
+    if regressions:
+        print(f"\n⚠️  {len(regressions)} regression(s) vs baseline:")
+        for r in regressions:
+            print(f"  - {r['scope']:<28} {r['metric']:<5} {r['baseline']:.4f} → {r['current']:.4f} (+{r['change_pct']}%)")
+    else:
+        print("\n✅ No regressions vs baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sliced, bootstrapped model evaluation')
+    parser.add_argument('--model', type=Path, default=MODEL_PATH, help='model pickle to evaluate')
+    parser.add_argument('--split', choices=['all', 'test'], default='test',
+                        help='rows to evaluate (test = held-out split of train_model.py; all includes training rows)')
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help='bootstrap resamples (0 = off)')
+    parser.add_argument('--jobs', type=int, default=1, help='processes for bootstrap blocks')
+    parser.add_argument('--report', type=Path, default=REPORT_PATH, help='where to write the JSON report')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='baseline report to compare against')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE, help='allowed relative worsening')
+    parser.add_argument('--write-baseline', action='store_true', help='store this report as the new baseline')
+    parser.add_argument('--plot', action='store_true', help='render the diagnostic figure')
+    parser.add_argument('--tiers', action='store_true', help='measure the speed/accuracy curve of truncated ensembles')
+    parser.add_argument('--tier-budget', type=float, default=DEFAULT_TIER_BUDGET,
+                        help='p95 relative deviation from the full model allowed for tier=fast')
+    parser.add_argument('--write-tiers', action='store_true', help='store the tier cutoffs in lgbm_meta.json')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📊 Model Evaluation")
+    print("=" * 60)
+
+    t_start = time.perf_counter()
+    store, model, feature_names, meta = load_inputs(args.model)
+    rows = select_rows(store.n_rows, args.split)
+    y_true = np.asarray(store.y[rows], dtype=np.float64)
+    print(f"✅ {len(rows)} rows ({args.split}) from feature store {store.version}")
+
+    t0 = time.perf_counter()
+    y_pred = predict_prices(model, store, feature_names, rows, meta)
+    elapsed_predict = time.perf_counter() - t0
+
+    report = build_report(args.model, store, rows, args.split, y_true, y_pred,
+                          args.bootstrap, args.jobs, elapsed_predict)
+
+    regressions = None
+    if args.baseline.exists() and not args.write_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get('split') != report['split'] or baseline.get('feature_store_version') != store.version:
+            print(f"⚠️  Baseline was computed on split={baseline.get('split')} / "
+                  f"store={baseline.get('feature_store_version')}; comparison may not be like-for-like")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report['baseline'] = {'path': args.baseline.name, 'model': baseline.get('model'),
+                              'regressions': regressions}
+
+    if args.tiers or args.write_tiers:
+        report['tiers'] = tier_curve(model, store, feature_names, rows, meta, y_true, args.tier_budget)
+
+    report['timing_s']['total'] = round(time.perf_counter() - t_start, 4)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    print("\n📈 Model Metrics:")
+    print_summary(report, regressions)
+    if 'tiers' in report:
+        print_tiers(report['tiers'])
+    print(f"\n💾 Report saved: {args.report}")
+
+    if args.write_tiers:
+        write_tiers(report['tiers'])
+        print(f"💾 Tier cutoffs saved: {META_PATH.name} {report['tiers']['cutoffs']}")
+
+    if args.write_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"💾 Baseline saved: {args.baseline}")
+
+    if args.plot:
+        render_figure(y_true, y_pred, model, feature_names, FIGURE_PATH)
+        print(f"📈 Visualization saved: {FIGURE_PATH}")
+
+    print(f"\n⏱️  Done in {report['timing_s']['total']:.2f}s")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,17 @@ import pandas as pd
 import numpy as np
 import json
 import joblib
+import sys
 from pathlib import Path
-from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import lightgbm as lgb
 import warnings
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import concurrency
+from feature_store import open_feature_store
+
 warnings.filterwarnings('ignore')
 
 # ===== CONFIGURATION =====
@@ -31,61 +35,32 @@ print("=" * 60)
 
 # ===== 1. LOAD DATA =====
 print("\n📂 Loading data...")
-try:
-    df = pd.read_csv(DATA_PATH)
-    print(f"✅ Data loaded: {df.shape[0]} rows, {df.shape[1]} columns")
-except FileNotFoundError:
-    print(f"❌ Error: Data file not found at {DATA_PATH}")
+store = open_feature_store(csv_path=DATA_PATH, build_if_missing=True)
+if store is None:
+    print(f"❌ Error: could not open or build the feature store from {DATA_PATH}")
     exit(1)
+print(f"✅ Feature store {store.version}: {store.n_rows} rows, {len(store.features)} features")
 
 # ===== 2. DATA EXPLORATION =====
 print("\n📊 Data Overview:")
-print(f"  - Columns: {list(df.columns)}")
-print(f"  - Missing values: {df.isnull().sum().sum()}")
-print(f"  - Data types:\n{df.dtypes}")
-
-# ===== 3. FEATURE ENGINEERING =====
-print("\n🔧 Feature Engineering...")
-
-# Create car age feature
-df['car_age'] = 2025 - df['year']
-
-# Separate features and target
-X = df.drop(columns=['selling_price'])
-y = df['selling_price']
-
-print(f"  - Target variable: selling_price")
-print(f"  - Features before encoding: {X.shape[1]}")
-
-# ===== 4. ENCODING CATEGORICAL VARIABLES =====
-print("\n🏷️  Encoding categorical variables...")
-
-# Label encoding for car name
-name_le = LabelEncoder()
-X['name_le'] = name_le.fit_transform(X['name'])
-X = X.drop(columns=['name'])
-
-# One-hot encoding for categorical variables
-categorical_cols = ['fuel', 'seller_type', 'transmission', 'owner']
-X_encoded = pd.get_dummies(X, columns=categorical_cols, drop_first=False)
-
-print(f"  - Features after encoding: {X_encoded.shape[1]}")
-print(f"  - Categorical columns: {categorical_cols}")
-
-# ===== 5. FEATURE SCALING =====
-print("\n📏 Scaling numerical features...")
-
+print(f"  - Features: {store.features}")
+print(f"  - Missing values: {int(np.isnan(store.X).sum())}")
+print(f"  - Storage: X {store.X.dtype}, y {store.y.dtype}")
+
+# ===== 3-5. FEATURES =====
+# Encoding (name_le, one-hot) and scaling are done once when the store is
+# built, with the same scaler_params.json / name_le_mapping.json the API
+# uses, so they are not repeated here.
+print("\n🔧 Using encoded features from the feature store...")
+feature_cols = store.features
 numerical_cols = ['km_driven', 'engine', 'max_power', 'mileage', 'seats', 'car_age']
-scaler = StandardScaler()
-X_scaled = X_encoded.copy()
-X_scaled[numerical_cols] = scaler.fit_transform(X_encoded[numerical_cols])
-
-print(f"  - Scaled columns: {numerical_cols}")
+print(f"  - Scaled columns: {[c for c in numerical_cols if c in feature_cols]}")
 
 # ===== 6. TARGET TRANSFORMATION =====
 print("\n🔄 Transforming target variable...")
 
 # Log transformation for target
+y = np.asarray(store.y)
 y_transformed = np.log1p(y)
 print(f"  - Original target range: {y.min():.2f} - {y.max():.2f}")
 print(f"  - Transformed target range: {y_transformed.min():.2f} - {y_transformed.max():.2f}")
@@ -93,9 +68,13 @@ print(f"  - Transformed target range: {y_transformed.min():.2f} - {y_transformed
 # ===== 7. TRAIN-TEST SPLIT =====
 print("\n✂️  Splitting data...")
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X_scaled, y_transformed, test_size=TEST_SIZE, random_state=RANDOM_STATE
+train_idx, test_idx = train_test_split(
+    np.arange(store.n_rows), test_size=TEST_SIZE, random_state=RANDOM_STATE
 )
+train_idx.sort()
+test_idx.sort()
+X_train, X_test = store.X[train_idx], store.X[test_idx]
+y_train, y_test = y_transformed[train_idx], y_transformed[test_idx]
 
 print(f"  - Training set: {X_train.shape[0]} samples")
 print(f"  - Test set: {X_test.shape[0]} samples")
@@ -113,11 +92,12 @@ lgb_params = {
     'bagging_fraction': 0.8,
     'bagging_freq': 5,
     'verbose': -1,
-    'random_state': RANDOM_STATE
+    'random_state': RANDOM_STATE,
+    'num_threads': concurrency.offline_threads()
 }
 
 # Create LightGBM dataset
-train_data = lgb.Dataset(X_train, label=y_train)
+train_data = lgb.Dataset(X_train, label=y_train, feature_name=feature_cols)
 valid_data = lgb.Dataset(X_test, label=y_test, reference=train_data)
 
 # Train model
@@ -139,8 +119,8 @@ print("✅ Model training completed!")
 print("\n📈 Model Evaluation:")
 
 # Predictions
-y_train_pred = model.predict(X_train)
-y_test_pred = model.predict(X_test)
+y_train_pred = model.predict(X_train, num_threads=concurrency.offline_threads())
+y_test_pred = model.predict(X_test, num_threads=concurrency.offline_threads())
 
 # Inverse transform predictions
 y_train_pred_original = np.expm1(y_train_pred)
@@ -167,7 +147,7 @@ print(f"  Test R²: {test_r2:.4f}")
 print("\n🎯 Top 10 Important Features:")
 
 feature_importance = pd.DataFrame({
-    'feature': X_scaled.columns,
+    'feature': feature_cols,
     'importance': model.feature_importance()
 }).sort_values('importance', ascending=False)
 
@@ -185,50 +165,31 @@ print(f"  ✅ Model saved: {model_path}")
 # Save feature names
 features_path = OUTPUT_DIR / 'lgbm_features.txt'
 with open(features_path, 'w', encoding='utf-8') as f:
-    f.write('\n'.join(X_scaled.columns))
+    f.write('\n'.join(feature_cols))
 print(f"  ✅ Features saved: {features_path}")
 
 # Save metadata
 meta = {
     'target_transform': 'log1p',
     'inverse_transform': 'expm1',
-    'num_features': X_scaled.shape[1],
+    'num_features': len(feature_cols),
     'train_rmse': float(train_rmse),
     'test_rmse': float(test_rmse),
     'train_r2': float(train_r2),
     'test_r2': float(test_r2),
-    'best_iteration': model.best_iteration
+    'best_iteration': model.best_iteration,
+    'feature_store_version': store.version,
+    'features': feature_cols
 }
 meta_path = OUTPUT_DIR / 'lgbm_meta.json'
 with open(meta_path, 'w', encoding='utf-8') as f:
     json.dump(meta, f, indent=2)
 print(f"  ✅ Metadata saved: {meta_path}")
+# قطع tier=fast يخص النموذج السابق: الخادم يرفض fast حتى يُعاد حسابه
+print("  ℹ️  tier=fast disabled until: python evaluate_model.py --tiers --write-tiers")
 
-# Save scaler parameters
-scaler_params = {
-    'means': {col: float(mean) for col, mean in zip(numerical_cols, scaler.mean_)},
-    'scales': {col: float(scale) for col, scale in zip(numerical_cols, scaler.scale_)}
-}
-scaler_path = OUTPUT_DIR / 'scaler_params.json'
-with open(scaler_path, 'w', encoding='utf-8') as f:
-    json.dump(scaler_params, f, indent=2)
-print(f"  ✅ Scaler params saved: {scaler_path}")
-
-# Save name label encoder mapping
-name_mapping = {name: int(code) for name, code in zip(name_le.classes_, name_le.transform(name_le.classes_))}
-name_path = OUTPUT_DIR / 'name_le_mapping.json'
-with open(name_path, 'w', encoding='utf-8') as f:
-    json.dump(name_mapping, f, indent=2, ensure_ascii=False)
-print(f"  ✅ Name mapping saved: {name_path}")
-
-# Save categorical levels
-cat_levels = {}
-for col in categorical_cols:
-    cat_levels[col] = sorted(df[col].unique().tolist())
-cat_path = OUTPUT_DIR / 'categorical_levels.json'
-with open(cat_path, 'w', encoding='utf-8') as f:
-    json.dump(cat_levels, f, indent=2, ensure_ascii=False)
-print(f"  ✅ Categorical levels saved: {cat_path}")
+# scaler_params.json, name_le_mapping.json and categorical_levels.json are
+# inputs to the feature store and are left untouched.
 
 # ===== 12. SUMMARY =====
 print("\n" + "=" * 60)
@@ -238,13 +199,10 @@ print(f"\n📊 Model Summary:")
 print(f"  - Test RMSE: ₹{test_rmse:.4f}")
 print(f"  - Test MAE: ₹{test_mae:.2f}")
 print(f"  - Test R²: {test_r2:.4f}")
-print(f"  - Features: {X_scaled.shape[1]}")
+print(f"  - Features: {len(feature_cols)}")
 print(f"  - Training samples: {X_train.shape[0]}")
 print(f"\n💾 Saved files:")
 print(f"  - lgbm_model.pkl")
 print(f"  - lgbm_features.txt")
 print(f"  - lgbm_meta.json")
-print(f"  - scaler_params.json")
-print(f"  - name_le_mapping.json")
-print(f"  - categorical_levels.json")
 print("\n🚀 Ready for deployment!")
@@ -0,0 +1,213 @@
+"""
+🚗 Out-of-core Car Price Model Training
+تدريب نموذج LightGBM على بيانات أكبر من الذاكرة (قراءة مجزأة + memmap)
+
+The encoded CSV (``cleaned_cars.csv`` schema) is written once, chunk by
+chunk, into the float32 memmaps of the shared feature store
+(``feature_store.py``).  LightGBM then pulls row batches from those files
+through ``lgb.Sequence`` and builds its histogram bins from a fixed-size
+sample, so peak memory depends on the batch size and the binned dataset, not
+on the number of raw rows held by pandas.
+
+Usage (from the ``training`` directory):
+    python train_streaming.py --chunksize 100000 --batch-size 65536
+"""
+
+import argparse
+import json
+import joblib
+import sys
+import numpy as np
+import lightgbm as lgb
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import concurrency
+from feature_store import STORE_DIR, FeatureStore, build_feature_store
+
+# ===== CONFIGURATION =====
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+TARGET = 'selling_price'
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_BATCH_SIZE = 65_536
+DEFAULT_SAMPLE_CNT = 200_000
+
+# ===== PATHS =====
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_PATH = BASE_DIR / 'dataset' / 'cleaned_cars.csv'
+OUTPUT_DIR = BASE_DIR
+
+LGB_PARAMS = {
+    'objective': 'regression',
+    'metric': 'rmse',
+    'num_leaves': 31,
+    'learning_rate': 0.05,
+    'feature_fraction': 0.8,
+    'bagging_fraction': 0.8,
+    'bagging_freq': 5,
+    'verbose': -1,
+    'random_state': RANDOM_STATE,
+    'num_threads': concurrency.offline_threads(),
+}
+
+
+class MemmapSequence(lgb.Sequence):
+    """
+    Row-batch view over a subset of a 2-D float32 memmap, consumed lazily by
+    ``lgb.Dataset``.
+
+    LightGBM's sampler requires float64, so each batch is gathered and upcast
+    on the fly; only one batch is ever materialised at the wider dtype.
+    """
+
+    def __init__(self, data, rows, batch_size=DEFAULT_BATCH_SIZE):
+        self.data = data
+        self.rows = rows
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx):
+        return np.asarray(self.data[self.rows[idx]], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def split_mask(n_rows, test_size=TEST_SIZE, seed=RANDOM_STATE):
+    """Deterministic train/valid assignment (1 byte per row)."""
+    rng = np.random.default_rng(seed)
+    return rng.random(n_rows, dtype=np.float32) < test_size
+
+
+def predict_in_batches(booster, X, rows, num_iteration=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Predict selected memmap rows batch by batch so only one batch is resident."""
+    preds = np.empty(len(rows), dtype=np.float64)
+    for start in range(0, len(rows), batch_size):
+        stop = start + batch_size
+        preds[start:stop] = booster.predict(X[rows[start:stop]], num_iteration=num_iteration,
+                                             num_threads=concurrency.offline_threads())
+    return preds
+
+
+def train(store, sample_cnt=DEFAULT_SAMPLE_CNT, batch_size=DEFAULT_BATCH_SIZE, num_boost_round=1000):
+    """Build streamed LightGBM datasets over the feature store and train."""
+    is_valid = split_mask(store.n_rows)
+    train_rows = np.flatnonzero(~is_valid)
+    valid_rows = np.flatnonzero(is_valid)
+    # row indices and labels are the only per-row arrays held in memory
+    y_train = np.log1p(store.y[train_rows]).astype(np.float32)
+    y_valid = np.log1p(store.y[valid_rows]).astype(np.float32)
+
+    dataset_params = {
+        'bin_construct_sample_cnt': min(sample_cnt, len(train_rows)),
+        'max_bin': 255,
+        'verbose': -1,
+    }
+    train_data = lgb.Dataset(
+        [MemmapSequence(store.X, train_rows, batch_size)],
+        label=y_train,
+        feature_name=store.features,
+        params=dataset_params,
+        free_raw_data=True,
+    )
+    valid_data = lgb.Dataset(
+        [MemmapSequence(store.X, valid_rows, batch_size)],
+        label=y_valid,
+        reference=train_data,
+        free_raw_data=True,
+    )
+
+    booster = lgb.train(
+        {**LGB_PARAMS, **dataset_params},
+        train_data,
+        num_boost_round=num_boost_round,
+        valid_sets=[train_data, valid_data],
+        valid_names=['train', 'valid'],
+        callbacks=[
+            lgb.early_stopping(50),
+            lgb.log_evaluation(period=100),
+        ],
+    )
+
+    y_pred = predict_in_batches(booster, store.X, valid_rows, booster.best_iteration, batch_size)
+    y_true = np.asarray(y_valid, dtype=np.float64)
+    rmse = float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+    mae = float(np.mean(np.abs(np.expm1(y_true) - np.expm1(y_pred))))
+    ss_res = float(np.sum((y_true - y_pred) ** 2))
+    ss_tot = float(np.sum((y_true - y_true.mean()) ** 2))
+    r2 = 1.0 - ss_res / ss_tot if ss_tot else 0.0
+    return booster, {'test_rmse': rmse, 'test_mae': mae, 'test_r2': r2,
+                     'n_train': len(train_rows), 'n_valid': len(valid_rows)}
+
+
+def save_artifacts(booster, features, metrics, output_dir, store_version=None):
+    """Write model, feature list and metadata in the same layout as train_model.py."""
+    model_path = output_dir / 'lgbm_model.pkl'
+    joblib.dump(booster, model_path)
+    print(f"  ✅ Model saved: {model_path}")
+
+    features_path = output_dir / 'lgbm_features.txt'
+    features_path.write_text('\n'.join(features), encoding='utf-8')
+    print(f"  ✅ Features saved: {features_path}")
+
+    meta = {
+        'target_transform': 'log1p',
+        'inverse_transform': 'expm1',
+        'clip_negative_at_inference': True,
+        'num_features': len(features),
+        'training_mode': 'streaming',
+        'test_rmse': metrics['test_rmse'],
+        'test_r2': metrics['test_r2'],
+        'best_iteration': booster.best_iteration,
+        'feature_store_version': store_version,
+        'features': features,
+    }
+    meta_path = output_dir / 'lgbm_meta.json'
+    meta_path.write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    print(f"  ✅ Metadata saved: {meta_path}")
+    # قطع tier=fast يخص النموذج السابق: الخادم يرفض fast حتى يُعاد حسابه
+    print("  ℹ️  tier=fast disabled until: python evaluate_model.py --tiers --write-tiers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Out-of-core LightGBM training from an encoded CSV')
+    parser.add_argument('--data', type=Path, default=DATA_PATH, help='encoded CSV (cleaned_cars.csv schema)')
+    parser.add_argument('--store-dir', type=Path, default=STORE_DIR, help='feature store directory (float32 memmaps)')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help='where to write model artifacts')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='CSV rows parsed per chunk')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per Sequence batch')
+    parser.add_argument('--sample-cnt', type=int, default=DEFAULT_SAMPLE_CNT, help='rows sampled for bin construction')
+    parser.add_argument('--no-save', action='store_true', help='train and report without overwriting artifacts')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🚗 Out-of-core Car Price Model Training")
+    print("=" * 60)
+
+    print("\n📂 Streaming data into the feature store...")
+    if not args.data.exists():
+        print(f"❌ Error: Data file not found at {args.data}")
+        raise SystemExit(1)
+    manifest = build_feature_store(args.data, args.store_dir, args.chunksize)
+    store = FeatureStore(args.store_dir / manifest['version'])
+    print(f"✅ Feature store {store.version}: {store.n_rows:,} rows | Features: {len(store.features)}")
+
+    print("\n🤖 Training LightGBM model (streamed)...")
+    booster, metrics = train(store, args.sample_cnt, args.batch_size)
+    print("✅ Model training completed!")
+
+    print("\n📈 Model Evaluation:")
+    print(f"  Train rows: {metrics['n_train']:,} | Valid rows: {metrics['n_valid']:,}")
+    print(f"  Test RMSE (log): {metrics['test_rmse']:.4f}")
+    print(f"  Test MAE: ₹{metrics['test_mae']:.2f}")
+    print(f"  Test R²: {metrics['test_r2']:.4f}")
+
+    if not args.no_save:
+        print("\n💾 Saving model and artifacts...")
+        save_artifacts(booster, store.features, metrics, args.output_dir, store.version)
+
+    print("\n🚀 Done!")
+
+
+if __name__ == '__main__':
+    main()
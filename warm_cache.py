@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+ذاكرة دافئة دائمة على القرص - Persistent Warm Cache
+البنى المشتقة المكلفة (أسعار كل صفوف البيانات لكل tier، نطاقات الأعمدة،
+الردود المحسوبة مرة واحدة) تُحفظ على القرص حتى تبدأ العمال والنسخ الجديدة
+ساخنة بعد إعادة التشغيل بدلاً من إعادة حسابها.
+
+    cache/warm/<bundle>-<dataset>-<layout>/
+        row_prices_full.npy      مصفوفات: np.load(mmap_mode='r') بدون نسخ
+        data_ranges.json         قيم JSON
+        .last_used               وقت آخر استخدام (أساس التقليم LRU)
+
+- المفتاح = بصمة حزمة النموذج (lgbm_model.pkl + meta + features + scaler +
+  name_le_mapping) + نسخة مخزن الميزات (بصمة cleaned_cars.csv) + بصمة التخطيط
+  (FORMAT_VERSION، شيفرة المُنشئات، DB_SHARDS و DB_SHARD_MODE)، فأي تغيير
+  في أحدها يعني مجلداً جديداً ولا يُقرأ أي أثر قديم أبداً.
+- start(): يحمل الموجود (memmap) ويبني الناقص في خيط خلفي واحد؛ حتى ينتهي
+  تستخدم المسارات العادية الحساب المباشر. ملف قفل لكل أثر يمنع عدة عمال من
+  بناء نفس الأثر في الوقت نفسه؛ الباقون ينتظرون ظهور الملف.
+- الكتابة ذرية (ملف مؤقت ثم os.replace).
+- prune(): حذف مجلدات المفاتيح الأقدم استخداماً حتى يعود الحجم الكلي تحت
+  WARM_CACHE_MB (المفتاح الحالي لا يُحذف).
+
+المتغيرات:
+    WARM_CACHE         0 للتعطيل (الافتراضي 1)
+    WARM_CACHE_DIR     المجلد (الافتراضي cache/warm)
+    WARM_CACHE_MB      ميزانية الحجم الكلي (الافتراضي 512)
+
+الاستخدام (بناء مسبق أثناء النشر):
+    python warm_cache.py --build
+    python warm_cache.py --status
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+ENABLED = os.environ.get('WARM_CACHE', '1') != '0'
+CACHE_DIR = Path(os.environ.get('WARM_CACHE_DIR', BASE_DIR / 'cache' / 'warm'))
+BUDGET_BYTES = int(float(os.environ.get('WARM_CACHE_MB', 512)) * 1024 * 1024)
+BUNDLE_FILES = ('lgbm_model.pkl', 'lgbm_meta.json', 'lgbm_features.txt', 'scaler_params.json', 'name_le_mapping.json')
+# صيغة الآثار على القرص: تُرفع عند تغيير طريقة الحفظ أو معنى أي أثر
+FORMAT_VERSION = 1
+# الملفات التي تحسب الآثار: أي تعديل فيها يعني آثاراً قد تختلف
+CODE_FILES = ('warm_cache.py', 'app.py', 'database.py', 'sharded_database.py', 'encoding.py', 'feature_store.py')
+LOCK_STALE_SECONDS = 600     # قفل أقدم من هذا يعتبر من عملية ماتت
+LOCK_POLL_SECONDS = 0.5
+USED_MARKER = '.last_used'
+
+ARRAY = 'array'
+JSON = 'json'
+
+BUILD_SECONDS = metrics.histogram('car_price_warm_cache_build_seconds', 'Time to build a warm-cache artifact',
+                                  ['artifact'], buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0))
+
+
+def bundle_hash(base_dir: Path = BASE_DIR, files=BUNDLE_FILES) -> str:
+    """بصمة حزمة النموذج (كل ملف يدخل بمحتواه واسمه)"""
+    h = hashlib.sha256()
+    for name in files:
+        path = Path(base_dir) / name
+        h.update(name.encode())
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+        except OSError:
+            h.update(b'<missing>')
+    return h.hexdigest()[:16]
+
+
+def layout_hash(base_dir: Path = BASE_DIR) -> str:
+    """
+    بصمة طريقة حساب الآثار: صيغة الذاكرة + شيفرة المُنشئات + وضع قاعدة البيانات
+    (إحصاءات الوضع المجزأ تضيف shards/shard_mode فلا تُشارك مع الوضع العادي)
+    """
+    shards = int(os.environ.get('DB_SHARDS', 0) or 0)
+    mode = os.environ.get('DB_SHARD_MODE', 'hash') if shards > 1 else 'single'
+    h = hashlib.sha256(f'format={FORMAT_VERSION};shards={max(shards, 1)};mode={mode}'.encode())
+    h.update(bundle_hash(base_dir, CODE_FILES).encode())
+    return h.hexdigest()[:16]
+
+
+def cache_key(bundle: str, dataset_version: str, layout: str) -> str:
+    return f'{bundle[:12]}-{dataset_version[:12]}-{layout[:8]}'
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.iterdir() if p.is_file())
+
+
+class WarmCache:
+    """آثار مشتقة لمفتاح (نموذج، بيانات) واحد"""
+
+    def __init__(self, key: str, root: Path = CACHE_DIR, budget_bytes: int = BUDGET_BYTES):
+        self.key = key
+        self.root = Path(root)
+        self.dir = self.root / key
+        self.budget_bytes = budget_bytes
+        self._builders: Dict[str, Tuple[str, Callable[[], Any]]] = {}
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started = False
+        self.loaded: List[str] = []
+        self.built: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._touch()
+
+    def register(self, name: str, kind: str, build: Callable[[], Any]):
+        """تسجيل أثر: kind = array (np.ndarray) أو json (قيمة قابلة للتسلسل)"""
+        self._builders[name] = (kind, build)
+
+    def _path(self, name: str, kind: str) -> Path:
+        return self.dir / (f'{name}.npy' if kind == ARRAY else f'{name}.json')
+
+    def _touch(self):
+        (self.dir / USED_MARKER).write_text(str(time.time()), encoding='utf-8')
+
+    # ===== READ =====
+    def _load(self, name: str, kind: str) -> Any:
+        path = self._path(name, kind)
+        if not path.exists():
+            return None
+        if kind == ARRAY:
+            return np.load(path, mmap_mode='r')
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def get(self, name: str) -> Any:
+        """القيمة من الذاكرة، أو None إذا لم تُحمّل/تُبنى بعد (المستدعي يحسب مباشرة)"""
+        value = self._values.get(name)
+        metrics.record_cache(f'warm_{name}', value is not None)
+        return value
+
+    # ===== WRITE =====
+    def put(self, name: str, value: Any):
+        """حفظ ذري ثم تثبيت القيمة في الذاكرة (المصفوفات تُعاد فتحها كـ memmap)"""
+        kind = self._builders.get(name, (ARRAY if isinstance(value, np.ndarray) else JSON, None))[0]
+        path = self._path(name, kind)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            if kind == ARRAY:
+                with open(tmp, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(value))
+            else:
+                tmp.write_text(json.dumps(value, ensure_ascii=False, default=str), encoding='utf-8')
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        with self._lock:
+            self._values[name] = self._load(name, kind)
+
+    # ===== BUILD =====
+    def _acquire(self, name: str) -> bool:
+        lock = self.dir / f'.{name}.lock'
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > LOCK_STALE_SECONDS:
+                    lock.unlink(missing_ok=True)
+                    return self._acquire(name)
+            except OSError:
+                pass
+            return False
+
+    def _release(self, name: str):
+        (self.dir / f'.{name}.lock').unlink(missing_ok=True)
+
+    def _build_one(self, name: str):
+        kind, build = self._builders[name]
+        while not self._acquire(name):
+            # عامل آخر يبني نفس الأثر: انتظار الملف بدلاً من تكرار الحساب
+            value = self._load(name, kind)
+            if value is not None:
+                with self._lock:
+                    self._values[name] = value
+                self.loaded.append(name)
+                return
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            value = self._load(name, kind)
+            if value is not None:
+                with self._lock:
+                    self._values[name] = value
+                self.loaded.append(name)
+                return
+            t0 = time.perf_counter()
+            self.put(name, build())
+            elapsed = time.perf_counter() - t0
+            BUILD_SECONDS.labels(artifact=name).observe(elapsed)
+            self.built[name] = round(elapsed, 3)
+        finally:
+            self._release(name)
+
+    def _build_missing(self, names: List[str]):
+        for name in names:
+            try:
+                self._build_one(name)
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.warning(f"⚠️ تعذر بناء أثر الذاكرة الدافئة {name}: {e}")
+        if self.built:
+            logger.info(f"✅ الذاكرة الدافئة {self.key}: بُني {self.built}")
+        self.prune()
+
+    def start(self, background: bool = True) -> Dict[str, Any]:
+        """تحميل الموجود فوراً وبناء الناقص (في الخلفية افتراضياً)؛ الاستدعاء الثاني لا يعيد العمل"""
+        if self._started:
+            if not background:
+                self.wait()
+            return {'key': self.key, 'loaded': list(self.loaded), 'building': []}
+        self._started = True
+        missing = []
+        for name, (kind, _) in self._builders.items():
+            try:
+                value = self._load(name, kind)
+            except Exception as e:  # ملف تالف: يُعاد بناؤه
+                logger.warning(f"⚠️ أثر تالف في الذاكرة الدافئة {name}: {e}")
+                value = None
+            if value is None:
+                missing.append(name)
+                continue
+            if kind == ARRAY:
+                np.asarray(value).reshape(-1).view(np.uint8)[::4096].sum()  # تحميل الصفحات
+            with self._lock:
+                self._values[name] = value
+            self.loaded.append(name)
+        if missing:
+            if background:
+                self._thread = threading.Thread(target=self._build_missing, args=(missing,),
+                                                name='warm-cache', daemon=True)
+                self._thread.start()
+            else:
+                self._build_missing(missing)
+        else:
+            self.prune()
+        return {'key': self.key, 'loaded': list(self.loaded), 'building': missing}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    # ===== PRUNE =====
+    def prune(self) -> List[str]:
+        """حذف مفاتيح أخرى (الأقدم استخداماً أولاً) حتى يعود الحجم تحت الميزانية"""
+        entries = []
+        for path in self.root.iterdir():
+            if not path.is_dir():
+                continue
+            marker = path / USED_MARKER
+            used = marker.stat().st_mtime if marker.exists() else path.stat().st_mtime
+            entries.append((used, path, _dir_bytes(path)))
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for _, path, size in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if path == self.dir:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed.append(path.name)
+        if removed:
+            logger.info(f"🧹 الذاكرة الدافئة: حُذف {removed} (الحجم الآن {total / 1e6:.1f}MB)")
+        return removed
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'key': self.key,
+            'dir': str(self.dir),
+            'artifacts': {name: name in self._values for name in self._builders},
+            'loaded_from_disk': list(self.loaded),
+            'built_seconds': dict(self.built),
+            'errors': dict(self.errors),
+            'bytes': _dir_bytes(self.dir) if self.dir.exists() else 0,
+            'budget_bytes': self.budget_bytes,
+        }
+
+
+def open_warm_cache(dataset_version: Optional[str], base_dir: Path = BASE_DIR) -> Optional[WarmCache]:
+    """ذاكرة المفتاح الحالي، أو None إذا كانت معطلة أو بدون مخزن ميزات"""
+    if not ENABLED or not dataset_version:
+        return None
+    try:
+        return WarmCache(cache_key(bundle_hash(base_dir), dataset_version, layout_hash(base_dir)))
+    except OSError as e:
+        logger.warning(f"⚠️ تعذر فتح الذاكرة الدافئة: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect the persistent warm cache')
+    parser.add_argument('--build', action='store_true', help='build every missing artifact now')
+    parser.add_argument('--status', action='store_true', help='print the cache status')
+    args = parser.parse_args()
+
+    # المُنشئات مسجلة في app.py؛ بدون إحماء لأن البناء هنا متزامن
+    os.environ.setdefault('WARMUP', '0')
+    os.environ.setdefault('AUDIT_LOG', '0')
+    import app
+    cache = app.warm_state
+    if cache is None:
+        print("⚠️ الذاكرة الدافئة معطلة أو مخزن الميزات غير متاح")
+        return
+    if args.build:
+        cache.start(background=False)  # app.py بدأها في الخلفية عند الاستيراد: انتظار اكتمالها
+    print(json.dumps(cache.status(), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
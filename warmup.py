@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+الإحماء عند بدء التشغيل - Startup Warm-up & Readiness
+ينفذ خطوات الإحماء (تنبؤات تجريبية، تعبئة الذاكرات المؤقتة، قراءة صفحات
+البيانات) في خيط خلفي داخل كل عامل، ويبقى /api/ready يرد 503 حتى تنتهي،
+فلا يوجه موازن الحمل أي طلب حقيقي إلى نسخة باردة.
+
+WARMUP=0 يلغي الإحماء ويعتبر العامل جاهزاً فوراً (مفيد للسكربتات والاختبارات)
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get('WARMUP', '1') != '0'
+
+WORKERS_READY = metrics.gauge('car_price_workers_ready', 'Workers that finished warm-up')
+WARMUP_DURATION = metrics.histogram('car_price_warmup_duration_seconds', 'Worker warm-up duration',
+                                    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+class Warmup:
+    """حالة الإحماء لعامل واحد"""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.errors: List[str] = []
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def run(self, steps: List[Step]):
+        """تنفيذ الخطوات بالترتيب؛ فشل خطوة يُسجل ولا يمنع الجاهزية"""
+        self.started_at = time.time()
+        t0 = time.perf_counter()
+        for name, fn in steps:
+            s0 = time.perf_counter()
+            try:
+                detail = fn()
+                self.steps[name] = {'ms': round((time.perf_counter() - s0) * 1000, 2), 'detail': detail}
+            except Exception as e:
+                self.steps[name] = {'ms': round((time.perf_counter() - s0) * 1000, 2), 'error': str(e)}
+                self.errors.append(f'{name}: {e}')
+                logger.warning(f"⚠️ فشلت خطوة الإحماء {name}: {e}")
+        elapsed = time.perf_counter() - t0
+        self.duration_ms = round(elapsed * 1000, 2)
+        self.finished_at = time.time()
+        WARMUP_DURATION.labels().observe(elapsed)
+        WORKERS_READY.labels().inc()
+        self._done.set()
+        timings = ', '.join(f"{n}={s['ms']}ms" for n, s in self.steps.items())
+        logger.info(f"🔥 اكتمل الإحماء في {self.duration_ms}ms (pid={os.getpid()}): {timings}")
+
+    def start(self, steps: List[Step]):
+        """بدء الإحماء في خيط خلفي (أو تخطيه إذا كان WARMUP=0)"""
+        if not WARMUP_ENABLED:
+            self.run([])
+            return
+        self._thread = threading.Thread(target=self.run, args=(steps,), name='warmup', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_ms': self.duration_ms,
+            'steps': self.steps,
+            'errors': self.errors,
+        }